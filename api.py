@@ -1,32 +1,18 @@
 from fastapi import FastAPI, Request, Response
-from fastapi.responses import FileResponse
-import subprocess
-import os
+from fastapi.responses import StreamingResponse
+import asyncio
 import json
-import io
-import base64
+import functools
+import threading
 import yaml
 import logging
 from pathlib import Path
-from starlette.requests import Request as StarletteRequest
-from TTS.api import TTS
-from TTS.tts.configs.xtts_config import XttsConfig
-from TTS.tts.models.xtts import XttsAudioConfig, XttsArgs
-from TTS.config.shared_configs import BaseDatasetConfig
-import torch.serialization
-
-# Import from local modules
-from src.common import MOVIES_DIR, TRAILER_DIR, configs
-
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-
-# Allow torch to safely load custom model objects
-torch.serialization.add_safe_globals(
-    [XttsConfig, XttsAudioConfig, BaseDatasetConfig, XttsArgs]
-)
 
+# Import from local modules, the configs are only loaded on first use
+from src.common import ProjectContext, load_project_context, merge_configs, parse_configs
+
+# Heavy dependencies (TTS, torch, the Google client) are imported on first use
+# so the server starts answering right away
 app = FastAPI()
 
 # Set up logging
@@ -35,17 +21,217 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# We'll lazy-load the TTS model on first use to improve startup time
-tts = None
+# Seconds between keepalive comments on an idle progress stream
+SSE_KEEPALIVE_SECONDS = 15
+# Set on shutdown to stop the background garbage collection
+gc_stop = threading.Event()
+
+
+@functools.lru_cache(maxsize=None)
+def get_default_context():
+    """Load the default project context on first use.
+
+    Returns:
+        ProjectContext: Context of `configs.yaml`, new projects start from it
+    """
+    return load_project_context()
+
+
+@functools.lru_cache(maxsize=None)
+def get_job_queue():
+    """Create the trailer job queue on first use.
+
+    Returns:
+        JobQueue: Queue running the trailer jobs in background threads
+    """
+    from src.jobs import JobQueue, JobStore
+
+    jobs_configs = get_default_context().configs["jobs"]
+    store = JobStore(Path(jobs_configs["db_path"]))
+    return JobQueue(store, run_trailer_job, jobs_configs["max_concurrency"])
+
+
+def plan_trailer_job(project_configs, plot, file_id):
+    """Estimate a new trailer job and decide how to run it.
+
+    Args:
+        project_configs (dict): Configs of the new project
+        plot (str): Plot text
+        file_id (str): Google Drive file ID of the video
+
+    Returns:
+        dict: Admission decision, see `src.cost_model.plan_job`
+    """
+    from src.cost_model import get_cost_model, get_job_features, plan_job
+    from src.video_store import get_video_source
+
+    video_info = get_video_source(project_configs).get_video_info(file_id)
+    features = get_job_features(project_configs, plot, video_info)
+    model = get_cost_model(
+        Path(project_configs["project_dir"]),
+        60 * project_configs["admission"]["refresh_minutes"],
+    )
+
+    # Work already admitted, each unfinished job counts with its whole estimate
+    store = get_job_queue().store
+    backlog_seconds = 0.0
+    for job_id in store.list_unfinished():
+        estimate = store.get(job_id)["params"].get("estimate")
+        backlog_seconds += estimate["seconds"] if estimate else 0.0
+    return plan_job(model, features, project_configs, backlog_seconds)
+
+
+def run_trailer_job(job_id, params, listener):
+    """Render the trailer of a job, runs in a job thread.
+
+    The video is downloaded by the first step of the pipeline, the steps that
+    only need the plot (subplot, voice) run while it downloads.
+
+    Args:
+        job_id (str): Job ID
+        params (dict): Job `file_id` and project `config_path`
+        listener (Callable[[dict], None]): Called with the progress events of the job
+
+    Returns:
+        dict: Paths of the input video and the generated trailer
+    """
+    from src.cost_model import invalidate_cost_models
+    from src.pipeline import PIPELINE_STAGES
+
+    context = ProjectContext.from_configs(parse_configs(params["config_path"]))
+    if "variants" in params:
+        result = run_batch_job(job_id, context, params, listener)
+    else:
+        logger.info("Starting trailer generation for job %s", job_id)
+        run_stages(context, ["video_download", *PIPELINE_STAGES], listener)
+
+        trailer_path = context.trailer_dir / "final_trailer.mp4"
+        if not trailer_path.exists():
+            raise RuntimeError("Trailer generation completed but no trailer file was found")
+        logger.info("Found generated trailer at %s", trailer_path)
+        result = {"input_video": context.configs["video_path"], "trailer": str(trailer_path)}
+
+    # The new run report calibrates the next admissions
+    invalidate_cost_models()
+    return result
+
+
+def run_batch_job(job_id, context, params, listener):
+    """Render the trailers of a batch job, sharing the video-side steps.
+
+    Args:
+        job_id (str): Job ID
+        context (ProjectContext): Base project context, holding the video
+        params (dict): Job `variants`
+        listener (Callable[[dict], None]): Called with the progress events of the
+            job, the steps of each variant are prefixed with its project name
+
+    Returns:
+        dict: Paths of the input video and of the trailer of each variant
+    """
+    from src.batch import run_batch
+
+    def runner(project_context, stages):
+        project_name = project_context.configs["project_name"]
+
+        def project_listener(event):
+            listener({**event, "stage": f"{project_name}:{event['stage']}"})
+
+        try:
+            run_stages(project_context, stages, project_listener)
+        except RuntimeError:
+            logger.exception("Steps %s of %s failed", stages, project_name)
+            return 1
+        return 0
+
+    logger.info("Starting batch of %s trailers for job %s", len(params["variants"]), job_id)
+    results = run_batch(context, params["variants"], runner, context.configs["batch"]["max_workers"])
+    if all(results.values()):
+        raise RuntimeError("Every trailer of the batch failed, see the server logs")
+
+    trailers = {}
+    for name, project_name in params["variant_projects"].items():
+        trailer_path = Path(context.configs["project_dir"]) / project_name / "trailers" / "final_trailer.mp4"
+        if results[name] == 0 and trailer_path.exists():
+            trailers[name] = str(trailer_path)
+    return {
+        "input_video": context.configs["video_path"],
+        "trailers": trailers,
+        "failed": [name for name in results if name not in trailers],
+    }
+
+
+def run_stages(context, stages, listener):
+    """Run pipeline steps of a project, in the model worker if it is enabled.
+
+    Args:
+        context (ProjectContext): Project context, its configs must be saved as
+            `project_config.yaml` in the project directory
+        stages (list[str]): Steps to run
+        listener (Callable[[dict], None]): Called with the progress events
+
+    Raises:
+        RuntimeError: If a step failed
+    """
+    if context.configs["worker"]["enabled"]:
+        # The worker keeps the TTS and similarity models loaded between trailers
+        from src.worker import get_address, get_authkey, submit_job
+
+        logger.info("Sending steps %s of %s to the model worker", stages, context.project_dir)
+        job_result = submit_job(
+            {
+                "config_path": str((context.project_dir / "project_config.yaml").resolve()),
+                "stages": stages,
+            },
+            get_address(context.configs),
+            get_authkey(context.configs),
+            listener=listener,
+        )
+        if job_result["status"] != "completed":
+            raise RuntimeError(job_result["error"])
+    else:
+        from src.main import run_project
+
+        if run_project(context, stages, listener=listener) != 0:
+            raise RuntimeError("Trailer generation failed, see the server logs")
+
+
+def format_sse(event, data):
+    """Format a server-sent event.
+
+    Args:
+        event (str): Event type, e.g. `progress`
+        data (dict): Event payload, sent as JSON
+
+    Returns:
+        str: Event in the `text/event-stream` format
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.on_event("startup")
+def resume_jobs():
+    """Queue again the jobs interrupted by the last shutdown."""
+    get_job_queue().recover()
+
+
+@app.on_event("startup")
+def start_garbage_collection():
+    """Collect the intermediate artifacts of idle projects in the background."""
+    from src.garbage_collect import collect_periodically
 
+    configs = get_default_context().configs
+    if configs["gc"]["interval_minutes"]:
+        threading.Thread(
+            target=collect_periodically, args=(configs, gc_stop), daemon=True
+        ).start()
 
-def get_tts_model():
-    global tts
-    if tts is None:
-        logger.info("Loading TTS model - this may take a moment...")
-        tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2")
-        logger.info("TTS model loaded successfully")
-    return tts
+
+@app.on_event("shutdown")
+def stop_jobs():
+    """Stop taking jobs, interrupted and queued jobs are resumed on the next start."""
+    gc_stop.set()
+    get_job_queue().shutdown()
 
 
 @app.post("/generate_trailer")
@@ -77,7 +263,7 @@ async def generate_trailer(request: Request):
         
         # Create a copy of the default configs
         import copy
-        project_configs = copy.deepcopy(configs)
+        project_configs = copy.deepcopy(get_default_context().configs)
         
         # Update config with project-specific values
         project_configs["project_name"] = project_name
@@ -87,123 +273,249 @@ async def generate_trailer(request: Request):
         if video_id:
             project_configs["plot_retrieval"]["video_id"] = video_id
 
-        # Set up project-specific paths
-        from pathlib import Path
-        project_dir = Path(f"{project_configs['project_dir']}/{project_name}")
-        plot_path = project_dir / project_configs["plot_filename"]
-        frames_dir = project_dir / "frames"
-        trailer_dir = project_dir / "trailers"
-        movies_dir = project_dir / project_configs["movies_dir"]
-        
-        # Create all needed directories
-        for directory in [project_dir, frames_dir, trailer_dir, movies_dir]:
-            directory.mkdir(parents=True, exist_ok=True)
-            logger.info(f"Created directory: {directory}")
-        
+        # Estimate the job before anything is written, it may be down-tuned
+        # or rejected to keep up with the throughput target
+        plan = None
+        if project_configs["admission"]["enabled"]:
+            plan = await asyncio.to_thread(plan_trailer_job, project_configs, plot, file_id)
+            if plan["status"] == "rejected":
+                logger.info("Rejected trailer job for %s: %s", project_name, plan["reason"])
+                return {"error": plan["reason"], "estimate": plan["estimate"]}
+            project_configs = merge_configs(project_configs, plan["overrides"])
+
+        # Set up project-specific paths and create all needed directories
+        context = ProjectContext.from_configs(project_configs)
+        context.ensure_dirs()
+
         # Save plot to the project-specific location
-        plot_path.write_text(plot)
-        logger.info("Saved plot to %s", plot_path)
-
-        # The plot is now directly related to the video we'll download
-
-        # Load service account credentials from environment secret
-        SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
-        if os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON"):
-            decoded = base64.b64decode(
-                os.environ["GOOGLE_SERVICE_ACCOUNT_JSON"]
-            ).decode("utf-8")
-            service_account_info = json.loads(decoded)
-        else:
-            raise RuntimeError("No service account env var provided.")
-        credentials = service_account.Credentials.from_service_account_info(
-            service_account_info, scopes=SCOPES
-        )
-        drive_service = build("drive", "v3", credentials=credentials)
+        context.plot_path.write_text(plot)
+        logger.info("Saved plot to %s", context.plot_path)
 
         # Create a filename based on the file_id for uniqueness
         filename = f"input_{file_id[-6:]}.mp4"  # Use last 6 chars of ID for brevity
         
         # Make sure to use the project-specific movies directory
-        video_path = str(movies_dir / filename)
+        video_path = str(context.movies_dir / filename)
         logger.info(f"Setting video path to: {video_path}")
 
-        # Update configs with the project-specific video path
+        # Update configs with the project-specific video path, the video is
+        # downloaded there by the first step of the job
         project_configs["video_path"] = video_path
+        project_configs["video_file_id"] = file_id
         
         # Save project-specific configs
-        project_config_path = project_dir / "project_config.yaml"
+        project_config_path = context.project_dir / "project_config.yaml"
         with open(project_config_path, "w") as f:
             yaml.safe_dump(project_configs, f)
         logger.info(f"Saved project config to {project_config_path}")
+        if plan is not None:
+            from src.cost_model import FEATURES_FILENAME
 
-        # Download video from Google Drive
-        request_drive = drive_service.files().get_media(fileId=file_id)
-        fh = io.FileIO(video_path, "wb")
-        downloader = MediaIoBaseDownload(fh, request_drive)
+            # Calibrates the cost model once the run report is written
+            (context.project_dir / FEATURES_FILENAME).write_text(json.dumps(plan["features"]))
 
-        logger.info(
-            "Starting video download from Google Drive with file_id: %s", file_id
+        # The download and the render run in the background, the job state is
+        # kept on disk so it survives restarts
+        job_id = uuid.uuid4().hex
+        queue = get_job_queue()
+        queue.store.create(
+            job_id,
+            {
+                "project_name": project_name,
+                "file_id": file_id,
+                "config_path": str(project_config_path),
+                "estimate": plan["estimate"] if plan else None,
+            },
         )
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            if status:
-                logger.info("Download progress: %d%%", int(status.progress() * 100))
+        queue.submit(job_id)
+        logger.info("Queued job %s for project %s", job_id, project_name)
 
-        logger.info("Video successfully downloaded to: %s", video_path)
+        return {
+            "status": "queued",
+            "job_id": job_id,
+            "project_name": project_name,
+            "status_url": f"{base_url}/jobs/{job_id}",
+            "admission": plan and {
+                key: plan[key] for key in ["status", "estimate", "wait_seconds", "overrides"]
+            },
+        }
+    except json.JSONDecodeError as e:
+        return {"error": f"Invalid JSON format: {str(e)}"}
+    except Exception as e:
+        return {"error": f"An error occurred: {str(e)}"}
 
-        # Run the main processing script
-        # We need to run it in a way that allows it to find the src module
-        # Use the -m flag to run the module as a package
-        logger.info("Starting trailer generation process with main.py")
 
-        try:
-            # Run the subprocess with the project config path as an argument
-            result = subprocess.run(
-                ["python", "-m", "src.main", "--config", str(project_config_path)],
-                check=True  # This will raise an exception if the process exits with non-zero status
-            )
-            
-            logger.info("Trailer generation process completed with exit code %d", result.returncode)
-            
-            # Find the generated trailer file in the project-specific trailer directory
-            trailer_path = trailer_dir / "final_trailer.mp4"
-            
-            if trailer_path.exists():
-                logger.info("Found generated trailer at %s", trailer_path)
-                # Return both the input video path and the trailer path
-                return {
-                    "status": "success", 
-                    "project_name": project_name,
-                    "input_video": video_path,
-                    "trailer": str(trailer_path),
-                    "download_url": f"{base_url}/download_trailer?project={project_name}"
-                }
-            else:
-                logger.error("Trailer generation completed but no trailer file found at %s", trailer_path)
-                return {
-                    "status": "error", 
-                    "message": "Trailer generation completed but no trailer file was found"
-                }
-            
-        except subprocess.CalledProcessError as e:
-            logger.error("Trailer generation failed with exit code %d", e.returncode)
-            
-            # Since we're not capturing output, we can't parse the error from process output
-            # But the logs will be visible in the server console
-            return {
-                "status": "error",
-                "message": "Trailer generation failed",
-                "error": f"Process failed with exit code {e.returncode}",
-                "log_available": True  # Indicate that full logs are available on the server
-            }
+@app.post("/generate_trailers")
+async def generate_trailers(request: Request):
+    """Queue a batch of trailers of the same video.
 
-        logger.info("Trailer generation complete")
-        return {"status": "success", "video": video_path}
+    The video is downloaded, sampled and embedded once, only the plot-side
+    steps run for each variant. Batches are not down-tuned by the admission
+    control, the variants share the frame settings.
+
+    Returns:
+        dict: Job ID, status URL and project name of each variant
+    """
+    import re
+    import time
+    import uuid
+
+    from src.batch import get_variant_context
+
+    base_url = str(request.base_url).rstrip("/")
+    try:
+        data = await request.json()
     except json.JSONDecodeError as e:
         return {"error": f"Invalid JSON format: {str(e)}"}
-    except Exception as e:
-        return {"error": f"An error occurred: {str(e)}"}
+
+    file_id = data.get("file_id")
+    if not file_id:
+        return {"error": "Missing 'file_id' parameter"}
+    variants = data.get("variants")
+    if not variants or not isinstance(variants, list):
+        return {"error": "Missing or empty 'variants' list"}
+    for idx, variant in enumerate(variants):
+        if not str(variant.get("plot", "")).strip():
+            return {"error": f"Missing or empty 'plot' in variant {idx + 1}"}
+        variant["name"] = re.sub(r"[^\w-]", "_", str(variant.get("name") or idx + 1))
+    if len({variant["name"] for variant in variants}) != len(variants):
+        return {"error": "Variant names must be unique"}
+
+    project_name = data.get("project_name") or f"batch_{file_id[-6:]}_{int(time.time())}"
+    project_name = re.sub(r"[^\w-]", "_", project_name)
+    project_configs = merge_configs(
+        get_default_context().configs,
+        {"project_name": project_name, "video_file_id": file_id},
+    )
+    context = ProjectContext.from_configs(project_configs)
+    project_configs["video_path"] = str(context.movies_dir / f"input_{file_id[-6:]}.mp4")
+    context = ProjectContext.from_configs(project_configs)
+
+    try:
+        variant_projects = {
+            variant["name"]: get_variant_context(context, variant).configs["project_name"]
+            for variant in variants
+        }
+    except ValueError as e:
+        return {"error": str(e)}
+
+    context.ensure_dirs()
+    project_config_path = context.project_dir / "project_config.yaml"
+    project_config_path.write_text(yaml.safe_dump(project_configs))
+
+    job_id = uuid.uuid4().hex
+    queue = get_job_queue()
+    queue.store.create(
+        job_id,
+        {
+            "project_name": project_name,
+            "file_id": file_id,
+            "config_path": str(project_config_path),
+            "variants": variants,
+            "variant_projects": variant_projects,
+        },
+    )
+    queue.submit(job_id)
+    logger.info("Queued batch job %s with %s variants", job_id, len(variants))
+    return {
+        "status": "queued",
+        "job_id": job_id,
+        "project_name": project_name,
+        "variant_projects": variant_projects,
+        "status_url": f"{base_url}/jobs/{job_id}",
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request):
+    """Status of a trailer job.
+
+    Args:
+        job_id: ID returned by `POST /generate_trailer`
+
+    Returns:
+        dict: Job status, current step, status of each step and, once
+            completed, the trailer download URL
+    """
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        return Response(content=f"Job {job_id} not found", status_code=404)
+
+    project_name = job["params"]["project_name"]
+    response = {
+        "job_id": job_id,
+        "status": job["status"],
+        "project_name": project_name,
+        "stage": job["stage"],
+        "stages": job["stages"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+    if job["status"] == "completed":
+        base_url = str(request.base_url).rstrip('/')
+        response["result"] = job["result"]
+        if "variants" in job["params"]:
+            response["download_urls"] = {
+                name: f"{base_url}/download_trailer?project={job['params']['variant_projects'][name]}"
+                for name in job["result"]["trailers"]
+            }
+        else:
+            response["download_url"] = f"{base_url}/download_trailer?project={project_name}"
+    return response
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """Stream the progress of a trailer job as server-sent events.
+
+    The current job state is sent first as a `status` event, then a `progress`
+    event each time a step starts, processes more items (with an ETA) or ends,
+    and a final `done` event once the job completed or failed.
+
+    Args:
+        job_id: ID returned by `POST /generate_trailer`
+
+    Returns:
+        StreamingResponse: `text/event-stream` response
+    """
+    from src.jobs import FINISHED
+
+    queue = get_job_queue()
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def callback(event):
+        # Called from the job threads
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    # Subscribe before reading the job so no event is missed in between
+    queue.broker.subscribe(job_id, callback)
+    job = queue.store.get(job_id)
+    if job is None:
+        queue.broker.unsubscribe(job_id, callback)
+        return Response(content=f"Job {job_id} not found", status_code=404)
+
+    async def stream():
+        try:
+            yield format_sse("status", await get_job(job_id, request))
+            status = job["status"]
+            while status not in FINISHED:
+                try:
+                    event = await asyncio.wait_for(events.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeping proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                if "job_status" in event:
+                    status = event["job_status"]
+                else:
+                    yield format_sse("progress", event)
+            yield format_sse("done", await get_job(job_id, request))
+        finally:
+            queue.broker.unsubscribe(job_id, callback)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
 
 
 @app.get("/generate_trailer")
@@ -221,19 +533,25 @@ async def get_generate_trailer():
 
 
 @app.get("/download_trailer")
-async def download_trailer(project: str):
+async def download_trailer(project: str, request: Request):
     """Download the generated trailer file.
-    
+
+    Single byte ranges are served for seeking players and resumed downloads,
+    and the `ETag` and `Last-Modified` validators answer conditional requests
+    with a 304.
+
     Args:
         project: The project name to identify which trailer to download
-    
+
     Returns:
-        FileResponse: The trailer file as a downloadable response
+        StreamingResponse: The trailer file, or the requested range of it
     """
+    from src.serving import iter_file_range, prepare_file_response
+
     logger.info("Trailer download requested for project: %s", project)
     
     # Construct the path to the trailer file
-    project_dir = Path(f"{configs['project_dir']}/{project}")
+    project_dir = Path(f"{get_default_context().configs['project_dir']}/{project}")
     trailer_path = project_dir / "trailers" / "final_trailer.mp4"
     
     if not trailer_path.exists():
@@ -241,8 +559,17 @@ async def download_trailer(project: str):
         return Response(content=f"Trailer file not found for project {project}", status_code=404)
     
     logger.info("Serving trailer file: %s", trailer_path)
-    return FileResponse(
-        path=str(trailer_path),
-        filename=f"{project}_trailer.mp4",
-        media_type="video/mp4"
+    # Hashing a trailer for its ETag reads the file, kept off the event loop
+    served = await asyncio.to_thread(prepare_file_response, trailer_path, request.headers)
+    headers = {
+        **served["headers"],
+        "Content-Disposition": f'attachment; filename="{project}_trailer.mp4"',
+    }
+    if served["start"] is None:
+        return Response(status_code=served["status"], headers=headers)
+    return StreamingResponse(
+        iter_file_range(trailer_path, served["start"], served["end"]),
+        status_code=served["status"],
+        headers=headers,
+        media_type="video/mp4",
     )
@@ -0,0 +1,247 @@
+"""Benchmark every pipeline step and the whole pipeline on synthetic inputs.
+
+Videos and plots are generated locally and the TTS and CLIP models are replaced
+by the deterministic `tone` and `hash` stub backends, so the suite runs offline
+on a CPU only machine. Results are compared with a stored baseline to catch regressions.
+
+Usage:
+    python -m benchmarks.run --duration 60 --height 360
+    python -m benchmarks.run --save-baseline
+"""
+
+import argparse
+import json
+import logging
+import platform
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.synthetic import make_plot, make_video
+from src import common, instrumentation
+from src.common import ProjectContext
+from src.pipeline import PIPELINE_STAGES, run_pipeline
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
+
+BENCHMARKS_DIR = Path(__file__).parent
+# Steps benchmarked, plot retrieval needs network access
+BENCHMARK_STAGES = [name for name in PIPELINE_STAGES if name != "plot_retrieval"]
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the benchmark parameters.
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="AI Trailer benchmarks")
+    parser.add_argument("--duration", type=float, default=60, help="Video seconds")
+    parser.add_argument("--height", type=int, default=360, help="Video height")
+    parser.add_argument("--fps", type=int, default=24, help="Video frame rate")
+    parser.add_argument("--scenes", type=int, default=3, help="Number of scenes")
+    parser.add_argument("--n-frames", type=int, default=100, help="Frames sampled")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=BENCHMARKS_DIR / "results.json",
+        help="File to save the results to",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=BENCHMARKS_DIR / "baseline.json",
+        help="Results to compare with",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown relative to the baseline, 0.25 is 25%% slower",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save the results as the new baseline",
+    )
+    return parser.parse_args()
+
+
+def setup_project(work_dir: Path, name: str, video_path: Path, args) -> ProjectContext:
+    """Create a new benchmark project.
+
+    Args:
+        work_dir (Path): Directory holding the benchmark projects
+        name (str): Project name
+        video_path (Path): Synthetic video
+        args (argparse.Namespace): Benchmark parameters
+
+    Returns:
+        ProjectContext: Benchmark project context
+    """
+    configs = common.parse_configs(common.CONFIGS_PATH)
+    configs["project_dir"] = str(work_dir)
+    configs["project_name"] = name
+    configs["video_path"] = str(video_path)
+    configs["pipeline"]["incremental"] = False
+    configs["proxy"]["enabled"] = False
+    configs["frame_sampling"]["n_frames"] = args.n_frames
+    configs["voice"]["backend"] = "tone"
+    configs["frame_ranking"]["backend"] = "hash"
+    context = ProjectContext.from_configs(configs)
+    context.ensure_dirs()
+    context.plot_path.write_text(make_plot(args.scenes))
+    return context
+
+
+def summarize(report: dict) -> dict:
+    """Keep the numbers compared between runs.
+
+    Args:
+        report (dict): Run report
+
+    Returns:
+        dict: Wall time, items and throughput of each step
+    """
+    return {
+        name: {
+            "wall_seconds": record["wall_seconds"],
+            "items": record["items"],
+            "items_per_second": record["items_per_second"],
+        }
+        for name, record in report["stages"].items()
+    }
+
+
+def run_benchmarks(work_dir: Path, args) -> dict:
+    """Run every step on its own, then the whole pipeline.
+
+    Args:
+        work_dir (Path): Directory holding the benchmark inputs and projects
+        args (argparse.Namespace): Benchmark parameters
+
+    Returns:
+        dict: Benchmark results
+    """
+    video_path = make_video(
+        work_dir / "movies" / "synthetic.mp4", args.duration, args.height, args.fps
+    )
+
+    # One step at a time so steps do not compete for the CPU
+    context = setup_project(work_dir, "stages", video_path, args)
+    stages = {}
+    for stage_name in BENCHMARK_STAGES:
+        instrumentation.reset()
+        run_pipeline([stage_name], context, max_workers=1)
+        stages.update(summarize(instrumentation.get_run_report("completed")))
+
+    context = setup_project(work_dir, "pipeline", video_path, args)
+    instrumentation.reset()
+    run_pipeline(
+        BENCHMARK_STAGES,
+        context,
+        max_workers=context.configs["pipeline"]["max_workers"],
+    )
+    report = instrumentation.get_run_report("completed")
+
+    return {
+        "params": {
+            "duration": args.duration,
+            "height": args.height,
+            "fps": args.fps,
+            "scenes": args.scenes,
+            "n_frames": args.n_frames,
+        },
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "stages": stages,
+        "pipeline": {
+            "wall_seconds": report["wall_seconds"],
+            "peak_rss_mb": report["peak_rss_mb"],
+            "stages": summarize(report),
+        },
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Find the steps that got slower than the baseline allows.
+
+    Args:
+        results (dict): Benchmark results
+        baseline (dict): Baseline results
+        tolerance (float): Allowed slowdown, 0.25 is 25% slower
+
+    Returns:
+        list[str]: Description of each regression
+    """
+    timings = {name: r["wall_seconds"] for name, r in results["stages"].items()}
+    timings["pipeline"] = results["pipeline"]["wall_seconds"]
+    baseline_timings = {
+        name: r["wall_seconds"] for name, r in baseline["stages"].items()
+    }
+    baseline_timings["pipeline"] = baseline["pipeline"]["wall_seconds"]
+
+    regressions = []
+    for name, seconds in timings.items():
+        if name not in baseline_timings:
+            continue
+        change = seconds / baseline_timings[name] - 1
+        logger.info(
+            "%s: %.2fs, baseline %.2fs (%+.0f%%)",
+            name,
+            seconds,
+            baseline_timings[name],
+            change * 100,
+        )
+        if change > tolerance:
+            regressions.append(
+                f"{name} took {seconds:.2f}s, {change:.0%} slower than the baseline"
+            )
+    return regressions
+
+
+def main() -> int:
+    """Run the benchmarks and compare them with the baseline.
+
+    Returns:
+        int: Exit code, 1 if any step regressed
+    """
+    args = parse_args()
+    work_dir = Path(tempfile.mkdtemp(prefix="ai_trailer_benchmark_"))
+    try:
+        results = run_benchmarks(work_dir, args)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    args.output.write_text(json.dumps(results, indent=2))
+    logger.info("Benchmark results saved to %s", args.output)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        logger.info("Baseline saved to %s", args.baseline)
+        return 0
+
+    if not args.baseline.exists():
+        logger.warning("No baseline at %s, run with --save-baseline", args.baseline)
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["params"] != results["params"]:
+        logger.warning(
+            "Baseline was recorded with %s, not comparing", baseline["params"]
+        )
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        logger.error(regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
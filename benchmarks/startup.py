@@ -0,0 +1,135 @@
+"""Measure how long the entry points take to start.
+
+Each command runs in a fresh interpreter. The suite fails if a command is
+slower than `--max-ms` or if importing an entry point loads a heavy
+dependency that should only be imported on first use.
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeats 10 --max-ms 300
+"""
+
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
+
+REPO_DIR = Path(__file__).parent.parent
+# Dependencies taking seconds or gigabytes to import
+HEAVY_MODULES = [
+    "torch",
+    "TTS",
+    "sentence_transformers",
+    "moviepy",
+    "cv2",
+    "librosa",
+    "googleapiclient",
+    "imdb",
+    "pytube",
+]
+# Modules imported by each entry point
+ENTRY_POINTS = {
+    "api": ["api"],
+    "main": ["src.main"],
+    "pipeline": ["src.pipeline"],
+    "worker": ["src.worker"],
+    "steps": [
+        "src.subplot",
+        "src.voice",
+        "src.frame",
+        "src.image_retrieval",
+        "src.clip",
+        "src.audio_clip",
+        "src.join_clip",
+        "src.plot_retrieval",
+        "src.video_retrieval",
+    ],
+}
+COMMANDS = {
+    "import api": [sys.executable, "-c", "import api"],
+    "main --help": [sys.executable, "-m", "src.main", "--help"],
+}
+
+
+def get_heavy_imports(modules: list[str]) -> list[str]:
+    """Find the heavy dependencies loaded by importing some modules.
+
+    Args:
+        modules (list[str]): Modules to import
+
+    Returns:
+        list[str]: Heavy dependencies found in `sys.modules` after the import
+    """
+    code = (
+        "import importlib, json, sys\n"
+        f"for name in {modules!r}:\n"
+        "    importlib.import_module(name)\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def time_command(cmd: list[str], repeats: int) -> float:
+    """Time a command, keeping the fastest run to leave out system noise.
+
+    Args:
+        cmd (list[str]): Command to run
+        repeats (int): Number of runs
+
+    Returns:
+        float: Fastest run in milliseconds
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=REPO_DIR, capture_output=True, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def main() -> int:
+    """Measure startup times and check for heavy imports.
+
+    Returns:
+        int: Exit code, 1 if any check failed
+    """
+    parser = argparse.ArgumentParser(description="AI Trailer startup benchmark")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per command")
+    parser.add_argument(
+        "--max-ms", type=float, default=500, help="Slowest allowed startup"
+    )
+    args = parser.parse_args()
+
+    failures = []
+    for name, modules in ENTRY_POINTS.items():
+        heavy_imports = get_heavy_imports(modules)
+        logger.info("Importing %s loads: %s", name, heavy_imports or "nothing heavy")
+        if heavy_imports:
+            failures.append(f"Importing {name} loads {heavy_imports}")
+
+    for name, cmd in COMMANDS.items():
+        elapsed_ms = time_command(cmd, args.repeats)
+        logger.info("%s: %.0f ms", name, elapsed_ms)
+        if elapsed_ms > args.max_ms:
+            failures.append(f"{name} took {elapsed_ms:.0f} ms, over {args.max_ms} ms")
+
+    for failure in failures:
+        logger.error(failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import numpy as np
+from moviepy import AudioClip, ColorClip, VideoClip, concatenate_videoclips
+
+# Colors of the solid shots alternating with noise shots, so the video has
+# both easy and hard to encode content
+SHOT_COLORS = [(200, 40, 40), (40, 200, 40), (40, 40, 200), (200, 200, 40)]
+
+
+def make_sine(t: np.ndarray, frequency: float) -> np.ndarray:
+    """Stereo sine wave.
+
+    Args:
+        t (np.ndarray): Times in seconds
+        frequency (float): Frequency in Hz
+
+    Returns:
+        np.ndarray: Samples with shape (len(t), 2)
+    """
+    wave_samples = 0.3 * np.sin(2 * np.pi * frequency * np.asarray(t))
+    return np.stack([wave_samples, wave_samples], axis=-1)
+
+
+def make_video(
+    path: Path, duration: float, height: int, fps: int, seed: int = 0
+) -> Path:
+    """Create a synthetic video of solid color and noise shots with a sine track.
+
+    Args:
+        path (Path): Output video file
+        duration (float): Video length in seconds
+        height (int): Frame height, the width follows a 16:9 ratio
+        fps (int): Frames per second
+        seed (int): Seed of the noise frames
+
+    Returns:
+        Path: Output video file
+    """
+    size = (height * 16 // 9 // 2 * 2, height)
+    shot_len = 2.0
+    n_shots = max(1, int(np.ceil(duration / shot_len)))
+
+    shots = []
+    for shot_idx in range(n_shots):
+        shot_duration = min(shot_len, duration - shot_idx * shot_len)
+        if shot_idx % 2 == 0:
+            color = SHOT_COLORS[(shot_idx // 2) % len(SHOT_COLORS)]
+            shot = ColorClip(size=size, color=color, duration=shot_duration)
+        else:
+            rng = np.random.default_rng(seed + shot_idx)
+            noise = rng.integers(0, 256, (8, height, size[0], 3), dtype=np.uint8)
+            shot = VideoClip(
+                lambda t, noise=noise: noise[int(t * fps) % len(noise)],
+                duration=shot_duration,
+            )
+        shots.append(shot)
+
+    video = concatenate_videoclips(shots)
+    audio = AudioClip(lambda t: make_sine(t, 220), duration=video.duration, fps=44100)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    video.with_audio(audio).write_videofile(
+        str(path), fps=fps, codec="libx264", preset="ultrafast", logger=None
+    )
+    return path
+
+
+def make_plot(n_scenes: int) -> str:
+    """Create a plot with one sentence per scene.
+
+    Args:
+        n_scenes (int): Number of scenes
+
+    Returns:
+        str: Plot text
+    """
+    return " ".join(
+        f"Scene {idx + 1} shows a synthetic shot number {idx + 1}."
+        for idx in range(n_scenes)
+    )
@@ -16,13 +16,14 @@ def print_header(message):
 def check_config_and_dirs():
     print_header("CHECKING CONFIGURATION AND DIRECTORIES")
     try:
-        from src.common import configs, MOVIES_DIR, PROJECT_DIR, FRAMES_DIR, TRAILER_DIR
-        
-        print(f"✓ Project directory: {PROJECT_DIR}")
-        print(f"✓ Movies directory: {MOVIES_DIR}")
-        print(f"✓ Frames directory: {FRAMES_DIR}")
-        print(f"✓ Trailer directory: {TRAILER_DIR}")
-        print(f"✓ Video path: {configs['video_path']}")
+        from src.common import load_project_context
+
+        context = load_project_context()
+        print(f"✓ Project directory: {context.project_dir}")
+        print(f"✓ Movies directory: {context.movies_dir}")
+        print(f"✓ Frames directory: {context.frames_dir}")
+        print(f"✓ Trailer directory: {context.trailer_dir}")
+        print(f"✓ Video path: {context.configs['video_path']}")
         
         return True
     except Exception as e:
@@ -89,33 +90,25 @@ def check_video_path_flow():
     print_header("CHECKING VIDEO PATH FLOW")
     
     # Check if configs["video_path"] is used consistently
-    from src.common import configs
-    print(f"Current video path in configs: {configs['video_path']}")
-    
-    # Set a test value
+    from src.common import load_project_context
+    context = load_project_context()
+    print(f"Current video path in configs: {context.configs['video_path']}")
+
+    # Override it in a new context, the original one must not change
     test_path = "test_video_path.mp4"
-    old_path = configs["video_path"]
-    configs["video_path"] = test_path
-    
-    print(f"Updated video path in configs to: {configs['video_path']}")
-    
-    # Import a module that uses video_path to check if it picks up the change
+    test_context = context.with_overrides({"video_path": test_path})
+    print(f"Updated video path in configs to: {test_context.configs['video_path']}")
+
     try:
-        # Force reload the clip module to pick up the new config
-        if 'src.clip' in sys.modules:
-            del sys.modules['src.clip']
-        
-        import src.clip
-        print("✓ Updated video path propagated to imported modules")
-        
-        # Restore the original path
-        configs["video_path"] = old_path
-        print(f"Restored video path in configs to: {configs['video_path']}")
-        
+        # The pipeline hands the video path of its context to the steps
+        from src.pipeline import load_artifact
+        if load_artifact("video", test_context) != test_path:
+            raise ValueError("the pipeline did not pick up the new video path")
+        if load_artifact("video", context) == test_path:
+            raise ValueError("the override leaked into the original context")
+        print("✓ Updated video path propagated to the pipeline steps")
         return True
     except Exception as e:
-        # Restore the original path
-        configs["video_path"] = old_path
         print(f"✗ Error testing video path propagation: {e}")
         return False
 
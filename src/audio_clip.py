@@ -1,18 +1,38 @@
 import logging
-import shutil
-
-from moviepy import AudioFileClip, CompositeAudioClip, VideoFileClip
+from pathlib import Path
+
+from src.checkpoint import WorkManifest, get_file_params
+from src.common import ProjectContext
+from src.encoding import (
+    encode_timer,
+    get_moviepy_args,
+    get_profile,
+    log_encode_timings,
+)
+from src.instrumentation import report_progress
 
-from src.common import SCENES_DIR, configs, PROJECT_DIR
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
 
 
-def get_audio_clips(clip_volume: float, voice_volume: float) -> None:
+def get_audio_clips(
+    scenes_dir: list[Path],
+    clip_volume: float,
+    voice_volume: float,
+    profile: dict,
+    project_dir: Path,
+) -> None:
     """Add generated voice to each clip.
 
     Args:
+        scenes_dir (list[Path]): Scene directories
         clip_volume (float): Volume of the original clip used for the audio clip
         voice_volume (float): Volume of the generated voice used for the audio clip
+        profile (dict): Encoding profile of the audio clips
+        project_dir (Path): Project directory, also searched for clips and audios
     """
+    from moviepy import AudioFileClip, CompositeAudioClip, VideoFileClip
+
     logger.info(
         "Starting audio clip creation with clip_volume: %s, voice_volume: %s",
         clip_volume,
@@ -21,17 +41,18 @@ def get_audio_clips(clip_volume: float, voice_volume: float) -> None:
     total_audio_clips_created = 0
 
     # Log all scene directories we're working with
-    logger.info("Scene directories to process: %s", [str(d) for d in SCENES_DIR])
+    logger.info("Scene directories to process: %s", [str(d) for d in scenes_dir])
 
-    for idx, scene_dir in enumerate(SCENES_DIR):
+    for idx, scene_dir in enumerate(scenes_dir):
+        report_progress("audio_clip", idx, len(scenes_dir))
         logger.info("\n==== Processing scene %s at path: %s ====", idx + 1, scene_dir)
         clips_dir = scene_dir / "clips"
         audios_dir = scene_dir / "audios"
         audio_clips_dir = scene_dir / "audio_clips"
 
         # Define possible locations for clips and audios
-        clips_locations = [clips_dir, PROJECT_DIR / "clips"]
-        audios_locations = [audios_dir, PROJECT_DIR / "audios"]
+        clips_locations = [clips_dir, project_dir / "clips"]
+        audios_locations = [audios_dir, project_dir / "audios"]
 
         # Look for clip files in all possible locations
         clip_files = []
@@ -63,12 +84,8 @@ def get_audio_clips(clip_volume: float, voice_volume: float) -> None:
             "Directories verified: clips_dir=%s, audios_dir=%s", clips_dir, audios_dir
         )
 
-        if audio_clips_dir.exists():
-            logger.info("Removing existing audio_clips directory: %s", audio_clips_dir)
-            shutil.rmtree(audio_clips_dir)
-
-        logger.info("Creating audio_clips directory: %s", audio_clips_dir)
-        audio_clips_dir.mkdir(parents=True, exist_ok=True)
+        # Audio clips completed by a previous, interrupted run are kept
+        work = WorkManifest(audio_clips_dir)
 
         # Check for audio files
         audio_files = list(audios_dir.glob("*.wav"))
@@ -81,6 +98,7 @@ def get_audio_clips(clip_volume: float, voice_volume: float) -> None:
 
         if not audio_files:
             logger.error("No audio files found in %s", audios_dir)
+            work.finalize()
             continue
 
         # Log all clip files available
@@ -125,6 +143,19 @@ def get_audio_clips(clip_volume: float, voice_volume: float) -> None:
                     clip_name = clip_path.stem
                     logger.info("Processing clip: %s", clip_name)
 
+                    output_path = audio_clips_dir / f"audio_clip_{clip_name}.mp4"
+                    params = {
+                        "clip": get_file_params(clip_path),
+                        "voice": get_file_params(audio_path),
+                        "clip_volume": clip_volume,
+                        "voice_volume": voice_volume,
+                        "profile": profile,
+                    }
+                    if work.is_complete(output_path, params):
+                        logger.info("Audio clip already rendered: %s", output_path)
+                        scene_audio_clips += 1
+                        continue
+
                     try:
                         logger.info("Loading video clip: %s", clip_path)
                         clip = VideoFileClip(str(clip_path))
@@ -148,15 +179,19 @@ def get_audio_clips(clip_volume: float, voice_volume: float) -> None:
                         )
                         logger.info("Composite audio created successfully")
 
-                        output_path = f"{audio_clips_dir}/audio_clip_{clip_name}.mp4"
                         logger.info("Writing audio clip to: %s", output_path)
 
                         final_clip = clip.with_audio(mixed_audio)
                         logger.info("Audio attached to clip")
 
-                        final_clip.write_videofile(
-                            output_path,
-                        )
+                        with work.atomic_output(output_path) as tmp_path, encode_timer(
+                            "audio_clip", profile, output_path
+                        ):
+                            final_clip.write_videofile(
+                                str(tmp_path),
+                                **get_moviepy_args(profile),
+                            )
+                        work.record(output_path, params)
 
                         scene_audio_clips += 1
                         total_audio_clips_created += 1
@@ -172,24 +207,45 @@ def get_audio_clips(clip_volume: float, voice_volume: float) -> None:
 
                 logger.error("Traceback: %s", traceback.format_exc())
 
+        work.finalize()
         logger.info(
             "\n==== Completed scene %s - Created %s audio clips ====",
             idx + 1,
             scene_audio_clips,
         )
 
+    log_encode_timings("audio_clip")
     logger.info(
         "\n*** Audio clip creation complete. Total clips created: %s ***",
         total_audio_clips_created,
     )
 
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__file__)
+def run(context: ProjectContext, scenes: list[Path]) -> dict:
+    """Audio clip creation step.
 
-logger.info("\n##### Starting step 6 audio clip creation #####\n")
+    Args:
+        context (ProjectContext): Project the step runs for
+        scenes (list[Path]): Scene directories
 
-get_audio_clips(
-    configs["audio_clip"]["clip_volume"],
-    configs["audio_clip"]["voice_volume"],
-)
+    Returns:
+        dict: `audio_clips` artifact with the audio clips directory of each scene
+    """
+    logger.info("\n##### Starting step 6 audio clip creation #####\n")
+    configs = context.configs
+
+    get_audio_clips(
+        scenes,
+        configs["audio_clip"]["clip_volume"],
+        configs["audio_clip"]["voice_volume"],
+        get_profile(configs, "audio_clip"),
+        context.project_dir,
+    )
+    return {"audio_clips": [scene_dir / "audio_clips" for scene_dir in scenes]}
+
+
+if __name__ == "__main__":
+    from src.common import load_project_context
+    from src.pipeline import run_pipeline
+
+    run_pipeline(["audio_clip"], load_project_context())
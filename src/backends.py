@@ -0,0 +1,245 @@
+import importlib
+import logging
+import wave
+import zlib
+from typing import Any, Callable, Optional, Protocol, Union
+
+import numpy as np
+
+from src.models import get_model
+
+logger = logging.getLogger(__file__)
+
+# Seconds of speech generated for each word by the tone synthesizer
+TONE_SECONDS_PER_WORD = 0.3
+TONE_SAMPLE_RATE = 24000
+
+
+class SpeechSynthesizer(Protocol):
+    """Model turning text into a voice audio file, e.g. Coqui TTS."""
+
+    def tts_to_file(self, text: str, file_path: str, **kwargs: Any) -> Any:
+        """Voice a text and save it as a WAV file.
+
+        Args:
+            text (str): Text that will be voiced
+            file_path (str): Output WAV file
+            **kwargs: Backend specific arguments, e.g. `speaker_wav` and `language`
+        """
+
+
+class Embedder(Protocol):
+    """Model embedding texts and images in the same space, e.g. CLIP."""
+
+    def encode(self, inputs: list, **kwargs: Any) -> np.ndarray:
+        """Embed texts or images.
+
+        Args:
+            inputs (list): Texts or PIL images
+            **kwargs: Backend specific arguments, e.g. `batch_size`
+
+        Returns:
+            np.ndarray: Embeddings with shape (len(inputs), dim)
+        """
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        """Embedding size."""
+
+
+class ToneSynthesizer:
+    """Deterministic speech stub, voices are sine tones as long as the text."""
+
+    def tts_to_file(self, text: str, file_path: str, **kwargs: Any) -> str:
+        """Write a sine tone as long as the text would take to read.
+
+        Args:
+            text (str): Text that would be voiced
+            file_path (str): Output WAV file
+
+        Returns:
+            str: Output WAV file
+        """
+        duration = max(1.0, TONE_SECONDS_PER_WORD * len(text.split()))
+        frequency = 200 + zlib.crc32(text.encode()) % 400
+        t = np.arange(int(duration * TONE_SAMPLE_RATE)) / TONE_SAMPLE_RATE
+        samples = (0.3 * np.sin(2 * np.pi * frequency * t) * 32767).astype(np.int16)
+        with wave.open(file_path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(TONE_SAMPLE_RATE)
+            f.writeframes(samples.tobytes())
+        return file_path
+
+
+class HashEmbedder:
+    """Deterministic embedding stub.
+
+    Texts are embedded from a vector seeded by their checksum and images from a
+    thumbnail through a fixed random projection, so similar frames still get
+    similar embeddings and results do not change between runs or machines.
+    """
+
+    def __init__(self, dim: int = 512, thumbnail_size: int = 8):
+        self.dim = dim
+        self.thumbnail_size = thumbnail_size
+        self.projection = np.random.default_rng(0).normal(
+            size=(thumbnail_size * thumbnail_size * 3, dim)
+        )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Embedding size.
+
+        Returns:
+            int: Embedding size
+        """
+        return self.dim
+
+    def encode(self, inputs: list, **kwargs: Any) -> np.ndarray:
+        """Embed texts and images.
+
+        Args:
+            inputs (list): Texts or PIL images
+
+        Returns:
+            np.ndarray: Normalized embeddings with shape (len(inputs), dim)
+        """
+        embeddings = np.zeros((len(inputs), self.dim), dtype=np.float32)
+        for idx, item in enumerate(inputs):
+            if isinstance(item, str):
+                rng = np.random.default_rng(zlib.crc32(item.encode()))
+                embedding = rng.normal(size=self.dim)
+            else:
+                thumbnail = item.convert("RGB").resize(
+                    (self.thumbnail_size, self.thumbnail_size)
+                )
+                pixels = np.asarray(thumbnail, dtype=np.float64).ravel() / 255 - 0.5
+                embedding = pixels @ self.projection
+            embeddings[idx] = embedding / (np.linalg.norm(embedding) or 1.0)
+        return embeddings
+
+
+def load_coqui_tts(model_id: str, device: str) -> SpeechSynthesizer:
+    """Load a Coqui TTS model, importing TTS and torch on first use.
+
+    Args:
+        model_id (str): Coqui TTS model ID
+        device (str): Device used by the model
+
+    Returns:
+        SpeechSynthesizer: Loaded TTS model
+    """
+    import torch.serialization
+    from TTS.api import TTS
+    from TTS.config.shared_configs import BaseDatasetConfig
+    from TTS.tts.configs.xtts_config import XttsConfig
+    from TTS.tts.models.xtts import XttsArgs, XttsAudioConfig
+
+    # Register safe globals for PyTorch serialization
+    torch.serialization.add_safe_globals(
+        [XttsConfig, XttsAudioConfig, BaseDatasetConfig, XttsArgs]
+    )
+    return TTS(model_name=model_id).to(device)
+
+
+def load_sentence_transformer(model_id: str, device: str) -> Embedder:
+    """Load a Sentence Transformers model, importing it on first use.
+
+    Args:
+        model_id (str): Sentence Transformers model ID
+        device (str): Device used by the model
+
+    Returns:
+        Embedder: Loaded similarity model
+    """
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_id, device=device)
+
+
+def load_tone_synthesizer(model_id: str, device: str) -> SpeechSynthesizer:
+    """Create the tone speech stub, model and device are ignored.
+
+    Args:
+        model_id (str): Unused
+        device (str): Unused
+
+    Returns:
+        SpeechSynthesizer: Tone synthesizer
+    """
+    return ToneSynthesizer()
+
+
+def load_hash_embedder(model_id: str, device: str) -> Embedder:
+    """Create the hash embedding stub, model and device are ignored.
+
+    Args:
+        model_id (str): Unused
+        device (str): Unused
+
+    Returns:
+        Embedder: Hash embedder
+    """
+    return HashEmbedder()
+
+
+# Loaders of each backend kind as `module:function`, imported on first use so
+# other backends can live in modules with heavy dependencies
+BACKENDS = {
+    "speech": {
+        "coqui": "src.backends:load_coqui_tts",
+        "tone": "src.backends:load_tone_synthesizer",
+    },
+    "embedding": {
+        "sentence_transformers": "src.backends:load_sentence_transformer",
+        "hash": "src.backends:load_hash_embedder",
+    },
+}
+
+
+def register_backend(kind: str, name: str, target: str) -> None:
+    """Register another backend implementation.
+
+    Args:
+        kind (str): Backend kind, `speech` or `embedding`
+        name (str): Backend name used in the configs
+        target (str): Loader as `module:function`, called with the model ID and
+            device
+    """
+    BACKENDS[kind][name] = target
+
+
+def get_loader(kind: str, name: str) -> Callable[[str, str], Any]:
+    """Import the loader of a backend.
+
+    Args:
+        kind (str): Backend kind, `speech` or `embedding`
+        name (str): Backend name
+
+    Returns:
+        Callable[[str, str], Any]: Function loading the model from its ID and device
+    """
+    if name not in BACKENDS[kind]:
+        raise ValueError(
+            f"Unknown {kind} backend '{name}', available: {list(BACKENDS[kind])}"
+        )
+    module_name, func_name = BACKENDS[kind][name].split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def load_backend(
+    kind: str, name: str, model_id: str, device: str
+) -> Union[SpeechSynthesizer, Embedder]:
+    """Load a backend model once per process.
+
+    Args:
+        kind (str): Backend kind, `speech` or `embedding`
+        name (str): Backend name, e.g. `coqui`
+        model_id (str): Model ID passed to the loader
+        device (str): Device passed to the loader
+
+    Returns:
+        Union[SpeechSynthesizer, Embedder]: Loaded model, shared by the threads
+            of the process with its calls run one at a time
+    """
+    loader = get_loader(kind, name)
+    return get_model((kind, name, model_id, device), lambda: loader(model_id, device))
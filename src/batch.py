@@ -0,0 +1,253 @@
+"""Render several trailers of the same video, sharing all the video-side work.
+
+The video is downloaded, sampled and embedded once in a base project. Each
+variant (a different plot, language or voice) is a project of its own that
+links those artifacts and only runs the plot-side steps.
+
+Usage:
+    python -m src.batch --variants variants.yaml
+    python -m src.batch --config configs.yaml --variants variants.yaml
+
+The variants file lists the `name`, `plot` (or `plot_path`) and optional
+config `overrides` of each trailer.
+"""
+
+import argparse
+import contextvars
+import logging
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+import yaml
+
+from src.common import CONFIGS_PATH, ProjectContext, parse_configs
+from src.manifest import get_config_subtree
+from src.pipeline import PIPELINE_STAGES, STAGES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
+
+# Steps depending only on the video, run once for every variant
+VIDEO_STAGES = ["frame", "frame_embedding"]
+# Steps depending on the plot, run for each variant
+VARIANT_STAGES = [name for name in PIPELINE_STAGES if name not in VIDEO_STAGES]
+# Project directories holding video-side artifacts, linked into the variants
+SHARED_DIRS = ["frames", "proxy"]
+
+
+def get_video_stages(context: ProjectContext) -> list[str]:
+    """Steps producing the video-side artifacts of a batch.
+
+    Args:
+        context (ProjectContext): Base project context
+
+    Returns:
+        list[str]: Step names, with the download first if the video has a file ID
+    """
+    if context.configs.get("video_file_id"):
+        return ["video_download", *VIDEO_STAGES]
+    return list(VIDEO_STAGES)
+
+
+def get_variant_context(base: ProjectContext, variant: dict) -> ProjectContext:
+    """Build the context of a variant and check it can share the base artifacts.
+
+    Args:
+        base (ProjectContext): Base project context
+        variant (dict): Variant `name` and optional config `overrides`
+
+    Returns:
+        ProjectContext: Variant project context
+
+    Raises:
+        ValueError: If the variant changes a config used by the video steps
+    """
+    context = base.with_overrides(
+        {
+            **variant.get("overrides", {}),
+            "project_name": f"{base.configs['project_name']}_{variant['name']}",
+        }
+    )
+    config_keys = [
+        key for name in get_video_stages(base) for key in STAGES[name].config_keys
+    ]
+    changed = [
+        key
+        for key, value in get_config_subtree(context.configs, config_keys).items()
+        if get_config_subtree(base.configs, [key])[key] != value
+    ]
+    if changed:
+        raise ValueError(
+            f"Variant {variant['name']} changes {changed}, "
+            "which the variants of a batch must share"
+        )
+    return context
+
+
+def link_tree(source: Path, dest: Path) -> None:
+    """Hard-link every file of a directory, copying them across file systems.
+
+    Args:
+        source (Path): Directory to link
+        dest (Path): Linked directory, replaced if it exists
+    """
+    if dest.exists():
+        shutil.rmtree(dest)
+    for path in source.rglob("*"):
+        target = dest / path.relative_to(source)
+        if path.is_dir():
+            target.mkdir(parents=True, exist_ok=True)
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copy2(path, target)
+
+
+def link_video_artifacts(base: ProjectContext, context: ProjectContext) -> None:
+    """Make the video-side artifacts of the base project available to a variant.
+
+    Frames and proxies are linked, the embeddings are saved again pointing to
+    the linked frames, so a variant keeps working if the base is deleted.
+
+    Args:
+        base (ProjectContext): Base project context
+        context (ProjectContext): Variant project context
+    """
+    from src.image_retrieval import load_image_embeddings, save_image_embeddings
+
+    for name in SHARED_DIRS:
+        if (base.project_dir / name).exists():
+            link_tree(base.project_dir / name, context.project_dir / name)
+
+    img_filepaths, img_emb = load_image_embeddings(base.project_dir)
+    img_filepaths = [
+        context.frames_dir / path.relative_to(base.frames_dir) for path in img_filepaths
+    ]
+    save_image_embeddings(img_filepaths, img_emb, context.project_dir)
+
+
+def write_variant(context: ProjectContext, plot: str) -> Path:
+    """Write the plot and configs of a variant project.
+
+    Args:
+        context (ProjectContext): Variant project context
+        plot (str): Plot text
+
+    Returns:
+        Path: Project configs file
+    """
+    context.ensure_dirs()
+    context.plot_path.write_text(plot)
+    config_path = context.project_dir / "project_config.yaml"
+    config_path.write_text(yaml.safe_dump(context.configs))
+    return config_path
+
+
+def run_batch(
+    base: ProjectContext,
+    variants: list[dict],
+    runner: Optional[Callable[[ProjectContext, list[str]], int]] = None,
+    max_workers: int = 1,
+) -> dict[str, int]:
+    """Render the trailers of every variant of a video.
+
+    Args:
+        base (ProjectContext): Base project context, holding the video
+        variants (list[dict]): Variant `name`, `plot` and optional `overrides`
+        runner (Optional[Callable[[ProjectContext, list[str]], int]]): Runs steps
+            of a project and returns an exit code, defaults to
+            `src.main.run_project`
+        max_workers (int): Number of variants rendered at the same time
+
+    Returns:
+        dict[str, int]: Exit code of each variant, 1 for all of them if the
+            video steps failed
+    """
+    if runner is None:
+        from src.main import run_project
+
+        runner = run_project
+
+    contexts = {
+        variant["name"]: get_variant_context(base, variant) for variant in variants
+    }
+    for variant in variants:
+        write_variant(contexts[variant["name"]], variant["plot"])
+
+    base.ensure_dirs()
+    video_stages = get_video_stages(base)
+    logger.info("Running the video steps %s of the batch once", video_stages)
+    if runner(base, video_stages) != 0:
+        logger.error("The video steps of the batch failed")
+        return {name: 1 for name in contexts}
+
+    def run_variant(name: str) -> int:
+        context = contexts[name]
+        logger.info("Rendering variant %s in %s", name, context.project_dir)
+        try:
+            link_video_artifacts(base, context)
+        except OSError:
+            logger.exception("Could not link the video artifacts of %s", name)
+            return 1
+        return runner(context, VARIANT_STAGES)
+
+    # Each variant gets its own run report
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, run_variant, name)
+            for name in contexts
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def load_variants(path: Path) -> list[dict]:
+    """Load a variants file, reading the plots given as files.
+
+    Args:
+        path (Path): YAML list of variants with a `name`, a `plot` or a
+            `plot_path` relative to the file, and optional `overrides`
+
+    Returns:
+        list[dict]: Variants with their `plot` text
+    """
+    variants = yaml.safe_load(Path(path).read_text())
+    for variant in variants:
+        if "plot" not in variant:
+            variant["plot"] = (Path(path).parent / variant["plot_path"]).read_text()
+    return variants
+
+
+def main() -> int:
+    """Render the trailers of a variants file.
+
+    Returns:
+        int: Exit code, 1 if any variant failed
+    """
+    parser = argparse.ArgumentParser(description="AI Trailer batch of variants")
+    parser.add_argument("--config", type=str, help="Base project configs")
+    parser.add_argument(
+        "--variants", type=str, required=True, help="YAML file listing the variants"
+    )
+    args = parser.parse_args()
+    configs_path = Path(args.config).resolve() if args.config else CONFIGS_PATH
+    variants = load_variants(Path(args.variants).resolve())
+
+    # Project paths in the configs are relative to the repository root
+    os.chdir(Path(__file__).parent.parent)
+    base = ProjectContext.from_configs(parse_configs(configs_path))
+    results = run_batch(
+        base, variants, max_workers=base.configs["batch"]["max_workers"]
+    )
+    for name, exit_code in results.items():
+        logger.info("Variant %s %s", name, "failed" if exit_code else "completed")
+    return int(any(results.values()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import itertools
+import logging
+import math
+import random
+import re
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__file__)
+
+AUDIO_CLIP_PATTERN = re.compile(r"audio_clip_clip_(?P<frame>\d+)_(?P<audio>.+)")
+
+
+def parse_audio_clip(clip_path: Path) -> Optional[tuple[int, str]]:
+    """Recover the source frame and voice of an audio clip from its name.
+
+    Args:
+        clip_path (Path): Audio clip named `audio_clip_clip_<frame>_<audio>.mp4`
+
+    Returns:
+        Optional[tuple[int, str]]: Frame number and audio file stem, None if the
+            name does not follow the pattern
+    """
+    match = AUDIO_CLIP_PATTERN.fullmatch(clip_path.stem)
+    if match is None:
+        return None
+    return int(match["frame"]), match["audio"]
+
+
+def count_candidates(all_scene_clips: list[list[Path]]) -> int:
+    """Count every possible trailer candidate.
+
+    Args:
+        all_scene_clips (list[list[Path]]): Audio clips available for each scene
+
+    Returns:
+        int: Number of combinations taking one clip from each scene
+    """
+    return math.prod(len(scene_clips) for scene_clips in all_scene_clips)
+
+
+def decode_candidate(index: int, sizes: list[int]) -> tuple[int, ...]:
+    """Map a candidate number to the clip index picked for each scene.
+
+    Args:
+        index (int): Candidate number in `[0, prod(sizes))`
+        sizes (list[int]): Number of clips available for each scene
+
+    Returns:
+        tuple[int, ...]: Clip index for each scene
+    """
+    indices = []
+    for size in reversed(sizes):
+        index, clip_idx = divmod(index, size)
+        indices.append(clip_idx)
+    return tuple(reversed(indices))
+
+
+def iter_candidates(
+    all_scene_clips: list[list[Path]],
+    max_candidates: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> Iterator[tuple[Path, ...]]:
+    """Lazily generate trailer candidates, one clip per scene.
+
+    When every combination fits within `max_candidates` they are enumerated in
+    order, otherwise a seeded sample of distinct combinations is drawn. The
+    first candidate is always made of the first clip of every scene.
+
+    Args:
+        all_scene_clips (list[list[Path]]): Audio clips available for each scene
+        max_candidates (Optional[int]): Maximum number of candidates, no cap if None
+        seed (Optional[int]): Seed used to sample candidates
+
+    Yields:
+        tuple[Path, ...]: Clip selected for each scene
+
+    Raises:
+        ValueError: If `max_candidates` is lower than 1
+    """
+    if max_candidates is not None and max_candidates < 1:
+        raise ValueError(f"max_candidates must be at least 1, got {max_candidates}")
+    total = count_candidates(all_scene_clips)
+    logger.info("Total possible trailer candidates: %s", total)
+
+    if total == 0:
+        return
+
+    if max_candidates is None or total <= max_candidates:
+        yield from itertools.product(*all_scene_clips)
+        return
+
+    sizes = [len(scene_clips) for scene_clips in all_scene_clips]
+    rng = random.Random(seed)
+    seen = {0}
+    yield tuple(scene_clips[0] for scene_clips in all_scene_clips)
+
+    while len(seen) < max_candidates:
+        index = rng.randrange(total)
+        if index in seen:
+            continue
+        seen.add(index)
+        yield tuple(
+            scene_clips[clip_idx]
+            for scene_clips, clip_idx in zip(
+                all_scene_clips, decode_candidate(index, sizes)
+            )
+        )
@@ -0,0 +1,209 @@
+"""Process a whole catalogue of titles in one long-lived process.
+
+Each catalogue item is a project of its own. The models are loaded by the first
+item and reused by the next ones, and the items are pipelined: while an item
+renders its clips and trailer, the next one is split, voiced, sampled and
+embedded.
+
+A catalogue is a YAML list or a CSV file whose items have a `name`, a `video`
+path, a `plot` text, a `plot_path` or an `imdb_id` to retrieve the plot from,
+and optional config `overrides` (a JSON object in CSV files).
+"""
+
+import contextvars
+import csv
+import json
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+import yaml
+
+from src.common import ProjectContext
+from src.cost_model import write_project_features
+
+logger = logging.getLogger(__file__)
+
+# Steps preparing an item, they overlap with the render of the previous item
+PREPARE_STAGES = [
+    "plot_retrieval",
+    "subplot",
+    "voice",
+    "frame",
+    "frame_embedding",
+    "image_retrieval",
+]
+# Steps rendering the clips and trailers of an item
+RENDER_STAGES = ["clip", "audio_clip", "join_clip"]
+
+
+def load_catalogue(path: Path) -> list[dict]:
+    """Load the items of a catalogue file.
+
+    Args:
+        path (Path): YAML or CSV catalogue, plot paths are relative to it
+
+    Returns:
+        list[dict]: Items with their `plot` text if it was given as a file
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            items = [
+                {key: value for key, value in row.items() if value}
+                for row in csv.DictReader(f)
+            ]
+        for item in items:
+            item["overrides"] = json.loads(item.get("overrides", "{}"))
+    else:
+        items = yaml.safe_load(path.read_text())
+
+    for item in items:
+        if "plot_path" in item:
+            item["plot"] = (path.parent / item["plot_path"]).read_text()
+    return items
+
+
+def get_item_context(base: ProjectContext, item: dict) -> ProjectContext:
+    """Build the project of a catalogue item and write its plot.
+
+    Args:
+        base (ProjectContext): Context every item starts from
+        item (dict): Catalogue item
+
+    Returns:
+        ProjectContext: Item project context
+
+    Raises:
+        ValueError: If the item has no plot, no IMDB ID and no plot from a
+            previous run
+    """
+    overrides = {**item.get("overrides", {}), "project_name": item["name"]}
+    if "video" in item:
+        overrides["video_path"] = item["video"]
+    if "imdb_id" in item:
+        overrides["plot_retrieval"] = {"video_id": str(item["imdb_id"])}
+    context = base.with_overrides(overrides)
+
+    context.ensure_dirs()
+    if "plot" in item:
+        context.plot_path.write_text(item["plot"])
+    elif "imdb_id" not in item and not context.plot_path.exists():
+        raise ValueError(f"Catalogue item {item['name']} has no plot nor IMDB ID")
+    return context
+
+
+def run_item_stages(context: ProjectContext, stages: list[str], phase: str) -> int:
+    """Run steps of a catalogue item, keeping a run report per phase.
+
+    Args:
+        context (ProjectContext): Item project context
+        stages (list[str]): Steps to run
+        phase (str): `prepare` or `render`
+
+    Returns:
+        int: Exit code, 1 if a step failed
+    """
+    from src.main import run_project
+
+    return run_project(context, stages, report_name=f"run_report_{phase}.json")
+
+
+def run_catalogue(
+    base: ProjectContext,
+    items: list[dict],
+    runner: Optional[Callable[[ProjectContext, list[str], str], int]] = None,
+) -> dict[str, str]:
+    """Generate the trailers of every catalogue item.
+
+    Items are prepared one after the other while the previous item renders in
+    a background thread, a failed item does not stop the catalogue.
+
+    Args:
+        base (ProjectContext): Context every item starts from
+        items (list[dict]): Catalogue items
+        runner (Optional[Callable[[ProjectContext, list[str], str], int]]): Runs
+            steps of a project for a phase and returns an exit code, defaults to
+            `run_item_stages`
+
+    Returns:
+        dict[str, str]: Status of each item, `completed` or the phase that failed
+    """
+    runner = runner or run_item_stages
+    results = {}
+    rendering: Optional[tuple[str, Future]] = None
+
+    def render(context: ProjectContext) -> str:
+        return (
+            "completed" if runner(context, RENDER_STAGES, "render") == 0 else "render"
+        )
+
+    def collect(rendering: tuple[str, Future]) -> None:
+        name, future = rendering
+        try:
+            results[name] = future.result()
+        except Exception:
+            logger.exception("Rendering %s failed", name)
+            results[name] = "render"
+        logger.info("Catalogue item %s: %s", name, results[name])
+
+    with ThreadPoolExecutor(max_workers=1) as render_executor:
+        for idx, item in enumerate(items):
+            name = item["name"]
+            logger.info("Preparing catalogue item %s/%s: %s", idx + 1, len(items), name)
+            try:
+                context = get_item_context(base, item)
+                # Each item keeps its own run report, steps run in a context copy
+                prepared = (
+                    contextvars.copy_context().run(
+                        runner, context, PREPARE_STAGES, "prepare"
+                    )
+                    == 0
+                )
+            except Exception:
+                logger.exception("Preparing %s failed", name)
+                prepared = False
+
+            if not prepared:
+                results[name] = "prepare"
+                logger.info("Catalogue item %s: %s", name, results[name])
+                continue
+            try:
+                # Calibrates the cost model once the item is rendered
+                write_project_features(context)
+            except Exception:
+                logger.exception("Could not save the cost features of %s", name)
+
+            # At most one item renders while the next one is prepared
+            if rendering is not None:
+                collect(rendering)
+            rendering = (
+                name,
+                render_executor.submit(contextvars.copy_context().run, render, context),
+            )
+        if rendering is not None:
+            collect(rendering)
+    return results
+
+
+def write_catalogue_report(path: Path, results: dict[str, str]) -> None:
+    """Save the status of every catalogue item.
+
+    Args:
+        path (Path): Output JSON file
+        results (dict[str, str]): Status of each item
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    failed = [name for name, status in results.items() if status != "completed"]
+    path.write_text(
+        json.dumps(
+            {
+                "items": results,
+                "completed": len(results) - len(failed),
+                "failed": failed,
+            },
+            indent=2,
+        )
+    )
+    logger.info("Catalogue report saved to %s", path)
@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from src.manifest import hash_file_content
+
+logger = logging.getLogger(__file__)
+
+WORK_MANIFEST_NAME = ".work_manifest.jsonl"
+TMP_DIR_NAME = ".tmp"
+
+
+class WorkManifest:
+    """Append-only record of the items a step completed in an output directory.
+
+    Every rendered item is written to a temporary file first and renamed into
+    place once complete, then appended to the manifest with the checksum of
+    its output. A step that crashed halfway can run again and only render the
+    items that are missing, changed or corrupt.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.path = output_dir / WORK_MANIFEST_NAME
+        self.tmp_dir = output_dir / TMP_DIR_NAME
+        self.items: dict[str, dict] = {}
+        self.kept: set[str] = set()
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        # Renders interrupted by a crash are never resumed from a partial file
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        if self.path.exists():
+            text = self.path.read_text()
+            for line in text.splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line torn by a crash while appending
+                    continue
+                self.items[record["output"]] = record
+            if text and not text.endswith("\n"):
+                # Drop the torn line so new records are not appended to it
+                self.write(self.items.values())
+
+    def is_complete(self, output_path: Path, params: dict) -> bool:
+        """Check if an item was already rendered with the same parameters.
+
+        Args:
+            output_path (Path): Output file of the item
+            params (dict): Everything the output depends on, JSON serializable
+
+        Returns:
+            bool: True if the output exists and matches its recorded checksum
+        """
+        record = self.items.get(output_path.name)
+        if record is None or record["params"] != params:
+            return False
+        if not output_path.exists():
+            return False
+        if hash_file_content(output_path) != record["checksum"]:
+            logger.warning("Output %s is corrupt, rendering it again", output_path)
+            return False
+        self.kept.add(output_path.name)
+        return True
+
+    @contextmanager
+    def atomic_output(self, output_path: Path) -> Iterator[Path]:
+        """Render an item to a temporary file moved into place on success.
+
+        The temporary file keeps the output file name since encoders pick the
+        container from its extension.
+
+        Args:
+            output_path (Path): Final output file of the item
+
+        Yields:
+            Iterator[Path]: Temporary path to write the item to
+        """
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.tmp_dir / output_path.name
+        try:
+            yield tmp_path
+            os.replace(tmp_path, output_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def record(self, output_path: Path, params: dict) -> None:
+        """Append a completed item to the manifest.
+
+        Args:
+            output_path (Path): Output file of the item
+            params (dict): Everything the output depends on, JSON serializable
+        """
+        record = {
+            "output": output_path.name,
+            "params": params,
+            "checksum": hash_file_content(output_path),
+        }
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.items[output_path.name] = record
+        self.kept.add(output_path.name)
+
+    def finalize(self) -> None:
+        """Remove outputs not produced by this run and compact the manifest."""
+        for path in self.output_dir.iterdir():
+            if path.is_file() and not path.name.startswith("."):
+                if path.name not in self.kept:
+                    logger.info("Removing stale output %s", path)
+                    path.unlink()
+
+        self.write(self.items[name] for name in sorted(self.kept))
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write(self, records: Iterable[dict]) -> None:
+        """Replace the manifest atomically.
+
+        Args:
+            records (Iterable[dict]): Records of the completed items
+        """
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            "".join(json.dumps(record, sort_keys=True) + "\n" for record in records)
+        )
+        os.replace(tmp_path, self.path)
+
+
+def get_file_params(path: Path) -> dict:
+    """Identify an input file without reading it.
+
+    Args:
+        path (Path): Input file
+
+    Returns:
+        dict: Path, size and modification time of the file
+    """
+    stat = path.stat()
+    return {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
@@ -1,24 +1,44 @@
 import logging
 import math
-import shutil
-import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from src.checkpoint import WorkManifest, get_file_params
+from src.common import ProjectContext
+from src.encoding import (
+    encode_timer,
+    get_moviepy_args,
+    get_profile,
+    log_encode_timings,
+)
+from src.instrumentation import report_progress
+from src.proxy import get_working_video_path
+
+if TYPE_CHECKING:
+    from moviepy import VideoFileClip
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__file__)
 
-import librosa
-from moviepy import VideoFileClip
 
-from src.common import SCENES_DIR, configs, PROJECT_DIR
-
-
-def get_clip(video: VideoFileClip, min_clip_len: int) -> None:
+def get_clip(
+    video: "VideoFileClip",
+    scenes_dir: list[Path],
+    min_clip_len: int,
+    profile: dict,
+    project_dir: Path,
+) -> None:
     """Create video clips based on individual frames
 
     Args:
         video (VideoFileClip): Video file source for the clips
+        scenes_dir (list[Path]): Scene directories
         min_clip_len (int): Minimum clip length
+        profile (dict): Encoding profile of the clips
+        project_dir (Path): Project directory, used when a scene has no audio or frames
     """
+    import librosa
+
     logger.info(
         "Starting clip creation with video: %s, min_clip_len: %s",
         video.filename,
@@ -34,40 +54,40 @@ def get_clip(video: VideoFileClip, min_clip_len: int) -> None:
     fps = video.fps
     clips_created = 0
 
-    for idx, scene_dir in enumerate(SCENES_DIR):
+    for idx, scene_dir in enumerate(scenes_dir):
+        report_progress("clip", idx, len(scenes_dir))
         logger.info("Generating clips for scene %s at path: %s", idx + 1, scene_dir)
         clip_dir = scene_dir / "clips"
 
-        # Check for audio files - look in both scene dir and project audio dir
+        # Check for audio files - fall back to the project audio dir if the scene
+        # has none
         scene_audio_dir = scene_dir / "audios"
-        project_audio_dir = PROJECT_DIR / "audios"
+        project_audio_dir = project_dir / "audios"
 
         audio_filepaths = []
         if scene_audio_dir.exists():
             audio_filepaths.extend(list(scene_audio_dir.glob("*.wav")))
-        if project_audio_dir.exists():
+        if not audio_filepaths and project_audio_dir.exists():
             audio_filepaths.extend(list(project_audio_dir.glob("*.wav")))
 
         logger.info("Found %s audio files for scene %s", len(audio_filepaths), idx + 1)
 
-        # Check for frame files - look in both scene dir and project frames dir
+        # Check for frame files - only fall back to every sampled frame if the
+        # scene has no retrieved frames
         scene_frames_dir = scene_dir / "frames"
-        project_frames_dir = PROJECT_DIR / "frames"
+        project_frames_dir = project_dir / "frames"
 
         frame_paths = []
         if scene_frames_dir.exists():
             frame_paths.extend(list(scene_frames_dir.glob("*.jpg")))
-        if project_frames_dir.exists():
+        if not frame_paths and project_frames_dir.exists():
             frame_paths.extend(list(project_frames_dir.glob("*.jpg")))
 
         logger.info("Found %s frame files for scene %s", len(frame_paths), idx + 1)
 
-        if clip_dir.exists():
-            logger.info("Removing existing clip directory: %s", clip_dir)
-            shutil.rmtree(clip_dir)
-
-        logger.info("Creating clip directory: %s", clip_dir)
-        clip_dir.mkdir(parents=True, exist_ok=True)
+        # Clips completed by a previous, interrupted run are kept
+        work = WorkManifest(clip_dir)
+        video_params = get_file_params(Path(video.filename))
 
         scene_clips = 0
         for audio_filepath in audio_filepaths:
@@ -87,19 +107,35 @@ def get_clip(video: VideoFileClip, min_clip_len: int) -> None:
                     clip_end = min((clip_start + audio_duration), video.duration)
                     logger.info("Clip time range: %s to %s", clip_start, clip_end)
 
+                    output_path = clip_dir / f"clip_{frame}_{audio_filename}.mp4"
+                    params = {
+                        "video": video_params,
+                        "start": clip_start,
+                        "end": clip_end,
+                        "profile": profile,
+                    }
+                    if work.is_complete(output_path, params):
+                        logger.info("Clip already rendered: %s", output_path)
+                        scene_clips += 1
+                        continue
+
                     try:
                         logger.info(
                             "Creating subclip from %s to %s", clip_start, clip_end
                         )
                         clip = video.subclipped(clip_start, clip_end)
 
-                        output_path = f"{clip_dir}/clip_{frame}_{audio_filename}.mp4"
                         logger.info("Writing clip to: %s", output_path)
 
-                        clip.write_videofile(
-                            output_path,
-                            logger=None,
-                        )
+                        with work.atomic_output(output_path) as tmp_path, encode_timer(
+                            "clip", profile, output_path
+                        ):
+                            clip.write_videofile(
+                                str(tmp_path),
+                                logger=None,
+                                **get_moviepy_args(profile),
+                            )
+                        work.record(output_path, params)
 
                         scene_clips += 1
                         clips_created += 1
@@ -109,16 +145,47 @@ def get_clip(video: VideoFileClip, min_clip_len: int) -> None:
             except Exception as e:
                 logger.error("Error processing audio %s: %s", audio_filename, e)
 
+        work.finalize()
         logger.info("Created %s clips for scene %s", scene_clips, idx + 1)
 
+    log_encode_timings("clip")
     logger.info("Clip creation complete. Total clips created: %s", clips_created)
 
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__file__)
-
-logger.info("\n##### Starting step 5 clip creation #####\n")
+def run(context: ProjectContext, video: str, scenes: list[Path]) -> dict:
+    """Clip creation step.
 
-video = VideoFileClip(configs["video_path"], audio=True)
+    Args:
+        context (ProjectContext): Project the step runs for
+        video (str): Path to the video file
+        scenes (list[Path]): Scene directories
 
-get_clip(video, configs["clip"]["min_clip_len"])
+    Returns:
+        dict: `clips` artifact with the clips directory of each scene
+    """
+    logger.info("\n##### Starting step 5 clip creation #####\n")
+    configs = context.configs
+
+    from moviepy import VideoFileClip
+
+    video_path = get_working_video_path(video, configs["proxy"], context.project_dir)
+    # Each run gets its own reader, they seek and stream from an FFmpeg pipe
+    video_clip = VideoFileClip(video_path, audio=True)
+    try:
+        get_clip(
+            video_clip,
+            scenes,
+            configs["clip"]["min_clip_len"],
+            get_profile(configs, "clip"),
+            context.project_dir,
+        )
+    finally:
+        video_clip.close()
+    return {"clips": [scene_dir / "clips" for scene_dir in scenes]}
+
+
+if __name__ == "__main__":
+    from src.common import load_project_context
+    from src.pipeline import run_pipeline
+
+    run_pipeline(["clip"], load_project_context())
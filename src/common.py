@@ -1,13 +1,18 @@
+import copy
 import logging
 import re
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
 import yaml
 
-
 logger = logging.getLogger(__file__)
 logging.basicConfig(level=logging.INFO)
 
+# Default configuration file, relative to the working directory
+CONFIGS_PATH = "configs.yaml"
+
 
 def parse_configs(configs_path: str) -> dict:
     """Parse configs from the YAML file.
@@ -24,77 +29,117 @@ def parse_configs(configs_path: str) -> dict:
     return config_data
 
 
-def initialize_with_config(project_configs: dict):
-    """Initialize the common module with project-specific configuration.
-    
-    This function sets up all global variables needed for the trailer generation
-    process based on the provided configuration.
-    
+def merge_configs(configs: dict, overrides: dict) -> dict:
+    """Deep merge config overrides.
+
     Args:
-        project_configs (dict): Project-specific configuration dictionary
+        configs (dict): Base configs, left untouched
+        overrides (dict): Values to override, nested dicts are merged
+
+    Returns:
+        dict: New configs
     """
-    # pylint: disable=global-statement
-    global configs, PROJECT_DIR, PLOT_PATH, FRAMES_DIR, TRAILER_DIR, MOVIES_DIR, SCENES_DIR
-    
-    # Store the configuration
-    configs = project_configs
-    logger.info("Initialized with project: %s", configs['project_name'])
-    
-    # Set up project directories
-    PROJECT_DIR = Path(f"{configs['project_dir']}/{configs['project_name']}")
-    PLOT_PATH = PROJECT_DIR / configs["plot_filename"]
-    FRAMES_DIR = PROJECT_DIR / "frames"
-    TRAILER_DIR = PROJECT_DIR / "trailers"
-    MOVIES_DIR = PROJECT_DIR / configs["movies_dir"]
-    
-    logger.info("Project directory: %s", PROJECT_DIR)
-    logger.info("Plot path: %s", PLOT_PATH)
-    
-    # Create essential directories if they don't exist
-    project_dirs = [PROJECT_DIR, FRAMES_DIR, TRAILER_DIR, MOVIES_DIR]
-    for proj_dir in project_dirs:
-        proj_dir.mkdir(parents=True, exist_ok=True)
-        logger.info("Directory ensured: %s", proj_dir)
-    
-    # Look for scene directories
-    update_scenes_dir()
-
-
-def update_scenes_dir():
-    """Update the SCENES_DIR global variable based on current PROJECT_DIR.
-    
-    This function is used to refresh the list of scene directories, especially
-    after new scenes have been created during the trailer generation process.
+    merged = copy.deepcopy(configs)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_configs(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+@dataclass(frozen=True)
+class ProjectContext:
+    """Configs and paths of one trailer project, passed to every pipeline step.
+
+    Each context owns a private copy of its configs, so several projects can
+    run in the same process at the same time. Use `with_overrides` instead of
+    changing the configs in place.
+
+    Attributes:
+        configs (dict): Project configs, treat as read-only
+        project_dir (Path): Directory holding every project file
+        plot_path (Path): Plot file
+        frames_dir (Path): Frames sampled from the video
+        trailer_dir (Path): Generated trailers
+        movies_dir (Path): Videos downloaded for the project
     """
-    # pylint: disable=global-statement
-    global SCENES_DIR
-    SCENES_DIR = list(PROJECT_DIR.glob("scene_*"))
-    SCENES_DIR = sorted(
-        SCENES_DIR, key=lambda s: int(re.search(r"\d+", str(s)).group())
-    )  # Natural sort
-    logger.info("Found %s scene directories", len(SCENES_DIR))
 
+    configs: dict
+    project_dir: Path
+    plot_path: Path
+    frames_dir: Path
+    trailer_dir: Path
+    movies_dir: Path
+
+    @classmethod
+    def from_configs(cls, configs: dict) -> "ProjectContext":
+        """Build the context of the project described by some configs.
+
+        Args:
+            configs (dict): Project configs
+
+        Returns:
+            ProjectContext: Project context
+        """
+        configs = copy.deepcopy(configs)
+        project_dir = Path(f"{configs['project_dir']}/{configs['project_name']}")
+        return cls(
+            configs=configs,
+            project_dir=project_dir,
+            plot_path=project_dir / configs["plot_filename"],
+            frames_dir=project_dir / "frames",
+            trailer_dir=project_dir / "trailers",
+            movies_dir=project_dir / configs["movies_dir"],
+        )
+
+    def with_overrides(self, overrides: dict) -> "ProjectContext":
+        """Build a context with some configs changed.
+
+        Args:
+            overrides (dict): Values to override, nested dicts are merged
+
+        Returns:
+            ProjectContext: New project context
+        """
+        return ProjectContext.from_configs(merge_configs(self.configs, overrides))
+
+    @property
+    def scenes_dir(self) -> list[Path]:
+        """Scene directories currently in the project, in natural order.
+
+        Returns:
+            list[Path]: Scene directories
+        """
+        return sorted(
+            self.project_dir.glob("scene_*"),
+            key=lambda s: int(re.search(r"\d+", s.name).group()),
+        )
+
+    def ensure_dirs(self) -> None:
+        """Create the essential project directories if they don't exist."""
+        for directory in [
+            self.project_dir,
+            self.frames_dir,
+            self.trailer_dir,
+            self.movies_dir,
+        ]:
+            directory.mkdir(parents=True, exist_ok=True)
+            logger.info("Directory ensured: %s", directory)
+
+
+def load_project_context(configs_path: Optional[str] = None) -> ProjectContext:
+    """Load a project context from a configuration file.
 
-# Load default configuration if not being initialized with a specific project config
-# This will be overridden if initialize_with_config is called
-CONFIGS_PATH = "configs.yaml"
-logger.info("Loading default configuration from: %s", CONFIGS_PATH)
-configs = parse_configs(CONFIGS_PATH)
-
-# Set up default paths
-PROJECT_DIR = Path(f"{configs['project_dir']}/{configs['project_name']}")
-PLOT_PATH = PROJECT_DIR / configs["plot_filename"]
-FRAMES_DIR = PROJECT_DIR / "frames"
-TRAILER_DIR = PROJECT_DIR / "trailers"
-MOVIES_DIR = PROJECT_DIR / configs["movies_dir"]
-
-# Create essential directories if they don't exist
-for directory in [PROJECT_DIR, FRAMES_DIR, TRAILER_DIR, MOVIES_DIR]:
-    directory.mkdir(parents=True, exist_ok=True)
-    logger.info(f"Directory ensured: {directory}")
-
-# Initialize scenes directory
-SCENES_DIR = list(PROJECT_DIR.glob("scene_*"))
-SCENES_DIR = sorted(
-    SCENES_DIR, key=lambda s: int(re.search(r"\d+", str(s)).group())
-)  # Natural sort
+    Args:
+        configs_path (Optional[str]): Project configuration file, defaults to
+            `configs.yaml`
+
+    Returns:
+        ProjectContext: Project context
+    """
+    configs_path = configs_path or CONFIGS_PATH
+    logger.info("Loading configuration from: %s", configs_path)
+    context = ProjectContext.from_configs(parse_configs(configs_path))
+    logger.info("Project directory: %s", context.project_dir)
+    return context
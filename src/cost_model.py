@@ -0,0 +1,433 @@
+"""Predict the time and memory of a trailer job before it runs.
+
+The cost of a job grows with the video it decodes, the frames it embeds, the
+voices it synthesizes and the clips it renders. A linear model over those terms
+is calibrated on the run reports of the past projects, starting from default
+coefficients until enough projects were rendered.
+"""
+
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from src.common import ProjectContext
+from src.subplot import split_plot
+
+logger = logging.getLogger(__file__)
+
+# Features of each project, saved next to its run report for calibration
+FEATURES_FILENAME = "cost_features.json"
+# Step ending a project, runs split in phases are only complete once it ran
+LAST_STAGE = "join_clip"
+# Assumed when the source cannot describe the video yet, a feature-length HD film
+DEFAULT_VIDEO_INFO = {"duration": 2 * 3600, "width": 1920, "height": 1080}
+
+TERMS = (
+    "intercept",
+    "video_megapixel_seconds",
+    "n_frames",
+    "voice_items",
+    "clip_items",
+)
+# Coefficients used before any project was calibrated, CPU rendering
+DEFAULT_SECONDS = (60.0, 0.002, 0.1, 8.0, 3.0)
+DEFAULT_MEMORY_MB = (3000.0, 0.0, 0.5, 0.0, 5.0)
+# Weight of the default coefficients, as a number of past projects. Kept low so
+# the measured runs dominate, the defaults mostly split the cost between terms
+# the past projects did not vary
+PRIOR_WEIGHT = 0.1
+
+
+def get_job_features(configs: dict, plot: str, video_info: dict) -> dict:
+    """Describe the work of a job.
+
+    Args:
+        configs (dict): Project configs
+        plot (str): Plot text
+        video_info (dict): Video `duration` in seconds, `width` and `height`,
+            None values are replaced by `DEFAULT_VIDEO_INFO`
+
+    Returns:
+        dict: Job features
+    """
+    info = {
+        name: video_info.get(name) or default
+        for name, default in DEFAULT_VIDEO_INFO.items()
+    }
+    return {
+        **info,
+        "n_subplots": len(split_plot(plot, configs["subplot"]["split_char"])),
+        "n_frames": configs["frame_sampling"]["n_frames"],
+        "n_audios": configs["voice"]["n_audios"],
+        "n_retrieved_images": configs["frame_ranking"]["n_retrieved_images"],
+    }
+
+
+def write_project_features(context: ProjectContext) -> dict:
+    """Save the features of a project whose plot is written, for calibration.
+
+    Args:
+        context (ProjectContext): Project context, its video is probed if it
+            was already downloaded
+
+    Returns:
+        dict: Job features
+    """
+    from src.ffmpeg_tools import probe_media
+
+    video_info = {}
+    video_path = Path(context.configs["video_path"])
+    if video_path.exists():
+        infos = probe_media(video_path)
+        width, height = infos.get("video_size") or (None, None)
+        video_info = {
+            "duration": infos.get("duration"),
+            "width": width,
+            "height": height,
+        }
+    features = get_job_features(
+        context.configs, context.plot_path.read_text(), video_info
+    )
+    (context.project_dir / FEATURES_FILENAME).write_text(json.dumps(features))
+    return features
+
+
+def get_terms(features: dict) -> np.ndarray:
+    """Terms of the linear cost model, in `TERMS` order.
+
+    Args:
+        features (dict): Job features
+
+    Returns:
+        np.ndarray: Term values
+    """
+    voice_items = features["n_subplots"] * features["n_audios"]
+    return np.array(
+        [
+            1.0,
+            features["duration"] * features["width"] * features["height"] / 1e6,
+            features["n_frames"],
+            voice_items,
+            voice_items * features["n_retrieved_images"],
+        ],
+        dtype=float,
+    )
+
+
+def merge_phase_reports(reports: dict[str, dict]) -> dict:
+    """Combine the run reports of a project rendered in several runs.
+
+    Catalogue items and lease queue tasks keep a `run_report_<phase>.json` per
+    run. Their times add up to the work of the whole job, whether the runs
+    followed each other or ran on several nodes, and the peaks are the highest
+    of the runs.
+
+    Args:
+        reports (dict[str, dict]): Run report of each phase
+
+    Returns:
+        dict: Run report of the project, its steps prefixed by their phase
+    """
+    return {
+        "status": (
+            "completed"
+            if all(report["status"] == "completed" for report in reports.values())
+            else "failed"
+        ),
+        **{
+            name: sum(report[name] for report in reports.values())
+            for name in ("wall_seconds", "cpu_seconds")
+        },
+        **{
+            name: max(
+                (
+                    report[name]
+                    for report in reports.values()
+                    if report.get(name) is not None
+                ),
+                default=None,
+            )
+            for name in ("peak_rss_mb", "children_peak_rss_mb")
+        },
+        "stages": {
+            f"{phase}.{stage}": record
+            for phase, report in reports.items()
+            for stage, record in report["stages"].items()
+        },
+    }
+
+
+def load_report(project_dir: Path) -> Optional[dict]:
+    """Run report of a project, merged from its phase reports if it has no
+    `run_report.json`.
+
+    Args:
+        project_dir (Path): Project directory
+
+    Returns:
+        Optional[dict]: Run report, None if the project was not rendered yet
+    """
+    report_path = project_dir / "run_report.json"
+    if report_path.exists():
+        return json.loads(report_path.read_text())
+
+    reports = {
+        path.stem[len("run_report_") :]: json.loads(path.read_text())
+        for path in sorted(project_dir.glob("run_report_*.json"))
+    }
+    stages = {stage for report in reports.values() for stage in report["stages"]}
+    if LAST_STAGE not in stages:
+        return None
+    return merge_phase_reports(reports)
+
+
+def load_samples(project_root: Path) -> list[tuple[dict, dict]]:
+    """Features and run reports of the projects rendered from scratch.
+
+    Runs that skipped steps or failed are left out, their time does not
+    reflect the full cost of the job.
+
+    Args:
+        project_root (Path): Directory holding the projects
+
+    Returns:
+        list[tuple[dict, dict]]: Features and run report of each project
+    """
+    samples = []
+    for features_path in sorted(Path(project_root).glob(f"*/{FEATURES_FILENAME}")):
+        try:
+            report = load_report(features_path.parent)
+            features = json.loads(features_path.read_text())
+        except (ValueError, KeyError):
+            logger.warning("Ignoring the unreadable cost sample %s", features_path)
+            continue
+        if report is None:
+            continue
+        statuses = {stage["status"] for stage in report["stages"].values()}
+        if report["status"] == "completed" and statuses == {"completed"}:
+            samples.append((features, report))
+    return samples
+
+
+def fit_coefficients(
+    terms: np.ndarray, targets: np.ndarray, prior: np.ndarray
+) -> np.ndarray:
+    """Least squares coefficients shrunk towards the default ones.
+
+    Terms the samples do not vary, e.g. a constant `n_frames`, keep their
+    default coefficient instead of an arbitrary split with the intercept.
+
+    Args:
+        terms (np.ndarray): Terms of each sample
+        targets (np.ndarray): Measured cost of each sample
+        prior (np.ndarray): Default coefficients
+
+    Returns:
+        np.ndarray: Non negative coefficients
+    """
+    # Scale the penalty of each term like a sample, so the defaults weigh as
+    # much as `PRIOR_WEIGHT` projects
+    scale = np.sqrt(np.mean(terms**2, axis=0))
+    scale[scale == 0] = 1.0
+    penalty = np.sqrt(PRIOR_WEIGHT) * np.diag(scale)
+    coefficients, *_ = np.linalg.lstsq(
+        np.vstack([terms, penalty]),
+        np.concatenate([targets, penalty @ prior]),
+        rcond=None,
+    )
+    return np.clip(coefficients, 0.0, None)
+
+
+class CostModel:
+    """Linear model of the wall time and peak memory of a trailer job.
+
+    Args:
+        seconds (tuple[float, ...]): Wall time coefficients, in `TERMS` order
+        memory_mb (tuple[float, ...]): Peak memory coefficients, in `TERMS` order
+        n_samples (int): Number of projects the model was calibrated on
+    """
+
+    def __init__(
+        self,
+        seconds: tuple[float, ...] = DEFAULT_SECONDS,
+        memory_mb: tuple[float, ...] = DEFAULT_MEMORY_MB,
+        n_samples: int = 0,
+    ):
+        self.seconds = np.asarray(seconds, dtype=float)
+        self.memory_mb = np.asarray(memory_mb, dtype=float)
+        self.n_samples = n_samples
+
+    @classmethod
+    def fit(cls, samples: list[tuple[dict, dict]]) -> "CostModel":
+        """Calibrate a model on past runs.
+
+        Args:
+            samples (list[tuple[dict, dict]]): Features and run report of each run
+
+        Returns:
+            CostModel: Calibrated model, the default one without samples
+        """
+        if not samples:
+            return cls()
+        terms = np.array([get_terms(features) for features, _ in samples])
+        seconds = np.array([report["wall_seconds"] for _, report in samples])
+        # Upper bound of the job memory, FFmpeg runs in child processes
+        memory_mb = np.array(
+            [
+                (report["peak_rss_mb"] or 0) + (report["children_peak_rss_mb"] or 0)
+                for _, report in samples
+            ]
+        )
+        return cls(
+            fit_coefficients(terms, seconds, np.array(DEFAULT_SECONDS)),
+            fit_coefficients(terms, memory_mb, np.array(DEFAULT_MEMORY_MB)),
+            len(samples),
+        )
+
+    @classmethod
+    def from_projects(cls, project_root: Path) -> "CostModel":
+        """Calibrate a model on the projects rendered so far.
+
+        Args:
+            project_root (Path): Directory holding the projects
+
+        Returns:
+            CostModel: Calibrated model
+        """
+        model = cls.fit(load_samples(project_root))
+        logger.info("Cost model calibrated on %s projects", model.n_samples)
+        return model
+
+    def predict(self, features: dict) -> dict:
+        """Predict the cost of a job.
+
+        Args:
+            features (dict): Job features
+
+        Returns:
+            dict: Predicted wall `seconds` and peak `memory_mb`
+        """
+        terms = get_terms(features)
+        return {
+            "seconds": float(terms @ self.seconds),
+            "memory_mb": float(terms @ self.memory_mb),
+        }
+
+
+# Calibrated models by project root with the time they were fitted at
+_MODELS: dict[Path, tuple[float, CostModel]] = {}
+_LOCK = threading.Lock()
+
+
+def get_cost_model(project_root: Path, max_age_seconds: float) -> CostModel:
+    """Calibrated model of the projects, fitted again once it is too old.
+
+    Calibrating reads the report of every project, so admissions reuse the
+    model instead of fitting one per job.
+
+    Args:
+        project_root (Path): Directory holding the projects
+        max_age_seconds (float): Time after which the model is fitted again
+
+    Returns:
+        CostModel: Calibrated model
+    """
+    project_root = Path(project_root).resolve()
+    with _LOCK:
+        cached = _MODELS.get(project_root)
+        if cached is not None and time.monotonic() - cached[0] < max_age_seconds:
+            return cached[1]
+        model = CostModel.from_projects(project_root)
+        _MODELS[project_root] = (time.monotonic(), model)
+        return model
+
+
+def invalidate_cost_models() -> None:
+    """Fit the models again on their next use, e.g. once a job rendered."""
+    with _LOCK:
+        _MODELS.clear()
+
+
+def down_tune(features: dict, admission: dict) -> Optional[dict]:
+    """Make a job cheaper, first with fewer frames then fewer clips per scene.
+
+    Args:
+        features (dict): Job features
+        admission (dict): Admission configs with the lowest values allowed
+
+    Returns:
+        Optional[dict]: Cheaper job features, None if the job is at its lowest
+    """
+    if features["n_frames"] > admission["min_n_frames"]:
+        n_frames = max(features["n_frames"] // 2, admission["min_n_frames"])
+        return {**features, "n_frames": n_frames}
+    if features["n_retrieved_images"] > admission["min_n_retrieved_images"]:
+        return {**features, "n_retrieved_images": features["n_retrieved_images"] - 1}
+    return None
+
+
+def plan_job(
+    model: CostModel, features: dict, configs: dict, backlog_seconds: float = 0.0
+) -> dict:
+    """Decide whether to run a job, and with which settings.
+
+    Each job gets the time budget that sustains the target throughput with
+    the configured number of concurrent jobs. Jobs over their time or memory
+    budget are down-tuned until they fit, and rejected if they never do or if
+    the queue already holds too much work.
+
+    Args:
+        model (CostModel): Cost model
+        features (dict): Job features
+        configs (dict): Configs with the `admission` and `jobs` sections
+        backlog_seconds (float): Predicted time of the queued and running jobs
+
+    Returns:
+        dict: Decision `status` (`accepted`, `tuned` or `rejected`), `reason`
+            if rejected, config `overrides`, job `features` and `estimate`,
+            and `wait_seconds` before the job is expected to start
+    """
+    admission = configs["admission"]
+    concurrency = configs["jobs"]["max_concurrency"]
+    budget_seconds = 3600 * concurrency / admission["target_jobs_per_hour"]
+    wait_seconds = backlog_seconds / concurrency
+    decision = {
+        "status": "accepted",
+        "reason": None,
+        "features": features,
+        "estimate": model.predict(features),
+        "wait_seconds": wait_seconds,
+    }
+
+    if wait_seconds > admission["max_backlog_seconds"]:
+        decision["status"] = "rejected"
+        decision["reason"] = (
+            f"The queue is full, jobs start in {wait_seconds:.0f} seconds"
+        )
+    while decision["status"] != "rejected" and (
+        decision["estimate"]["seconds"] > budget_seconds
+        or decision["estimate"]["memory_mb"] > admission["max_memory_mb"]
+    ):
+        tuned = down_tune(decision["features"], admission)
+        if tuned is None:
+            decision["status"] = "rejected"
+            decision["reason"] = (
+                f"The job needs about {decision['estimate']['seconds']:.0f} seconds"
+                f" and {decision['estimate']['memory_mb']:.0f} MB, the limits are"
+                f" {budget_seconds:.0f} seconds and {admission['max_memory_mb']} MB"
+            )
+            break
+        decision.update(status="tuned", features=tuned, estimate=model.predict(tuned))
+
+    decision["overrides"] = {
+        "frame_sampling": {"n_frames": decision["features"]["n_frames"]},
+        "frame_ranking": {
+            "n_retrieved_images": decision["features"]["n_retrieved_images"]
+        },
+    }
+    return decision
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__file__)
+
+HASH_CHUNK_BYTES = 1024 * 1024
+DEFAULT_CHUNK_BYTES = 16 * 1024 * 1024
+# Bytes read from a response before they are written to the file
+READ_BYTES = 1024 * 1024
+PROGRESS_SUFFIX = ".progress"
+
+
+def hash_md5(path: Path) -> str:
+    """MD5 of a whole file, the checksum Google Drive reports for its files.
+
+    Args:
+        path (Path): File to hash
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_progress_path(path: Path) -> Path:
+    """Sidecar file recording the chunks of a download already written.
+
+    Args:
+        path (Path): Downloaded file
+
+    Returns:
+        Path: Progress file next to it
+    """
+    return path.with_name(path.name + PROGRESS_SUFFIX)
+
+
+def load_progress(path: Path, url: str, size: int, chunk_bytes: int) -> set[int]:
+    """Chunks written by a previous attempt at the same download.
+
+    Args:
+        path (Path): Downloaded file
+        url (str): File URL
+        size (int): File size in bytes
+        chunk_bytes (int): Chunk size in bytes
+
+    Returns:
+        set[int]: Indexes of the chunks already written, empty if the previous
+            attempt downloaded another file or used other chunks
+    """
+    progress_path = get_progress_path(path)
+    if not path.exists() or not progress_path.exists():
+        return set()
+    try:
+        progress = json.loads(progress_path.read_text())
+    except ValueError:
+        logger.warning("Ignoring the unreadable progress file %s", progress_path)
+        return set()
+    expected = {"url": url, "size": size, "chunk_bytes": chunk_bytes}
+    if any(progress.get(key) != value for key, value in expected.items()):
+        return set()
+    return set(progress["done"])
+
+
+def save_progress(
+    path: Path, url: str, size: int, chunk_bytes: int, done: set[int]
+) -> None:
+    """Write the progress file of a download atomically.
+
+    Args:
+        path (Path): Downloaded file
+        url (str): File URL
+        size (int): File size in bytes
+        chunk_bytes (int): Chunk size in bytes
+        done (set[int]): Indexes of the chunks written
+    """
+    progress_path = get_progress_path(path)
+    tmp_path = progress_path.with_name(progress_path.name + ".tmp")
+    tmp_path.write_text(
+        json.dumps(
+            {"url": url, "size": size, "chunk_bytes": chunk_bytes, "done": sorted(done)}
+        )
+    )
+    os.replace(tmp_path, progress_path)
+
+
+def download_chunk(
+    url: str,
+    path: Path,
+    start: int,
+    end: int,
+    headers: dict,
+    timeout: float,
+) -> None:
+    """Download a byte range of a file into the same range of a local file.
+
+    Args:
+        url (str): File URL
+        path (Path): Preallocated local file
+        start (int): First byte
+        end (int): Last byte, included
+        headers (dict): Request headers, e.g. `Authorization`
+        timeout (float): Socket timeout in seconds
+    """
+    request = urllib.request.Request(
+        url, headers={**headers, "Range": f"bytes={start}-{end}"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        if response.status != 206:
+            raise RuntimeError(f"{url} does not support range requests")
+        written = 0
+        with open(path, "r+b") as f:
+            f.seek(start)
+            for data in iter(lambda: response.read(READ_BYTES), b""):
+                f.write(data)
+                written += len(data)
+    if written != end - start + 1:
+        # Connection closed early, the chunk is retried
+        raise ConnectionError(
+            f"Received {written} bytes of {url} for range {start}-{end}"
+        )
+
+
+def download_ranges(
+    url: str,
+    path: Path,
+    size: int,
+    md5: Optional[str] = None,
+    get_headers: Optional[Callable[[], dict]] = None,
+    max_workers: int = 4,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    retries: int = 3,
+    timeout: float = 60,
+) -> Path:
+    """Download a file with concurrent HTTP range requests.
+
+    The file is preallocated and each chunk is written at its offset. Written
+    chunks are recorded in a progress file next to it, so a download that was
+    interrupted only fetches the missing chunks when it is started again.
+
+    Args:
+        url (str): File URL, the server must answer range requests
+        path (Path): Output file
+        size (int): File size in bytes
+        md5 (Optional[str]): Expected MD5 checksum, not verified if None
+        get_headers (Optional[Callable[[], dict]]): Called before each request
+            for its headers, e.g. an `Authorization` header with a fresh token
+        max_workers (int): Number of chunks downloaded at the same time
+        chunk_bytes (int): Chunk size in bytes
+        retries (int): Attempts at each chunk before the download fails
+        timeout (float): Socket timeout in seconds
+
+    Returns:
+        Path: Output file
+    """
+    path = Path(path)
+    n_chunks = -(-size // chunk_bytes)
+    done = load_progress(path, url, size, chunk_bytes)
+    if not done:
+        with open(path, "wb") as f:
+            f.truncate(size)
+    else:
+        logger.info("Resuming download of %s, %d/%d chunks", url, len(done), n_chunks)
+    lock = threading.Lock()
+
+    def fetch(index: int) -> None:
+        start = index * chunk_bytes
+        end = min(start + chunk_bytes, size) - 1
+        for attempt in range(1, retries + 1):
+            try:
+                headers = get_headers() if get_headers is not None else {}
+                download_chunk(url, path, start, end, headers, timeout)
+                break
+            except OSError as e:
+                if attempt == retries:
+                    raise
+                logger.warning("Retrying chunk %d of %s: %s", index, url, e)
+                time.sleep(attempt)
+        with lock:
+            done.add(index)
+            save_progress(path, url, size, chunk_bytes, done)
+
+    missing = [index for index in range(n_chunks) if index not in done]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Consume the results so the first failed chunk is raised
+        list(executor.map(fetch, missing))
+
+    if md5 is not None and hash_md5(path) != md5:
+        path.unlink()
+        get_progress_path(path).unlink(missing_ok=True)
+        raise ValueError(f"Checksum mismatch for the download of {url}")
+    get_progress_path(path).unlink(missing_ok=True)
+    logger.info("Downloaded %s to %s", url, path)
+    return path
@@ -0,0 +1,112 @@
+import logging
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from src.instrumentation import get_section, track
+
+logger = logging.getLogger(__file__)
+
+
+def get_profile(configs: dict, stage: str) -> dict:
+    """Get the encoding profile used by a pipeline step.
+
+    Args:
+        configs (dict): Project configs
+        stage (str): Pipeline step name, e.g. `clip`
+
+    Returns:
+        dict: Encoding profile settings including its `name`
+    """
+    encoding_configs = configs["encoding"]
+    if encoding_configs["preview"]:
+        profile_name = "preview"
+    else:
+        profile_name = encoding_configs["stages"][stage]
+    return {"name": profile_name, **encoding_configs["profiles"][profile_name]}
+
+
+def get_moviepy_args(profile: dict) -> dict:
+    """Translate an encoding profile to MoviePy `write_videofile` arguments.
+
+    Args:
+        profile (dict): Encoding profile
+
+    Returns:
+        dict: Keyword arguments for `write_videofile`
+    """
+    return {
+        "codec": profile["codec"],
+        "preset": profile["preset"],
+        "threads": profile["threads"],
+        "fps": profile["fps"],
+        "pixel_format": profile["pix_fmt"],
+        "ffmpeg_params": ["-crf", str(profile["crf"])],
+    }
+
+
+def get_ffmpeg_args(profile: dict) -> list[str]:
+    """Translate an encoding profile to FFmpeg video output arguments.
+
+    Args:
+        profile (dict): Encoding profile
+
+    Returns:
+        list[str]: FFmpeg arguments
+    """
+    args = [
+        "-c:v",
+        profile["codec"],
+        "-preset",
+        profile["preset"],
+        "-crf",
+        str(profile["crf"]),
+        "-pix_fmt",
+        profile["pix_fmt"],
+    ]
+    if profile["threads"] is not None:
+        args += ["-threads", str(profile["threads"])]
+    if profile["fps"]:
+        args += ["-r", str(profile["fps"])]
+    return args
+
+
+@contextmanager
+def encode_timer(stage: str, profile: dict, output_path: Path) -> Iterator[None]:
+    """Log and record how long an encode takes, in the `encode` section of the
+    step in the run report.
+
+    Args:
+        stage (str): Pipeline step doing the encode
+        profile (dict): Encoding profile used
+        output_path (Path): File being encoded
+    """
+    start = time.perf_counter()
+    with track(stage, "encode"):
+        yield
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Encoded %s with the %s profile in %.2f seconds",
+        output_path,
+        profile["name"],
+        elapsed,
+    )
+
+
+def log_encode_timings(stage: str) -> None:
+    """Log a summary of the encodes made by a pipeline step in the current run.
+
+    Args:
+        stage (str): Pipeline step name
+    """
+    totals = get_section(stage, "encode")
+    if totals is None:
+        return
+    logger.info(
+        "Step %s encoded %s files in %.2f seconds (%.2f seconds per file)",
+        stage,
+        totals["calls"],
+        totals["wall_seconds"],
+        totals["wall_seconds"] / totals["calls"],
+    )
@@ -0,0 +1,181 @@
+import logging
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__file__)
+
+# Stream layout shared by every segment so they can be concatenated by stream copy
+SEGMENT_STREAM_ARGS = [
+    "-video_track_timescale",
+    "90000",
+    "-c:a",
+    "aac",
+    "-ar",
+    "48000",
+    "-ac",
+    "2",
+]
+# Move the MP4 index to the front of the file so playback starts while the
+# rest is still downloading
+FASTSTART_ARGS = ["-movflags", "+faststart"]
+
+
+def run_ffmpeg(args: list[str]) -> None:
+    """Run the FFmpeg binary bundled with MoviePy.
+
+    Args:
+        args (list[str]): Command line arguments passed to FFmpeg
+    """
+    # Imported on first use, importing MoviePy loads all of its clip classes
+    from moviepy.config import FFMPEG_BINARY
+
+    cmd = [FFMPEG_BINARY, "-y", "-hide_banner", "-loglevel", "error", *args]
+    logger.debug("Running FFmpeg: %s", " ".join(cmd))
+    subprocess.run(cmd, check=True)
+
+
+def probe_media(media_path: Path) -> dict:
+    """Read the stream properties of a media file.
+
+    Args:
+        media_path (Path): Path to the media file
+
+    Returns:
+        dict: Media properties such as `duration`, `video_fps` and `video_size`
+    """
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    return ffmpeg_parse_infos(str(media_path))
+
+
+def write_concat_list(inputs: list[Path], list_path: Path) -> Path:
+    """Write a file list for the FFmpeg concat demuxer.
+
+    Args:
+        inputs (list[Path]): Media files in playback order
+        list_path (Path): Output path of the list file
+
+    Returns:
+        Path: Path to the list file
+    """
+    lines = []
+    for input_path in inputs:
+        escaped = str(Path(input_path).resolve()).replace("'", "'\\''")
+        lines.append(f"file '{escaped}'\n")
+    list_path.write_text("".join(lines))
+    return list_path
+
+
+def encode_segment(input_path: Path, output_path: Path, video_args: list[str]) -> None:
+    """Re-encode a clip so it can be stream-copied next to other segments.
+
+    Every segment gets the same codecs, pixel format, audio layout and time
+    base, which is what the concat demuxer needs to join them without
+    re-encoding.
+
+    Args:
+        input_path (Path): Source clip
+        output_path (Path): Normalized segment
+        video_args (list[str]): Video encoding arguments shared by all segments
+    """
+    run_ffmpeg(
+        ["-i", str(input_path), *video_args, *SEGMENT_STREAM_ARGS, str(output_path)]
+    )
+
+
+def get_rendition_path(output_path: Path, rendition: dict) -> Path:
+    """Build the output path of a rendition.
+
+    Args:
+        output_path (Path): Stream-copied output the rendition is derived from
+        rendition (dict): Rendition settings
+
+    Returns:
+        Path: `<output stem>_<rendition name>.mp4` next to the output
+    """
+    return output_path.with_name(f"{output_path.stem}_{rendition['name']}.mp4")
+
+
+def get_rendition_args(output_path: Path, renditions: list[dict]) -> list[str]:
+    """Build the FFmpeg arguments encoding every rendition from one decode.
+
+    The decoded video is split once and each branch is scaled and encoded
+    with its own settings.
+
+    Args:
+        output_path (Path): Stream-copied output the renditions are derived from
+        renditions (list[dict]): Name, height, video bitrate and x264 preset of
+            each rendition
+
+    Returns:
+        list[str]: Filter graph and output arguments
+    """
+    branches = "".join(f"[v{idx}]" for idx in range(len(renditions)))
+    filter_graph = [f"[0:v]split={len(renditions)}{branches}"]
+    for idx, rendition in enumerate(renditions):
+        filter_graph.append(f"[v{idx}]scale=-2:{rendition['height']}[out{idx}]")
+
+    args = ["-filter_complex", ";".join(filter_graph)]
+    for idx, rendition in enumerate(renditions):
+        args += [
+            "-map",
+            f"[out{idx}]",
+            "-map",
+            "0:a?",
+            "-c:v",
+            "libx264",
+            "-preset",
+            rendition["preset"],
+            "-b:v",
+            str(rendition["video_bitrate"]),
+            "-pix_fmt",
+            "yuv420p",
+            "-c:a",
+            "aac",
+            *FASTSTART_ARGS,
+            str(get_rendition_path(output_path, rendition)),
+        ]
+    return args
+
+
+def concat_copy(
+    inputs: list[Path], output_path: Path, renditions: Optional[list[dict]] = None
+) -> None:
+    """Concatenate segments into a single file without re-encoding.
+
+    The output is written with its index first (faststart), so it can be played
+    while it downloads.
+
+    Renditions, if any, are encoded by the same FFmpeg process so the segments
+    are only decoded once no matter how many renditions are requested.
+
+    Args:
+        inputs (list[Path]): Segments in playback order, sharing the same codecs
+        output_path (Path): Output media file
+        renditions (Optional[list[dict]]): Extra scaled encodes of the output
+    """
+    list_path = write_concat_list(inputs, output_path.with_suffix(".txt"))
+    args = [
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(list_path),
+        "-map",
+        "0:v",
+        "-map",
+        "0:a?",
+        "-c",
+        "copy",
+        *FASTSTART_ARGS,
+        str(output_path),
+    ]
+    if renditions:
+        args += get_rendition_args(output_path, renditions)
+
+    try:
+        run_ffmpeg(args)
+    finally:
+        list_path.unlink(missing_ok=True)
@@ -1,22 +1,29 @@
 import logging
 import shutil
+from pathlib import Path
 
-import cv2
+from src.common import ProjectContext
+from src.instrumentation import report_progress, track
+from src.proxy import get_working_video_path
 
-from src.common import FRAMES_DIR, configs
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
 
 
-def create_screeshots(video_path: str, n_frames: int) -> None:
+def create_screeshots(video_path: str, frames_dir: Path, n_frames: int) -> None:
     """Take multiple frames from a video file.
 
     Args:
         video_path (str): Path to the video file
+        frames_dir (Path): Directory to save the frames
         n_frames (int): Number of frames that will be taken
     """
-    if FRAMES_DIR.exists():
-        shutil.rmtree(FRAMES_DIR)
+    import cv2
+
+    if frames_dir.exists():
+        shutil.rmtree(frames_dir)
 
-    FRAMES_DIR.mkdir(parents=True, exist_ok=True)
+    frames_dir.mkdir(parents=True, exist_ok=True)
 
     cam = cv2.VideoCapture(video_path)
 
@@ -24,23 +31,45 @@ def create_screeshots(video_path: str, n_frames: int) -> None:
 
     currentframe = 0
 
-    while True:
-        ret, frame = cam.read()
-        if ret:
-            img_path = FRAMES_DIR / f"frame_{currentframe}.jpg"
-            if currentframe % (total_frames // n_frames) == 0:
-                cv2.imwrite(str(img_path), frame)
-            currentframe += 1
-        else:
-            break
+    with track("frame", "frame_decode", items=0) as counter:
+        while True:
+            ret, frame = cam.read()
+            if ret:
+                img_path = frames_dir / f"frame_{currentframe}.jpg"
+                if currentframe % (total_frames // n_frames) == 0:
+                    cv2.imwrite(str(img_path), frame)
+                currentframe += 1
+                report_progress("frame", currentframe, total_frames)
+            else:
+                break
+        counter.items = currentframe
 
     cam.release()
     cv2.destroyAllWindows()
 
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__file__)
+def run(context: ProjectContext, video: str) -> dict:
+    """Frame sampling step.
+
+    Args:
+        context (ProjectContext): Project the step runs for
+        video (str): Path to the video file
+
+    Returns:
+        dict: `frames` artifact with the sampled frames directory
+    """
+    logger.info("\n##### Starting step 3 frame sampling #####\n")
+
+    create_screeshots(
+        get_working_video_path(video, context.configs["proxy"], context.project_dir),
+        context.frames_dir,
+        context.configs["frame_sampling"]["n_frames"],
+    )
+    return {"frames": context.frames_dir}
+
 
-logger.info("\n##### Starting step 3 frame sampling #####\n")
+if __name__ == "__main__":
+    from src.common import load_project_context
+    from src.pipeline import run_pipeline
 
-create_screeshots(configs["video_path"], configs["frame_sampling"]["n_frames"])
+    run_pipeline(["frame"], load_project_context())
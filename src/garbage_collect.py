@@ -0,0 +1,417 @@
+"""Reclaim the disk space of project intermediate artifacts.
+
+Projects keep their sampled frames, scene frames, voices, clips, audio clips
+and input video after the trailer is rendered. Once a project has been idle
+for its retention time those intermediates are removed and only the trailer,
+plot, configs and run reports are kept. Above the global quota, the least
+recently used projects lose their intermediates first, then entirely.
+
+Usage:
+    python -m src.garbage_collect --dry-run
+    python -m src.garbage_collect --config configs.yaml
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from src.common import CONFIGS_PATH, merge_configs, parse_configs
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
+
+# Artifact types of a project, the trailer is only removed with the project.
+# Files matching several types get the last one, e.g. the segments inside the
+# trailer directory
+ARTIFACT_TYPES = (
+    "frames",
+    "embeddings",
+    "proxy",
+    "scene_frames",
+    "voices",
+    "clips",
+    "audio_clips",
+    "input_video",
+    "trailer",
+    "trailer_segments",
+)
+# Project directories of each artifact type, `scene_*` for every scene
+ARTIFACT_DIRS = {
+    "frames": "frames",
+    "embeddings": "embeddings",
+    "proxy": "proxy",
+    "scene_frames": "scene_*/frames",
+    "voices": "scene_*/audios",
+    "clips": "scene_*/clips",
+    "audio_clips": "scene_*/audio_clips",
+    "trailer": "trailers",
+    "trailer_segments": "trailers/segments",
+}
+
+
+@dataclass
+class ProjectUsage:
+    """Files of a project, by artifact type.
+
+    Args:
+        name (str): Project name
+        project_dir (Path): Project directory
+        gc_configs (dict): Garbage collection configs of the project
+        last_used (float): Latest modification time of its files
+        artifacts (dict[str, list[Path]]): Paths of each artifact type
+        files (dict[Path, os.stat_result]): Every file of the project
+        kinds (dict[Path, str]): Artifact type of the files of an artifact
+    """
+
+    name: str
+    project_dir: Path
+    gc_configs: dict
+    last_used: float
+    artifacts: dict[str, list[Path]] = field(default_factory=dict)
+    files: dict[Path, os.stat_result] = field(default_factory=dict)
+    kinds: dict[Path, str] = field(default_factory=dict)
+
+
+def list_files(path: Path) -> dict[Path, os.stat_result]:
+    """Files under a directory, or the file itself.
+
+    Args:
+        path (Path): File or directory
+
+    Returns:
+        dict[Path, os.stat_result]: Status of each file
+    """
+    if path.is_file():
+        return {path: path.stat()}
+    return {p: p.stat() for p in path.rglob("*") if p.is_file() and not p.is_symlink()}
+
+
+def get_artifact_paths(project_dir: Path, configs: dict) -> dict[str, list[Path]]:
+    """Files and directories of each artifact type of a project.
+
+    Args:
+        project_dir (Path): Project directory
+        configs (dict): Project configs
+
+    Returns:
+        dict[str, list[Path]]: Existing paths of each artifact type
+    """
+    paths = {
+        name: sorted(project_dir.glob(pattern))
+        for name, pattern in ARTIFACT_DIRS.items()
+    }
+    # Input videos are only collected when the project holds them, e.g. the
+    # API downloads, not when `video_path` points to a shared movies folder
+    movies_dir = project_dir / configs["movies_dir"]
+    paths["input_video"] = [movies_dir] if movies_dir.is_dir() else []
+    return {name: paths[name] for name in ARTIFACT_TYPES}
+
+
+def scan_project(project_dir: Path, configs: dict) -> Optional[ProjectUsage]:
+    """Measure the files of a project.
+
+    Args:
+        project_dir (Path): Project directory
+        configs (dict): Default configs, the project configs override them
+
+    Returns:
+        Optional[ProjectUsage]: Project files, None if the directory is not a
+            project
+    """
+    config_path = project_dir / "project_config.yaml"
+    if config_path.exists():
+        configs = merge_configs(configs, parse_configs(config_path))
+    elif not (project_dir / configs["plot_filename"]).exists():
+        return None
+
+    files = list_files(project_dir)
+    artifacts = get_artifact_paths(project_dir, configs)
+    return ProjectUsage(
+        name=project_dir.name,
+        project_dir=project_dir,
+        gc_configs=configs["gc"],
+        last_used=max(
+            [project_dir.stat().st_mtime, *(stat.st_mtime for stat in files.values())]
+        ),
+        artifacts=artifacts,
+        files=files,
+        kinds={
+            file_path: name
+            for name, paths in artifacts.items()
+            for path in paths
+            for file_path in list_files(path)
+        },
+    )
+
+
+def scan_projects(project_root: Path, configs: dict) -> list[ProjectUsage]:
+    """Measure every project, least recently used first.
+
+    Args:
+        project_root (Path): Directory holding the projects
+        configs (dict): Default configs
+
+    Returns:
+        list[ProjectUsage]: Projects
+    """
+    projects = []
+    if not Path(project_root).is_dir():
+        return projects
+    for project_dir in sorted(Path(project_root).iterdir()):
+        if project_dir.is_dir():
+            usage = scan_project(project_dir, configs)
+            if usage is not None:
+                projects.append(usage)
+    return sorted(projects, key=lambda usage: usage.last_used)
+
+
+class Reclaim:
+    """Bytes freed by removing a set of files.
+
+    Hard-linked files, e.g. the frames of batch variants or the videos of the
+    video store, only free their bytes once every link is removed.
+    """
+
+    def __init__(self):
+        self.links: dict[tuple[int, int], int] = {}
+        self.bytes = 0
+        self.artifacts: dict[str, dict] = {
+            name: {"files": 0, "bytes": 0} for name in ARTIFACT_TYPES
+        }
+        self.artifacts["other"] = {"files": 0, "bytes": 0}
+
+    def add(self, stat: os.stat_result, artifact: str) -> None:
+        """Count the removal of a file.
+
+        Args:
+            stat (os.stat_result): File status
+            artifact (str): Artifact type of the file
+        """
+        key = (stat.st_dev, stat.st_ino)
+        self.links[key] = self.links.get(key, 0) + 1
+        self.artifacts[artifact]["files"] += 1
+        if self.links[key] == stat.st_nlink:
+            self.bytes += stat.st_size
+            self.artifacts[artifact]["bytes"] += stat.st_size
+
+
+def get_disk_usage(projects: list[ProjectUsage]) -> int:
+    """Bytes used by the projects only.
+
+    Hard-linked files are counted once, and not at all if they are also linked
+    outside the projects, e.g. from the video store.
+
+    Args:
+        projects (list[ProjectUsage]): Projects
+
+    Returns:
+        int: Bytes
+    """
+    usage = Reclaim()
+    for project in projects:
+        for stat in project.files.values():
+            usage.add(stat, "other")
+    return usage.bytes
+
+
+def plan_collection(projects: list[ProjectUsage], configs: dict, now: float) -> dict:
+    """Pick the artifacts to remove.
+
+    Args:
+        projects (list[ProjectUsage]): Projects, least recently used first
+        configs (dict): Configs with the `gc` section
+        now (float): Current time
+
+    Returns:
+        dict: `intermediates` and whole `projects` to remove by project name,
+            with the `reason` of each, and the `reclaim` they free
+    """
+    gc_configs = configs["gc"]
+    reclaim = Reclaim()
+    plan = {"intermediates": {}, "projects": {}, "reclaim": reclaim}
+
+    def drop_intermediates(usage: ProjectUsage, reason: str) -> None:
+        files = [
+            (path, stat)
+            for path, stat in usage.files.items()
+            if usage.kinds.get(path) in usage.gc_configs["intermediates"]
+        ]
+        # Projects collected by a previous run are left out of the report
+        if files:
+            plan["intermediates"][usage.name] = reason
+        for path, stat in files:
+            reclaim.add(stat, usage.kinds[path])
+
+    def drop_project(usage: ProjectUsage) -> None:
+        plan["projects"][usage.name] = "quota"
+        # Intermediates already counted are not counted twice
+        dropped = plan["intermediates"].pop(usage.name, None) is not None
+        for path, stat in usage.files.items():
+            name = usage.kinds.get(path, "other")
+            if dropped and name in usage.gc_configs["intermediates"]:
+                continue
+            reclaim.add(stat, name)
+
+    # Projects in use, e.g. by a running job, are never collected
+    idle = [
+        usage
+        for usage in projects
+        if now - usage.last_used > 3600 * gc_configs["min_idle_hours"]
+    ]
+    for usage in idle:
+        if now - usage.last_used > 3600 * usage.gc_configs["retention_hours"]:
+            drop_intermediates(usage, "retention")
+
+    quota_gb = gc_configs["quota_gb"]
+    if quota_gb is not None:
+        quota_bytes = quota_gb * 1024**3
+        used = get_disk_usage(projects)
+        for usage in idle:
+            if used - reclaim.bytes <= quota_bytes:
+                break
+            if usage.name not in plan["intermediates"]:
+                drop_intermediates(usage, "quota")
+        for usage in idle:
+            if used - reclaim.bytes <= quota_bytes:
+                break
+            drop_project(usage)
+    return plan
+
+
+def remove(path: Path) -> None:
+    """Remove a file or a directory tree.
+
+    Args:
+        path (Path): Path to remove
+    """
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def collect(
+    project_root: Path,
+    configs: dict,
+    dry_run: bool = False,
+    now: Optional[float] = None,
+) -> dict:
+    """Remove the artifacts of idle projects past their retention or the quota.
+
+    Args:
+        project_root (Path): Directory holding the projects
+        configs (dict): Default configs with the `gc` section
+        dry_run (bool): Only report what would be removed
+        now (Optional[float]): Current time, defaults to `time.time()`
+
+    Returns:
+        dict: Report with the removed `intermediates` and `projects` and why,
+            the `artifacts` reclaimable per type, the `reclaimed_bytes` and the
+            `used_bytes` before the collection
+    """
+    now = time.time() if now is None else now
+    projects = scan_projects(project_root, configs)
+    plan = plan_collection(projects, configs, now)
+    by_name = {usage.name: usage for usage in projects}
+
+    if not dry_run:
+        for name in plan["intermediates"]:
+            usage = by_name[name]
+            for artifact in usage.gc_configs["intermediates"]:
+                for path in usage.artifacts[artifact]:
+                    remove(path)
+            # The step fingerprints no longer match the files, run them again
+            (usage.project_dir / "manifest.json").unlink(missing_ok=True)
+        for name in plan["projects"]:
+            remove(by_name[name].project_dir)
+
+    report = {
+        "dry_run": dry_run,
+        "intermediates": plan["intermediates"],
+        "projects": plan["projects"],
+        "artifacts": plan["reclaim"].artifacts,
+        "reclaimed_bytes": plan["reclaim"].bytes,
+        "used_bytes": get_disk_usage(projects),
+    }
+    logger.info(
+        "%s %.1f MB of %.1f MB used by %d projects",
+        "Can reclaim" if dry_run else "Reclaimed",
+        report["reclaimed_bytes"] / 1024**2,
+        report["used_bytes"] / 1024**2,
+        len(projects),
+    )
+    return report
+
+
+def collect_periodically(configs: dict, stop: threading.Event) -> None:
+    """Collect the projects every `gc.interval_minutes` until stopped.
+
+    Args:
+        configs (dict): Default configs with the `gc` section
+        stop (threading.Event): Set to stop collecting
+    """
+    while not stop.wait(60 * configs["gc"]["interval_minutes"]):
+        try:
+            collect(Path(configs["project_dir"]), configs)
+        except Exception:
+            logger.exception("Garbage collection failed")
+
+
+def format_report(report: dict) -> str:
+    """Table of the bytes reclaimable per artifact type.
+
+    Args:
+        report (dict): Collection report
+
+    Returns:
+        str: Text table
+    """
+    lines = [f"{'artifact':<14}{'files':>10}{'MB':>12}"]
+    for name, counts in report["artifacts"].items():
+        if counts["files"]:
+            lines.append(
+                f"{name:<14}{counts['files']:>10}{counts['bytes'] / 1024**2:>12.1f}"
+            )
+    lines.append(f"{'total':<14}{'':>10}{report['reclaimed_bytes'] / 1024**2:>12.1f}")
+    for name, reason in report["intermediates"].items():
+        lines.append(f"Intermediates of {name} ({reason})")
+    for name, reason in report["projects"].items():
+        lines.append(f"Whole project {name} ({reason})")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    """Collect the projects of a configs file.
+
+    Returns:
+        int: Exit code
+    """
+    parser = argparse.ArgumentParser(description="AI Trailer garbage collection")
+    parser.add_argument("--config", type=str, help="Configs file")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report the bytes reclaimable per artifact type without removing them",
+    )
+    parser.add_argument("--json", action="store_true", help="Print a JSON report")
+    args = parser.parse_args()
+    configs_path = Path(args.config).resolve() if args.config else CONFIGS_PATH
+
+    # Project paths in the configs are relative to the repository root
+    os.chdir(Path(__file__).parent.parent)
+    configs = parse_configs(configs_path)
+    report = collect(Path(configs["project_dir"]), configs, dry_run=args.dry_run)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,51 +1,76 @@
+import json
 import logging
 import shutil
 from pathlib import Path
 
 import numpy as np
-from PIL import Image
-from sentence_transformers import SentenceTransformer, util
 
-from src.common import FRAMES_DIR, SCENES_DIR, configs
+from src.backends import Embedder, load_backend
+from src.common import ProjectContext
+from src.instrumentation import report_progress, track
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
 
 
 def get_image_embeddings(
-    model: SentenceTransformer, img_filepaths: list[Path], batch_size: int
+    model: Embedder, img_filepaths: list[Path], batch_size: int
 ) -> np.ndarray:
     """Create embeddings from a set of images.
 
+    Images are only opened for the batch being embedded.
+
     Args:
-        model (SentenceTransformer): Model used to embed the images
+        model (Embedder): Model used to embed the images
         img_filepaths (list[str]): File paths for all images
         batch_size (int): Batch size of images to embed at the same time
 
     Returns:
         np.ndarray: Image embeddings
     """
-    img_emb = model.encode(
-        [Image.open(img_filepath) for img_filepath in img_filepaths],
-        batch_size=batch_size,
-        convert_to_tensor=True,
-        show_progress_bar=True,
-    )
-    return img_emb
+    from PIL import Image
+
+    batches = []
+    for start in range(0, len(img_filepaths), batch_size):
+        batch_paths = img_filepaths[start : start + batch_size]
+        with track("frame_embedding", "embedding_batch", items=len(batch_paths)):
+            batches.append(
+                model.encode(
+                    [Image.open(img_filepath) for img_filepath in batch_paths],
+                    batch_size=batch_size,
+                )
+            )
+        logger.info(
+            "Embedded %s/%s frames", start + len(batch_paths), len(img_filepaths)
+        )
+        report_progress("frame_embedding", start + len(batch_paths), len(img_filepaths))
+
+    if not batches:
+        return np.empty((0, model.get_sentence_embedding_dimension()))
+    return np.concatenate(batches)
 
 
 def retrieve_frames(
+    scenes_dir: list[Path],
     img_filepaths: list[Path],
-    model: SentenceTransformer,
+    model: Embedder,
     img_emb: np.ndarray,
     top_k: int,
 ) -> None:
     """Retrieve the `top_k` most similar frame images to a subplot text.
 
+    The similarity score and embedding of each retrieved frame are saved next to
+    the frames so trailer candidates can be ranked before rendering.
+
     Args:
+        scenes_dir (list[Path]): Scene directories
         img_filepaths (list[str]): File paths for all images
-        model (SentenceTransformer): Similarity model used to measure similarity
+        model (Embedder): Similarity model used to measure similarity
         img_emb (np.ndarray): Image embeddings used as the retrieval source
         top_k (int): Number of images to be retrieved
     """
-    for idx, scene_dir in enumerate(SCENES_DIR):
+    for idx, scene_dir in enumerate(scenes_dir):
+        report_progress("image_retrieval", idx, len(scenes_dir))
         logger.info(f"Retrieving images for scene {idx+1}")
         plot_path = scene_dir / "subplot.txt"
         scene_frames_dir = scene_dir / "frames"
@@ -58,52 +83,169 @@ def retrieve_frames(
         plot = plot_path.read_text()
         hits = search(plot, model, img_emb, top_k=top_k)
 
+        retrieval = []
         for hit in hits:
             img_filepath = img_filepaths[hit["corpus_id"]]
             img_name = img_filepath.name
 
             shutil.copyfile(img_filepath, f"{scene_frames_dir}/{img_name}")
+            retrieval.append(
+                {
+                    "frame": img_name,
+                    "score": float(hit["score"]),
+                    "embedding": img_emb[hit["corpus_id"]].tolist(),
+                }
+            )
 
+        (scene_frames_dir / "retrieval.json").write_text(json.dumps(retrieval))
 
-def search(
-    query: str, model: SentenceTransformer, img_emb: np.ndarray, top_k: int
-) -> dict:
+
+def search(query: str, model: Embedder, img_emb: np.ndarray, top_k: int) -> list[dict]:
     """Search the `top_k` most similar embeddings to a text.
 
     Args:
         query (str): Subplot text used as a similarity reference
-        model (SentenceTransformer): Similarity model used to measure similarity
+        model (Embedder): Similarity model used to measure similarity
         img_emb (np.ndarray): Image embeddings used as the retrieval source
         top_k (int): Number of images to be retrieved
 
     Returns:
-        dict: Retrieved images with some metadata
+        list[dict]: Index (`corpus_id`) and similarity `score` of each retrieved
+            image, most similar first
     """
     query_emb = model.encode(
         [query],
-        convert_to_tensor=True,
         show_progress_bar=False,
+    )[0]
+    # Cosine similarity
+    norms = np.linalg.norm(img_emb, axis=1) * np.linalg.norm(query_emb)
+    scores = img_emb @ query_emb / np.where(norms == 0, 1, norms)
+    top_ids = np.argsort(-scores, kind="stable")[:top_k]
+    return [{"corpus_id": int(idx), "score": float(scores[idx])} for idx in top_ids]
+
+
+def get_embeddings_paths(project_dir: Path) -> tuple[Path, Path]:
+    """Paths of the saved frame embeddings and the frames they belong to.
+
+    Args:
+        project_dir (Path): Project directory
+
+    Returns:
+        tuple[Path, Path]: Embeddings `.npy` file and frame paths `.json` file
+    """
+    embeddings_dir = project_dir / "embeddings"
+    return embeddings_dir / "frames.npy", embeddings_dir / "frames.json"
+
+
+def save_image_embeddings(
+    img_filepaths: list[Path], img_emb: np.ndarray, project_dir: Path
+) -> None:
+    """Save the frame embeddings so later runs can skip embedding them again.
+
+    Args:
+        img_filepaths (list[Path]): File paths for all images
+        img_emb (np.ndarray): Image embeddings
+        project_dir (Path): Project directory
+    """
+    emb_path, filepaths_path = get_embeddings_paths(project_dir)
+    emb_path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(emb_path, img_emb)
+    filepaths_path.write_text(json.dumps([str(p) for p in img_filepaths]))
+
+
+def load_image_embeddings(project_dir: Path) -> tuple[list[Path], np.ndarray]:
+    """Load the frame embeddings saved by the frame embedding step.
+
+    Args:
+        project_dir (Path): Project directory
+
+    Returns:
+        tuple[list[Path], np.ndarray]: Frame paths and their embeddings
+    """
+    emb_path, filepaths_path = get_embeddings_paths(project_dir)
+    img_filepaths = [Path(p) for p in json.loads(filepaths_path.read_text())]
+    return img_filepaths, np.load(emb_path)
+
+
+def load_similarity_model(configs: dict) -> Embedder:
+    """Load the similarity model once per process.
+
+    Args:
+        configs (dict): Project configs
+
+    Returns:
+        Embedder: Loaded similarity model
+    """
+    ranking_configs = configs["frame_ranking"]
+    return load_backend(
+        "embedding",
+        ranking_configs["backend"],
+        ranking_configs["model_id"],
+        ranking_configs["device"],
     )
-    hits = util.semantic_search(query_emb, img_emb, top_k=top_k)[0]
-    return hits
 
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__file__)
+def embed(context: ProjectContext, frames: Path) -> dict:
+    """Frame embedding step.
 
-logger.info("\n##### Starting step 4 frame retrieval #####\n")
+    Args:
+        context (ProjectContext): Project the step runs for
+        frames (Path): Directory with the sampled frames
+
+    Returns:
+        dict: `image_embeddings` artifact with the frame paths and their embeddings
+    """
+    logger.info("\n##### Starting step 4 frame embedding #####\n")
+    configs = context.configs
+
+    logger.info(
+        f"Loading {configs['frame_ranking']['model_id']} as the similarity model"
+    )
+    model = load_similarity_model(configs)
+
+    img_filepaths = list(frames.glob("*.jpg"))
+    logger.info(f"Embedding {len(img_filepaths)} images")
+    img_emb = get_image_embeddings(
+        model, img_filepaths, configs["frame_ranking"]["similarity_batch_size"]
+    )
+    save_image_embeddings(img_filepaths, img_emb, context.project_dir)
+    return {"image_embeddings": (img_filepaths, img_emb)}
+
+
+def run(
+    context: ProjectContext,
+    scenes: list[Path],
+    image_embeddings: tuple[list[Path], np.ndarray],
+) -> dict:
+    """Frame retrieval step.
+
+    Args:
+        context (ProjectContext): Project the step runs for
+        scenes (list[Path]): Scene directories
+        image_embeddings (tuple[list[Path], np.ndarray]): Frame paths and embeddings
+
+    Returns:
+        dict: `scene_frames` artifact with the retrieved frames directory of each scene
+    """
+    logger.info("\n##### Starting step 4 frame retrieval #####\n")
+    configs = context.configs
+
+    model = load_similarity_model(configs)
+    img_filepaths, img_emb = image_embeddings
+    logger.info(f"Retrieving from {len(img_filepaths)} images")
+
+    retrieve_frames(
+        scenes,
+        img_filepaths,
+        model,
+        img_emb,
+        configs["frame_ranking"]["n_retrieved_images"],
+    )
+    return {"scene_frames": [scene_dir / "frames" for scene_dir in scenes]}
 
-logger.info(f"Loading {configs['frame_ranking']['model_id']} as the similarity model")
-model = SentenceTransformer(
-    configs["frame_ranking"]["model_id"], device=configs["frame_ranking"]["device"]
-)
 
-img_filepaths = list(FRAMES_DIR.glob("*.jpg"))
-logger.info(f"Retrieving from {len(img_filepaths)} images")
-img_emb = get_image_embeddings(
-    model, img_filepaths, configs["frame_ranking"]["similarity_batch_size"]
-)
+if __name__ == "__main__":
+    from src.common import load_project_context
+    from src.pipeline import run_pipeline
 
-retrieve_frames(
-    img_filepaths, model, img_emb, configs["frame_ranking"]["n_retrieved_images"]
-)
+    run_pipeline(["frame_embedding", "image_retrieval"], load_project_context())
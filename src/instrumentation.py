@@ -0,0 +1,458 @@
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__file__)
+
+# Number of allocation sites kept for each step when tracing memory
+TOP_ALLOCATIONS = 10
+# Minimum seconds between two progress events of a step
+PROGRESS_INTERVAL = 1.0
+# Seconds between two samples of the resident memory while steps run
+MEMORY_SAMPLE_INTERVAL = 0.2
+
+_LOCK = threading.Lock()
+_SETTINGS: dict = {"profile_dir": None, "trace_memory": False}
+# Report of the run in the current context, so projects running in different
+# threads of the same process get their own report
+_REPORT: contextvars.ContextVar[dict] = contextvars.ContextVar("run_report")
+
+
+@dataclass
+class Counter:
+    """Items processed by an instrumented section, updated while it runs."""
+
+    items: int = 0
+
+
+def reset(listener: Optional[Callable[[dict], None]] = None) -> dict:
+    """Start a new run report in the current context.
+
+    Args:
+        listener (Optional[Callable[[dict], None]]): Called with a progress event
+            whenever a step starts or ends, e.g. to update the status of a job
+
+    Returns:
+        dict: New run report
+    """
+    report = {
+        "started_at": time.time(),
+        "start": time.perf_counter(),
+        "cpu_start": time.process_time(),
+        "stages": {},
+        # Start and last progress event time of each step
+        "progress": {},
+        "listener": listener,
+    }
+    _REPORT.set(report)
+    return report
+
+
+def get_report() -> dict:
+    """Run report of the current context, started on first use.
+
+    Returns:
+        dict: Run report
+    """
+    report = _REPORT.get(None)
+    return reset() if report is None else report
+
+
+def emit(event: dict) -> None:
+    """Send a progress event to the listener of the current run, if any.
+
+    Listener errors are logged, progress reporting never fails a step.
+
+    Args:
+        event (dict): Progress event, with at least the `stage` name
+    """
+    listener = get_report()["listener"]
+    if listener is None:
+        return
+    try:
+        listener(event)
+    except Exception:
+        logger.exception("Progress listener failed on %s", event)
+
+
+def report_progress(stage: str, done: int, total: int) -> None:
+    """Report how many items of a step are done, with an estimated time left.
+
+    Called from the loops of the pipeline steps, events are sent at most every
+    `PROGRESS_INTERVAL` seconds per step and always for the last item.
+
+    Args:
+        stage (str): Pipeline step name
+        done (int): Items done so far, e.g. voices generated
+        total (int): Items the step will process
+    """
+    now = time.perf_counter()
+    with _LOCK:
+        progress = get_report()["progress"].setdefault(stage, {"start": now})
+        if done < total and now - progress.get("at", 0.0) < PROGRESS_INTERVAL:
+            return
+        progress["at"] = now
+
+    elapsed = now - progress["start"]
+    eta_seconds = elapsed / done * (total - done) if done else None
+    emit(
+        {
+            "stage": stage,
+            "status": "running",
+            "items": done,
+            "total_items": total,
+            "elapsed_seconds": elapsed,
+            "eta_seconds": eta_seconds,
+        }
+    )
+
+
+def configure(profile_dir: Optional[Path] = None, trace_memory: bool = False) -> None:
+    """Enable the optional per step captures.
+
+    Args:
+        profile_dir (Optional[Path]): Directory to save a cProfile capture of
+            each step to, None disables profiling
+        trace_memory (bool): Record the allocation sites that grew the most
+            during each step with tracemalloc
+    """
+    _SETTINGS["profile_dir"] = profile_dir
+    _SETTINGS["trace_memory"] = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def get_rss_mb(pid: str = "self") -> Optional[float]:
+    """Current resident memory of a process.
+
+    Args:
+        pid (str): Process ID, `self` for this process
+
+    Returns:
+        Optional[float]: Resident set size in MB, None without `/proc`
+    """
+    try:
+        resident_pages = int(Path(f"/proc/{pid}/statm").read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def get_children_rss_mb() -> Optional[float]:
+    """Current resident memory of the child processes, e.g. FFmpeg.
+
+    Returns:
+        Optional[float]: Total resident set size in MB, None without `/proc`
+    """
+    if not Path("/proc/self/stat").exists():
+        return None
+    pid = str(os.getpid())
+    total = 0.0
+    for stat_path in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # The parent PID follows the state, after the command name
+            fields = stat_path.read_text().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if fields[1] == pid:
+            total += get_rss_mb(stat_path.parent.name) or 0.0
+    return total
+
+
+class MemorySampler:
+    """Sample the resident memory of the process and its children.
+
+    `ru_maxrss` only keeps the peak of the whole process life, so in a
+    long-lived worker every step and run would report the peak of the heaviest
+    job so far. A thread samples the current memory while at least one window
+    is open and keeps the peak of each window.
+    """
+
+    def __init__(self, interval: float = MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        # Open windows by ID, windows with the same peaks are still distinct
+        self.windows: dict[int, dict] = {}
+        self.thread: Optional[threading.Thread] = None
+
+    def sample(self) -> None:
+        """Update the peaks of the open windows with the current memory."""
+        current = {
+            "peak_rss_mb": get_rss_mb(),
+            "children_peak_rss_mb": get_children_rss_mb(),
+        }
+        with self.lock:
+            for window in self.windows.values():
+                for name, value in current.items():
+                    if value is not None:
+                        window[name] = max(window[name] or 0.0, value)
+
+    def run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.windows:
+                    self.thread = None
+                    return
+            self.sample()
+
+    def open(self) -> dict:
+        """Start measuring the peak memory.
+
+        Returns:
+            dict: Window whose `peak_rss_mb` and `children_peak_rss_mb` are
+                updated until it is closed, None without `/proc`
+        """
+        window = {"peak_rss_mb": None, "children_peak_rss_mb": None}
+        with self.lock:
+            self.windows[id(window)] = window
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.sample()
+        return window
+
+    def close(self, window: dict) -> dict:
+        """Stop measuring the peak memory of a window.
+
+        Args:
+            window (dict): Window returned by `open`
+
+        Returns:
+            dict: Final peaks of the window
+        """
+        self.sample()
+        with self.lock:
+            del self.windows[id(window)]
+        return window
+
+
+_MEMORY_SAMPLER = MemorySampler()
+
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    """Snapshot the traced allocations, leaving out tracemalloc's own.
+
+    Returns:
+        tracemalloc.Snapshot: Allocation snapshot
+    """
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+
+
+def get_stage_record(stage: str) -> dict:
+    """Record of a step in the current run report, the lock must be held.
+
+    Args:
+        stage (str): Pipeline step name
+
+    Returns:
+        dict: Step record
+    """
+    return get_report()["stages"].setdefault(stage, {"sections": {}})
+
+
+@contextmanager
+def track(stage: str, section: str, items: int = 1) -> Iterator[Counter]:
+    """Measure a hot section of a step, e.g. a TTS call or an encode.
+
+    Args:
+        stage (str): Pipeline step name
+        section (str): Section name, e.g. `tts`
+        items (int): Items processed by the section, can be updated through the
+            yielded counter when only known at the end
+
+    Yields:
+        Iterator[Counter]: Counter of the items processed
+    """
+    counter = Counter(items)
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield counter
+    finally:
+        wall = time.perf_counter() - start
+        cpu = time.thread_time() - cpu_start
+        with _LOCK:
+            sections = get_stage_record(stage)["sections"]
+            totals = sections.setdefault(
+                section,
+                {"calls": 0, "items": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0},
+            )
+            totals["calls"] += 1
+            totals["items"] += counter.items
+            totals["wall_seconds"] += wall
+            totals["cpu_seconds"] += cpu
+
+
+def get_section(stage: str, section: str) -> Optional[dict]:
+    """Totals of a hot section of a step in the current run report.
+
+    Args:
+        stage (str): Pipeline step name
+        section (str): Section name, e.g. `encode`
+
+    Returns:
+        Optional[dict]: Copy of the section `calls`, `items`, `wall_seconds` and
+            `cpu_seconds`, None if the section did not run
+    """
+    with _LOCK:
+        record = get_report()["stages"].get(stage, {"sections": {}})
+        totals = record["sections"].get(section)
+        return None if totals is None else dict(totals)
+
+
+@contextmanager
+def instrument_stage(stage: str) -> Iterator[dict]:
+    """Measure a whole pipeline step.
+
+    CPU time only covers the thread running the step, work done by FFmpeg
+    subprocesses shows up in the children peak RSS instead. Peak RSS and memory
+    traces are process wide, so they include steps running at the same time.
+
+    Args:
+        stage (str): Pipeline step name
+
+    Yields:
+        Iterator[dict]: Step record, its `status` can be set by the caller
+    """
+    with _LOCK:
+        record = get_stage_record(stage)
+    record["status"] = "running"
+    emit({"stage": stage, "status": "running"})
+
+    profiler = None
+    if _SETTINGS["profile_dir"] is not None:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            logger.warning("Could not profile step %s: %s", stage, e)
+            profiler = None
+
+    snapshot = take_snapshot() if _SETTINGS["trace_memory"] else None
+    memory = _MEMORY_SAMPLER.open()
+    start = time.perf_counter()
+    with _LOCK:
+        get_report()["progress"][stage] = {"start": start}
+    cpu_start = time.thread_time()
+    try:
+        yield record
+    except BaseException:
+        record["status"] = "failed"
+        raise
+    finally:
+        record["wall_seconds"] = time.perf_counter() - start
+        record["cpu_seconds"] = time.thread_time() - cpu_start
+        record.update(_MEMORY_SAMPLER.close(memory))
+        if record["status"] == "running":
+            record["status"] = "completed"
+        emit(
+            {
+                "stage": stage,
+                "status": record["status"],
+                "wall_seconds": record["wall_seconds"],
+            }
+        )
+
+        if profiler is not None:
+            profiler.disable()
+            profile_dir = _SETTINGS["profile_dir"]
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            profile_path = profile_dir / f"{stage}.prof"
+            profiler.dump_stats(profile_path)
+            record["profile"] = str(profile_path)
+
+        if snapshot is not None:
+            stats = take_snapshot().compare_to(snapshot, "lineno")
+            record["memory"] = {
+                "traced_peak_mb": tracemalloc.get_traced_memory()[1] / 1024**2,
+                "top_allocations": [
+                    {
+                        "site": str(stat.traceback),
+                        "size_diff_mb": stat.size_diff / 1024**2,
+                    }
+                    for stat in stats[:TOP_ALLOCATIONS]
+                ],
+            }
+
+
+def get_run_report(status: str) -> dict:
+    """Summarize the run, adding throughput to every step and section.
+
+    Args:
+        status (str): Outcome of the run, e.g. `completed`
+
+    Returns:
+        dict: Run report
+    """
+    run = get_report()
+    with _LOCK:
+        stages = json.loads(json.dumps(run["stages"]))
+    report = {
+        "status": status,
+        "started_at": run["started_at"],
+        "wall_seconds": time.perf_counter() - run["start"],
+        "cpu_seconds": time.process_time() - run["cpu_start"],
+        # Peaks of this run only, the highest of its steps
+        **{
+            name: max(
+                (
+                    record[name]
+                    for record in stages.values()
+                    if record.get(name) is not None
+                ),
+                default=None,
+            )
+            for name in ("peak_rss_mb", "children_peak_rss_mb")
+        },
+        "stages": stages,
+    }
+
+    for record in stages.values():
+        for totals in record["sections"].values():
+            totals["items_per_second"] = get_items_per_second(
+                totals["items"], totals["wall_seconds"]
+            )
+        record["items"] = sum(s["items"] for s in record["sections"].values())
+        record["items_per_second"] = get_items_per_second(
+            record["items"], record.get("wall_seconds", 0.0)
+        )
+    return report
+
+
+def write_run_report(path: Path, status: str) -> None:
+    """Save the run report as JSON.
+
+    Args:
+        path (Path): Output file, usually `run_report.json` in the project directory
+        status (str): Outcome of the run, e.g. `completed`
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(get_run_report(status), indent=2))
+    os.replace(tmp_path, path)
+    logger.info("Run report saved to %s", path)
+
+
+def get_items_per_second(items: int, seconds: float) -> Optional[float]:
+    """Throughput of a step or section.
+
+    Args:
+        items (int): Items processed
+        seconds (float): Wall time
+
+    Returns:
+        Optional[float]: Items per second, None if nothing was timed
+    """
+    return items / seconds if seconds > 0 else None
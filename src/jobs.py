@@ -0,0 +1,339 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__file__)
+
+# Job states, jobs left queued or running by a previous process are run again
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+UNFINISHED = (QUEUED, RUNNING)
+FINISHED = (COMPLETED, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    stage TEXT,
+    stages TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+JSON_COLUMNS = ("params", "stages", "result")
+
+
+class JobStore:
+    """Trailer jobs persisted in SQLite, so their state survives restarts.
+
+    A connection is opened for each operation, the store can be shared by
+    every thread of the process.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        with closing(self.connect()) as conn, conn:
+            conn.execute(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a connection to the database.
+
+        Returns:
+            sqlite3.Connection: Connection returning rows as `sqlite3.Row`
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, job_id: str, params: dict) -> dict:
+        """Add a queued job.
+
+        Args:
+            job_id (str): Job ID
+            params (dict): Parameters needed to run the job, must be JSON
+                serializable
+
+        Returns:
+            dict: New job
+        """
+        now = time.time()
+        with self.lock, closing(self.connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, params, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(params), now, now),
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields) -> None:
+        """Change some fields of a job.
+
+        Args:
+            job_id (str): Job ID
+            **fields: New values, e.g. `status` or `result`
+        """
+        for name in JSON_COLUMNS:
+            if name in fields:
+                fields[name] = json.dumps(fields[name])
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock, closing(self.connect()) as conn, conn:
+            conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id)
+            )
+
+    def set_stage(self, job_id: str, stage: str, status: str) -> None:
+        """Record the progress of a pipeline step of a job.
+
+        Args:
+            job_id (str): Job ID
+            stage (str): Pipeline step name
+            status (str): Step status, e.g. `running` or `skipped`
+        """
+        with self.lock, closing(self.connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT stages FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            stages = json.loads(row["stages"])
+            stages[stage] = status
+            conn.execute(
+                "UPDATE jobs SET stage = ?, stages = ?, updated_at = ? WHERE id = ?",
+                (stage, json.dumps(stages), time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Get a job.
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            Optional[dict]: Job, None if there is no job with that ID
+        """
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for name in JSON_COLUMNS:
+            job[name] = json.loads(job[name]) if job[name] is not None else None
+        return job
+
+    def list_unfinished(self) -> list[str]:
+        """Jobs that are queued or were running, oldest first.
+
+        Returns:
+            list[str]: Job IDs
+        """
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                UNFINISHED,
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+
+class EventBroker:
+    """Fan out the progress events of the running jobs to their subscribers.
+
+    Events are published from the threads running the jobs, subscribers are
+    called in those threads and must not block.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers: dict[str, list[Callable[[dict], None]]] = {}
+
+    def subscribe(self, job_id: str, callback: Callable[[dict], None]) -> None:
+        """Start receiving the events of a job.
+
+        Args:
+            job_id (str): Job ID
+            callback (Callable[[dict], None]): Called with each event
+        """
+        with self.lock:
+            self.subscribers.setdefault(job_id, []).append(callback)
+
+    def unsubscribe(self, job_id: str, callback: Callable[[dict], None]) -> None:
+        """Stop receiving the events of a job.
+
+        Args:
+            job_id (str): Job ID
+            callback (Callable[[dict], None]): Callback given to `subscribe`
+        """
+        with self.lock:
+            callbacks = self.subscribers.get(job_id, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self.subscribers.pop(job_id, None)
+
+    def publish(self, job_id: str, event: dict) -> None:
+        """Send an event to the subscribers of a job.
+
+        Args:
+            job_id (str): Job ID
+            event (dict): Progress event
+        """
+        with self.lock:
+            callbacks = list(self.subscribers.get(job_id, []))
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Subscriber of job %s failed", job_id)
+
+
+class JobQueue:
+    """Run the jobs of a store on a bounded pool of background threads.
+
+    The runner is called with the ID and parameters of a job and a listener
+    for its progress events, it returns the job result and raises if the job
+    failed. Step events are saved to the store and every event is published
+    to the broker.
+
+    The threads are daemons, so stopping the process never waits for a render
+    to finish: the interrupted jobs are still running in the store and are
+    queued again by `recover` on the next start.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        runner: Callable[[str, dict, Callable[[dict], None]], dict],
+        max_concurrency: int = 1,
+        broker: Optional[EventBroker] = None,
+    ):
+        self.store = store
+        self.runner = runner
+        self.broker = broker or EventBroker()
+        self.pending: queue.Queue[Optional[tuple[str, Future]]] = queue.Queue()
+        self.stopped = False
+        self.max_concurrency = max_concurrency
+        for _ in range(max_concurrency):
+            threading.Thread(target=self.work, daemon=True).start()
+
+    def get_listener(self, job_id: str) -> Callable[[dict], None]:
+        """Listener recording the progress events of a job.
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            Callable[[dict], None]: Listener of the job events
+        """
+
+        def listener(event: dict) -> None:
+            # Item counts are only streamed, the store keeps each step status
+            if "items" not in event:
+                self.store.set_stage(job_id, event["stage"], event["status"])
+            self.broker.publish(job_id, event)
+
+        return listener
+
+    def set_status(self, job_id: str, status: str, **fields) -> None:
+        """Change the status of a job and publish it.
+
+        Args:
+            job_id (str): Job ID
+            status (str): New job status
+            **fields: Other fields to update, e.g. `result` or `error`
+        """
+        self.store.update(job_id, status=status, **fields)
+        self.broker.publish(job_id, {"job_status": status, **fields})
+
+    def submit(self, job_id: str) -> Future:
+        """Queue a job of the store.
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            Future: Completes once the job is done, failed jobs do not raise
+
+        Raises:
+            RuntimeError: If the queue was shut down
+        """
+        if self.stopped:
+            raise RuntimeError("Cannot submit jobs after shutdown")
+        future: Future = Future()
+        self.pending.put((job_id, future))
+        return future
+
+    def work(self) -> None:
+        """Run queued jobs until the queue is shut down."""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            job_id, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self.run(job_id)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+    def run(self, job_id: str) -> None:
+        """Run a job and record its outcome.
+
+        Args:
+            job_id (str): Job ID
+        """
+        job = self.store.get(job_id)
+        self.set_status(job_id, RUNNING, error=None)
+        logger.info("Running job %s", job_id)
+        try:
+            result = self.runner(job_id, job["params"], self.get_listener(job_id))
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            self.set_status(job_id, FAILED, error=str(e))
+            return
+        self.set_status(job_id, COMPLETED, result=result)
+        logger.info("Job %s completed", job_id)
+
+    def recover(self) -> dict[str, Future]:
+        """Queue again the jobs left unfinished by a previous process.
+
+        Returns:
+            dict[str, Future]: Queued jobs by ID, oldest first
+        """
+        futures = {}
+        for job_id in self.store.list_unfinished():
+            logger.info("Resuming job %s", job_id)
+            futures[job_id] = self.submit(job_id)
+        return futures
+
+    def shutdown(self) -> None:
+        """Stop taking jobs without waiting for the running ones.
+
+        Queued jobs stay queued in the store, running jobs go on until the
+        process exits and are resumed by `recover` if they did not finish.
+        """
+        self.stopped = True
+        while True:
+            try:
+                item = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].cancel()
+        # One stop marker per thread
+        for _ in range(self.max_concurrency):
+            self.pending.put(None)
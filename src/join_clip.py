@@ -1,112 +1,252 @@
 import logging
 import shutil
-import traceback
 from pathlib import Path
-from moviepy import VideoFileClip, concatenate_videoclips, AudioFileClip
+from typing import Optional
 
-from src.common import SCENES_DIR, TRAILER_DIR
+from src.candidates import iter_candidates
+from src.common import ProjectContext
+from src.encoding import encode_timer, get_ffmpeg_args, get_profile, log_encode_timings
+from src.ffmpeg_tools import concat_copy, encode_segment
+from src.instrumentation import report_progress
+from src.proxy import conform_segment
+from src.scoring import load_scene_segments, rank_candidates, write_report
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
+
+
+def get_trailer_path(trailer_dir: Path, candidate_idx: int) -> Path:
+    """Build the output path of a trailer candidate.
+
+    Args:
+        trailer_dir (Path): Directory to save the trailers
+        candidate_idx (int): Zero-based candidate number
+
+    Returns:
+        Path: `final_trailer.mp4` for the first candidate, `trailer_N.mp4` otherwise
+    """
+    if candidate_idx == 0:
+        return trailer_dir / "final_trailer.mp4"
+    return trailer_dir / f"trailer_{candidate_idx + 1}.mp4"
 
 
-def join_clips(all_scene_clips: list[list[Path]], trailer_dir: Path) -> None:
-    """Join audio clips to create a single trailer.
+def encode_segments(
+    candidates: list[tuple[Path, ...]],
+    segments_dir: Path,
+    profile: dict,
+    conform_video_path: Optional[str] = None,
+    clip_volume: float = 1.0,
+    voice_volume: float = 1.0,
+) -> dict[Path, Path]:
+    """Encode each distinct scene clip used by the candidates exactly once.
+
+    Args:
+        candidates (list[tuple[Path, ...]]): Clip selected for each scene, per candidate
+        segments_dir (Path): Directory to save the normalized segments
+        profile (dict): Encoding profile of the segments
+        conform_video_path (Optional[str]): Original video to re-render the clips
+            from at full resolution, used when the clips were made from a proxy
+        clip_volume (float): Volume of the original clip used when conforming
+        voice_volume (float): Volume of the generated voice used when conforming
+
+    Returns:
+        dict[Path, Path]: Normalized segment for each audio clip
+    """
+    segments_dir.mkdir(parents=True, exist_ok=True)
+    video_args = get_ffmpeg_args(profile)
+    segments = {}
+
+    n_segments = len({clip_path for candidate in candidates for clip_path in candidate})
+    for candidate in candidates:
+        for clip_path in candidate:
+            if clip_path in segments:
+                continue
+            report_progress("join_clip", len(segments), n_segments)
+
+            # Audio clips of different scenes share the same file names
+            scene_name = clip_path.parent.parent.name
+            segment_path = segments_dir / f"{scene_name}_{clip_path.name}"
+            with encode_timer("join_clip", profile, segment_path):
+                if conform_video_path:
+                    conform_segment(
+                        conform_video_path,
+                        clip_path,
+                        segment_path,
+                        clip_volume,
+                        voice_volume,
+                        video_args,
+                    )
+                else:
+                    logger.info("Encoding segment %s from %s", segment_path, clip_path)
+                    encode_segment(clip_path, segment_path, video_args)
+            segments[clip_path] = segment_path
+
+    logger.info("Encoded %s distinct segments", len(segments))
+    return segments
+
+
+def join_clips(
+    all_scene_clips: list[list[Path]],
+    trailer_dir: Path,
+    max_candidates: int,
+    seed: int,
+    profile: dict,
+    scoring: Optional[dict] = None,
+    min_clip_len: int = 0,
+    conform_video_path: Optional[str] = None,
+    clip_volume: float = 1.0,
+    voice_volume: float = 1.0,
+    renditions: Optional[list[dict]] = None,
+) -> None:
+    """Join audio clips to create the trailer candidates.
 
     Args:
         all_scene_clips (list[list[Path]]): List of audio clips for each scene
-        trailer_dir (Path): Directory to save the trailer
+        trailer_dir (Path): Directory to save the trailers
+        max_candidates (int): Maximum number of trailer candidates to create
+        seed (int): Seed used to sample candidates when there are too many
+        profile (dict): Encoding profile of the trailer segments
+        scoring (Optional[dict]): Candidate scoring configs, if enabled only the
+            best `max_candidates` candidates are rendered
+        min_clip_len (int): Minimum clip length used by the clip step
+        conform_video_path (Optional[str]): Original video to conform the selected
+            clips from, when they were rendered from a proxy
+        clip_volume (float): Volume of the original clip used when conforming
+        voice_volume (float): Volume of the generated voice used when conforming
+        renditions (Optional[list[dict]]): Scaled encodes of the final trailer,
+            the other candidates are only previews
+
+    Raises:
+        RuntimeError: If no scene has clips, FFmpeg errors are raised as well
     """
     logger.info("\n===== Starting Trailer Generation =====")
 
-    # Create a single trailer by selecting one clip from each scene
-    trailer_clips = []
-
+    scene_clips_found = []
     for scene_idx, scene_clips in enumerate(all_scene_clips):
         if not scene_clips:
-            logger.error(f"No clips found for scene {scene_idx+1}")
-            continue
-
-        # Select the first clip from each scene (assumed to be the best match)
-        selected_clip_path = scene_clips[0]
-        logger.info(f"Selected clip for scene {scene_idx+1}: {selected_clip_path}")
-
-        if not selected_clip_path.exists():
-            logger.error(f"Selected clip does not exist: {selected_clip_path}")
+            logger.error("No clips found for scene %s", scene_idx + 1)
             continue
-
-        try:
-            # Make sure to include audio when loading the clip
-            clip = VideoFileClip(str(selected_clip_path), audio=True)
-
-            # Check if the clip has audio
-            if clip.audio is None:
-                logger.warning(f"Clip has no audio: {selected_clip_path}")
-            else:
-                logger.info(
-                    f"Loaded clip with audio - Duration: {clip.duration}, Audio: {clip.audio.duration if clip.audio else 'None'}"
-                )
-
-            trailer_clips.append(clip)
-        except Exception as e:
-            logger.error(f"Failed to load clip {selected_clip_path}: {e}")
-
-    if not trailer_clips:
-        logger.error("No clips could be loaded for the trailer")
-        return
-
-    # Create the trailer path
-    trailer_path = trailer_dir / "final_trailer.mp4"
-    logger.info(f"Creating single trailer at: {trailer_path}")
-
-    try:
-        # Concatenate clips sequentially with audio
-        logger.info(f"Concatenating {len(trailer_clips)} clips for the trailer")
-        trailer = concatenate_videoclips(trailer_clips, method="compose")
-        logger.info(f"Concatenation successful! Trailer duration: {trailer.duration}")
-
-        # Write the trailer file with audio
-        logger.info(f"Writing trailer to file: {trailer_path}")
-        trailer.write_videofile(
-            str(trailer_path),
-            codec="libx264",
-            audio_codec="aac",
-            temp_audiofile=str(trailer_dir / "temp-audio.m4a"),
-            remove_temp=True,
+        scene_clips_found.append(scene_clips)
+
+    if not scene_clips_found:
+        raise RuntimeError("No clips could be loaded for the trailer")
+
+    ranked = None
+    if scoring and scoring["enabled"]:
+        logger.info("Scoring trailer candidates before rendering")
+        scene_segments = [
+            load_scene_segments(scene_clips, min_clip_len)
+            for scene_clips in scene_clips_found
+        ]
+        ranked = rank_candidates(
+            scene_segments,
+            max_candidates,
+            scoring["beam_width"],
+            scoring["similarity_weight"],
+            scoring["duration_weight"],
+            scoring["diversity_weight"],
         )
-        logger.info(f"Successfully created trailer: {trailer_path}")
-    except Exception as e:
-        logger.error(f"Error creating trailer: {e}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        candidates = [
+            tuple(segment["path"] for segment in candidate["segments"])
+            for candidate in ranked
+        ]
+    else:
+        candidates = list(iter_candidates(scene_clips_found, max_candidates, seed))
+    logger.info("Creating %s trailer candidates", len(candidates))
+
+    trailer_paths = [
+        get_trailer_path(trailer_dir, candidate_idx)
+        for candidate_idx in range(len(candidates))
+    ]
+    if ranked is not None:
+        write_report(ranked, trailer_paths, trailer_dir / "candidates.json")
+
+    # Failures are raised so the step is not recorded as completed
+    segments = encode_segments(
+        candidates,
+        trailer_dir / "segments",
+        profile,
+        conform_video_path,
+        clip_volume,
+        voice_volume,
+    )
+    for candidate_idx, (candidate, trailer_path) in enumerate(
+        zip(candidates, trailer_paths)
+    ):
+        logger.info(
+            "Creating trailer %s from clips: %s",
+            trailer_path,
+            [str(clip_path) for clip_path in candidate],
+        )
+        concat_copy(
+            [segments[clip_path] for clip_path in candidate],
+            trailer_path,
+            renditions if candidate_idx == 0 else None,
+        )
+        logger.info("Successfully created trailer: %s", trailer_path)
 
+    log_encode_timings("join_clip")
     logger.info("\n===== Trailer Generation Complete =====")
 
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__file__)
-
-logger.info("\n##### Starting step 7 trailer creation #####\n")
+def run(context: ProjectContext, video: str, scenes: list[Path]) -> dict:
+    """Trailer creation step.
 
-# Log scene directories
-logger.info("Scene directories to process: %s", [str(d) for d in SCENES_DIR])
+    Args:
+        context (ProjectContext): Project the step runs for
+        video (str): Path to the original video file
+        scenes (list[Path]): Scene directories
 
-# Create trailer directory
-if TRAILER_DIR.exists():
-    logger.info("Removing existing trailer directory: %s", TRAILER_DIR)
-    shutil.rmtree(TRAILER_DIR)
+    Returns:
+        dict: `trailers` artifact with the trailer directory
+    """
+    logger.info("\n##### Starting step 7 trailer creation #####\n")
+    configs = context.configs
+    trailer_dir = context.trailer_dir
+
+    # Log scene directories
+    logger.info("Scene directories to process: %s", [str(d) for d in scenes])
+
+    # Create trailer directory
+    if trailer_dir.exists():
+        logger.info("Removing existing trailer directory: %s", trailer_dir)
+        shutil.rmtree(trailer_dir)
+
+    logger.info("Creating trailer directory: %s", trailer_dir)
+    trailer_dir.mkdir(parents=True, exist_ok=True)
+
+    # Discover audio clips for each scene, sorted so candidates are reproducible
+    logger.info("Discovering audio clips in each scene directory...")
+    all_scene_clips = []
+    for scene_dir in scenes:
+        scene_audio_clips = sorted(scene_dir.glob("audio_clips/*.mp4"))
+        logger.info(
+            "Found %s audio clips in %s",
+            len(scene_audio_clips),
+            scene_dir,
+        )
+        all_scene_clips.append(scene_audio_clips)
+
+    logger.info("Starting clip joining process...")
+    join_clips(
+        all_scene_clips,
+        trailer_dir,
+        configs["join_clip"]["max_candidates"],
+        configs["join_clip"]["seed"],
+        get_profile(configs, "join_clip"),
+        configs["join_clip"]["scoring"],
+        configs["clip"]["min_clip_len"],
+        # Only the selected clips are rendered again from the full resolution video
+        video if configs["proxy"]["enabled"] else None,
+        configs["audio_clip"]["clip_volume"],
+        configs["audio_clip"]["voice_volume"],
+        configs["join_clip"]["renditions"],
+    )
+    return {"trailers": trailer_dir}
 
-logger.info("Creating trailer directory: %s", TRAILER_DIR)
-TRAILER_DIR.mkdir(parents=True, exist_ok=True)
 
-# Discover audio clips for each scene
-logger.info("Discovering audio clips in each scene directory...")
-all_scene_clips = []
-for scene_dir in SCENES_DIR:
-    scene_audio_clips = list(scene_dir.glob("audio_clips/*.mp4"))
-    logger.info(
-        "Found %s audio clips in %s",
-        len(scene_audio_clips),
-        scene_dir,
-    )
-    all_scene_clips.append(scene_audio_clips)
+if __name__ == "__main__":
+    from src.common import load_project_context
+    from src.pipeline import run_pipeline
 
-# Start joining clips to create one final trailer
-logger.info("Starting clip joining process to create one trailer...")
-join_clips(all_scene_clips, TRAILER_DIR)
+    run_pipeline(["join_clip"], load_project_context())
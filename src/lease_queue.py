@@ -0,0 +1,506 @@
+"""Queue of trailer tasks shared by several machines through a file system.
+
+Every node mounting the queue directory (e.g. over NFS) can run a worker. A
+task is a whole project or a part of one, e.g. a shard of its clips, and is
+claimed by creating its lease file atomically. The worker renews the lease
+while the task runs; a lease that is not renewed expires, and the task is
+taken over by another node. Node clocks are expected to be synchronized.
+
+The queue directory holds:
+    tasks/<task_id>.json: Task description, written once
+    leases/<task_id>.lease: Owner and expiry of a claimed task
+    done/<task_id>.json: Task result, `completed` or `failed`
+
+Usage:
+    python -m src.lease_queue submit --config projects/<name>/project_config.yaml
+    python -m src.lease_queue work --node render-1
+    python -m src.lease_queue status
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+
+from src.catalogue import PREPARE_STAGES
+from src.common import CONFIGS_PATH, ProjectContext, parse_configs
+from src.cost_model import write_project_features
+from src.pipeline import PIPELINE_STAGES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
+
+# Steps of a shard, each renders the clips of every `count`-th scene
+SHARD_STAGES = ["clip", "audio_clip"]
+
+
+def write_new(path: Path, data: dict) -> bool:
+    """Write a JSON file only if it does not exist, atomically.
+
+    The file is written aside and hard-linked in place, so readers never see
+    a partial file and only one of several concurrent writers succeeds.
+
+    Args:
+        path (Path): File to create
+        data (dict): File content
+
+    Returns:
+        bool: True if the file was created
+    """
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(json.dumps(data))
+    try:
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        tmp_path.unlink()
+
+
+def write_replace(path: Path, data: dict) -> None:
+    """Write a JSON file atomically, replacing it if it exists.
+
+    Args:
+        path (Path): File to write
+        data (dict): File content
+    """
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def read_json(path: Path) -> Optional[dict]:
+    """Read a JSON file of the queue.
+
+    Args:
+        path (Path): File to read
+
+    Returns:
+        Optional[dict]: File content, None if the file does not exist
+    """
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return None
+
+
+class LeaseQueue:
+    """Task queue in a directory shared by the nodes.
+
+    Args:
+        root (Path): Queue directory
+        lease_seconds (float): Time a lease stays valid without a heartbeat
+        owner (Optional[str]): Name of this worker in the leases, defaults to
+            the host name, process ID and a random suffix
+    """
+
+    def __init__(
+        self, root: Path, lease_seconds: float = 60, owner: Optional[str] = None
+    ):
+        self.root = Path(root)
+        self.lease_seconds = lease_seconds
+        self.owner = (
+            owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.tasks_dir = self.root / "tasks"
+        self.leases_dir = self.root / "leases"
+        self.done_dir = self.root / "done"
+        for directory in [self.tasks_dir, self.leases_dir, self.done_dir]:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def get_lease_path(self, task_id: str) -> Path:
+        return self.leases_dir / f"{task_id}.lease"
+
+    def get_done_path(self, task_id: str) -> Path:
+        return self.done_dir / f"{task_id}.json"
+
+    def submit(
+        self,
+        task_id: str,
+        stages: list[str],
+        config_path: Optional[str] = None,
+        overrides: Optional[dict] = None,
+        after: tuple[str, ...] = (),
+    ) -> bool:
+        """Add a task to the queue.
+
+        Args:
+            task_id (str): Unique task ID, also its file name
+            stages (list[str]): Steps the task runs
+            config_path (Optional[str]): Project configs of the task
+            overrides (Optional[dict]): Config overrides of the task
+            after (tuple[str, ...]): Tasks that must complete before this one
+
+        Returns:
+            bool: False if a task with this ID was already submitted
+        """
+        task = {
+            "id": task_id,
+            "stages": list(stages),
+            "config_path": config_path,
+            "overrides": overrides or {},
+            "after": list(after),
+            "created_at": time.time(),
+        }
+        submitted = write_new(self.tasks_dir / f"{task_id}.json", task)
+        if submitted:
+            logger.info("Submitted task %s: %s", task_id, stages)
+        return submitted
+
+    def submit_project(self, config_path: str, shards: int = 0) -> list[str]:
+        """Add the tasks of a project to the queue.
+
+        Args:
+            config_path (str): Project configs
+            shards (int): Number of tasks rendering the clips of the project in
+                parallel, 0 runs the whole project as a single task
+
+        Returns:
+            list[str]: Task IDs, in order
+        """
+        configs = parse_configs(config_path)
+        name = configs["project_name"]
+        download = ["video_download"] if configs.get("video_file_id") else []
+        if shards < 1:
+            self.submit(name, [*download, *PIPELINE_STAGES], config_path)
+            return [name]
+
+        prepare_id = f"{name}.prepare"
+        self.submit(prepare_id, [*download, *PREPARE_STAGES], config_path)
+        shard_ids = []
+        for index in range(shards):
+            shard_id = f"{name}.clip_{index}"
+            # Shards only see some scenes, they must not record them as the
+            # steps' outputs for incremental runs
+            overrides = {
+                "pipeline": {"incremental": False, "scene_shard": [index, shards]}
+            }
+            self.submit(shard_id, SHARD_STAGES, config_path, overrides, (prepare_id,))
+            shard_ids.append(shard_id)
+        join_id = f"{name}.join"
+        self.submit(join_id, ["join_clip"], config_path, after=tuple(shard_ids))
+        return [prepare_id, *shard_ids, join_id]
+
+    def read_tasks(self) -> list[dict]:
+        """Tasks of the queue, oldest first.
+
+        Returns:
+            list[dict]: Task descriptions
+        """
+        tasks = [read_json(path) for path in self.tasks_dir.glob("*.json")]
+        return sorted(
+            (task for task in tasks if task is not None),
+            key=lambda task: (task["created_at"], task["id"]),
+        )
+
+    def get_result(self, task_id: str) -> Optional[dict]:
+        """Result of a task.
+
+        Args:
+            task_id (str): Task ID
+
+        Returns:
+            Optional[dict]: Task `status` and `error`, None if it is not done
+        """
+        return read_json(self.get_done_path(task_id))
+
+    def acquire(self, task_id: str) -> bool:
+        """Lease a task, taking over its lease if it expired.
+
+        Args:
+            task_id (str): Task ID
+
+        Returns:
+            bool: True if this worker now holds the lease
+        """
+        lease_path = self.get_lease_path(task_id)
+        lease = {"owner": self.owner, "expires_at": time.time() + self.lease_seconds}
+        if write_new(lease_path, lease):
+            return True
+
+        current = read_json(lease_path)
+        if current is None or current["expires_at"] > time.time():
+            return False
+        # Move the expired lease aside, only one worker can rename it
+        stale_path = lease_path.with_name(f"{lease_path.name}.{uuid.uuid4().hex}")
+        try:
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            return False
+        stale = read_json(stale_path)
+        if stale["expires_at"] > time.time():
+            # Another worker took the lease over between the read and the
+            # rename, give it back
+            try:
+                os.link(stale_path, lease_path)
+            except FileExistsError:
+                pass
+            stale_path.unlink()
+            return False
+        stale_path.unlink()
+        logger.warning("Lease of %s held by %s expired", task_id, stale["owner"])
+        lease["expires_at"] = time.time() + self.lease_seconds
+        return write_new(lease_path, lease)
+
+    def heartbeat(self, task_id: str) -> bool:
+        """Renew the lease of a task held by this worker.
+
+        An expired lease is lost, another worker may be taking it over. The new
+        lease is written aside and moved in place, then read back: if another
+        worker took the lease over between the read and the write, one of the
+        two sees the other owner on its next heartbeat and stops its run.
+
+        Args:
+            task_id (str): Task ID
+
+        Returns:
+            bool: False if the lease was lost to another worker
+        """
+        lease_path = self.get_lease_path(task_id)
+        lease = read_json(lease_path)
+        if (
+            lease is None
+            or lease["owner"] != self.owner
+            or lease["expires_at"] <= time.time()
+        ):
+            return False
+        lease["expires_at"] = time.time() + self.lease_seconds
+        write_replace(lease_path, lease)
+        current = read_json(lease_path)
+        return current is not None and current["owner"] == self.owner
+
+    def release(self, task_id: str) -> None:
+        """Remove the lease of a task if this worker holds it.
+
+        Args:
+            task_id (str): Task ID
+        """
+        lease_path = self.get_lease_path(task_id)
+        lease = read_json(lease_path)
+        if lease is not None and lease["owner"] == self.owner:
+            lease_path.unlink(missing_ok=True)
+
+    def complete(self, task_id: str, status: str, error: Optional[str] = None) -> bool:
+        """Record the result of a leased task and release it.
+
+        Args:
+            task_id (str): Task ID
+            status (str): `completed` or `failed`
+            error (Optional[str]): Error message of a failed task
+
+        Returns:
+            bool: False if the lease was lost, the result is then left to the
+                worker that took the task over
+        """
+        if not self.heartbeat(task_id):
+            logger.warning("Lease of %s was lost, dropping its result", task_id)
+            return False
+        write_replace(
+            self.get_done_path(task_id),
+            {
+                "status": status,
+                "error": error,
+                "owner": self.owner,
+                "finished_at": time.time(),
+            },
+        )
+        self.release(task_id)
+        return True
+
+    def claim(self) -> Optional[dict]:
+        """Lease the oldest task whose dependencies completed.
+
+        Tasks depending on a failed task fail as well.
+
+        Returns:
+            Optional[dict]: Leased task, None if no task is ready
+        """
+        for task in self.read_tasks():
+            if self.get_done_path(task["id"]).exists():
+                continue
+            results = [self.get_result(dep) for dep in task["after"]]
+            failed = [
+                dep
+                for dep, result in zip(task["after"], results)
+                if result is not None and result["status"] == "failed"
+            ]
+            if failed:
+                write_replace(
+                    self.get_done_path(task["id"]),
+                    {"status": "failed", "error": f"Dependencies {failed} failed"},
+                )
+                continue
+            if any(result is None for result in results):
+                continue
+            if self.acquire(task["id"]):
+                # The task may have completed and released its lease since
+                # it was checked
+                if self.get_done_path(task["id"]).exists():
+                    self.release(task["id"])
+                    continue
+                return task
+        return None
+
+    def get_status(self) -> dict[str, str]:
+        """Status of every task.
+
+        Returns:
+            dict[str, str]: `completed`, `failed`, `running` or `pending` for
+                each task ID
+        """
+        status = {}
+        for task in self.read_tasks():
+            result = self.get_result(task["id"])
+            if result is not None:
+                status[task["id"]] = result["status"]
+            elif self.get_lease_path(task["id"]).exists():
+                status[task["id"]] = "running"
+            else:
+                status[task["id"]] = "pending"
+        return status
+
+
+def run_task(task: dict) -> int:
+    """Run the steps of a task in this process.
+
+    Args:
+        task (dict): Task description
+
+    Returns:
+        int: Exit code, 1 if a step failed
+    """
+    from src.main import run_project
+
+    context = ProjectContext.from_configs(
+        parse_configs(task["config_path"])
+    ).with_overrides(task["overrides"])
+    # Tasks of a project share its directory, each keeps its own run report
+    exit_code = run_project(
+        context, task["stages"], report_name=f"run_report_{task['id']}.json"
+    )
+    if exit_code == 0 and "subplot" in task["stages"]:
+        # Calibrates the cost model once the project is rendered
+        write_project_features(context)
+    return exit_code
+
+
+def run_in_process(runner: Callable[[dict], int], task: dict) -> None:
+    """Run a task in a child process of the worker, exiting with its exit code.
+
+    Args:
+        runner (Callable[[dict], int]): Runs a task and returns an exit code
+        task (dict): Task description
+    """
+    sys.exit(runner(task))
+
+
+def run_worker(
+    queue: LeaseQueue,
+    runner: Callable[[dict], int] = run_task,
+    heartbeat_seconds: float = 15,
+    poll_seconds: float = 5,
+    stop_when_idle: bool = False,
+) -> int:
+    """Claim and run tasks until stopped.
+
+    Each task runs in a child process, terminated if the lease is lost so the
+    task never runs on two nodes at the same time for long.
+
+    Args:
+        queue (LeaseQueue): Task queue
+        runner (Callable[[dict], int]): Runs a task and returns an exit code,
+            must be picklable
+        heartbeat_seconds (float): Time between two renewals of the lease
+        poll_seconds (float): Time to wait when no task is ready
+        stop_when_idle (bool): Return once every task of the queue is done
+
+    Returns:
+        int: Number of tasks run by this worker
+    """
+    n_tasks = 0
+    while True:
+        task = queue.claim()
+        if task is None:
+            if stop_when_idle and all(
+                status in ("completed", "failed")
+                for status in queue.get_status().values()
+            ):
+                return n_tasks
+            time.sleep(poll_seconds)
+            continue
+
+        logger.info("Worker %s running task %s", queue.owner, task["id"])
+        process = multiprocessing.Process(target=run_in_process, args=(runner, task))
+        process.start()
+        lost = False
+        try:
+            while process.is_alive():
+                process.join(heartbeat_seconds)
+                if process.is_alive() and not queue.heartbeat(task["id"]):
+                    lost = True
+                    break
+        finally:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        n_tasks += 1
+        if lost:
+            logger.warning("Lease of %s was lost, stopped its run", task["id"])
+            continue
+
+        error = None if process.exitcode == 0 else f"Exit code {process.exitcode}"
+        if error is not None:
+            logger.error("Task %s failed: %s", task["id"], error)
+        queue.complete(task["id"], "completed" if error is None else "failed", error)
+
+
+def main() -> int:
+    """Submit projects to the queue, run a worker or print the queue status.
+
+    Returns:
+        int: Exit code
+    """
+    parser = argparse.ArgumentParser(description="AI Trailer multi-node queue")
+    parser.add_argument("command", choices=["submit", "work", "status"])
+    parser.add_argument("--config", type=str, help="Project configs")
+    parser.add_argument("--shards", type=int, help="Clip shards of a submitted project")
+    parser.add_argument("--node", type=str, help="Worker name in the leases")
+    parser.add_argument(
+        "--once", action="store_true", help="Stop once every task is done"
+    )
+    args = parser.parse_args()
+    configs_path = Path(args.config).resolve() if args.config else CONFIGS_PATH
+
+    # Project paths in the configs are relative to the repository root
+    os.chdir(Path(__file__).parent.parent)
+    configs = parse_configs(configs_path)["lease_queue"]
+    owner = f"{args.node}:{os.getpid()}" if args.node else None
+    queue = LeaseQueue(configs["dir"], configs["lease_seconds"], owner)
+
+    if args.command == "submit":
+        shards = configs["shards"] if args.shards is None else args.shards
+        for task_id in queue.submit_project(str(configs_path), shards):
+            logger.info("Queued %s", task_id)
+    elif args.command == "work":
+        run_worker(
+            queue,
+            heartbeat_seconds=configs["heartbeat_seconds"],
+            poll_seconds=configs["poll_seconds"],
+            stop_when_idle=args.once,
+        )
+    else:
+        for task_id, status in queue.get_status().items():
+            print(f"{task_id}: {status}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
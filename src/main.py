@@ -4,7 +4,8 @@ import sys
 import argparse
 from pathlib import Path
 import yaml
-import importlib
+
+from src.common import ProjectContext, load_project_context
 
 
 # Setup logging
@@ -20,19 +21,56 @@ def main():
     Orchestrates the entire process of generating a trailer from a plot and video.
     """
     logger.info("Starting AI trailer generation pipeline")
-    
+
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='AI Trailer Generator')
     parser.add_argument('--config', type=str, help='Path to project configuration file')
+    parser.add_argument(
+        '--preview',
+        action='store_true',
+        help='Render every step with the fast "preview" encoding profile',
+    )
+    parser.add_argument(
+        '--stages',
+        nargs='+',
+        help='Only run these steps, missing inputs are loaded from previous runs',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Maximum number of independent steps running at the same time',
+    )
+    parser.add_argument(
+        '--force',
+        nargs='+',
+        default=[],
+        help='Run these steps even if their inputs did not change since the last run',
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Save a cProfile capture of each step to the project profiles directory',
+    )
+    parser.add_argument(
+        '--trace-memory',
+        action='store_true',
+        help='Record the allocations that grew the most during each step',
+    )
+    parser.add_argument(
+        '--manifest',
+        type=str,
+        help='Generate the trailers of every item of a YAML or CSV catalogue in this '
+        'process, the configs are used as the defaults of each item',
+    )
     args = parser.parse_args()
-    
+
     # Get the absolute path to the src directory
     src_dir = Path(__file__).parent.absolute()
     project_dir = src_dir.parent
-    
+
     # Make sure we're working in the project directory
     os.chdir(project_dir)
-    
+
     # Load project-specific configuration if provided
     if args.config:
         config_path = Path(args.config)
@@ -40,143 +78,148 @@ def main():
             logger.info(f"Loading project-specific configuration from {config_path}")
             with open(config_path, 'r') as f:
                 project_configs = yaml.safe_load(f)
-                
-            # Initialize the common module with project-specific config
-            import src.common as common
-            common.initialize_with_config(project_configs)
+
+            context = ProjectContext.from_configs(project_configs)
         else:
             logger.error(f"Config file not found: {config_path}")
             return 1
     else:
         # Use default configuration
         logger.info("No project configuration specified, using default config")
-        import src.common as common
+        context = load_project_context()
 
-    try:
-        # Check if we need to run plot_retrieval
-        from src.common import PLOT_PATH
-        
-        logger.info(f"Checking for plot file at: {PLOT_PATH}")
-
-        # If the plot file exists from the API request, skip plot_retrieval entirely
-        if PLOT_PATH.exists():
-            logger.info(
-                "Plot already provided via API request, skipping plot_retrieval step"
-            )
-            # In this case we DON'T import or run plot_retrieval at all
-        else:
-            # Only run plot_retrieval if we don't have a plot yet
-            logger.info("No plot found, attempting to retrieve plot from IMDB")
-            # Only import the module if we need it
-            try:
-                plot_module = importlib.import_module("src.plot_retrieval")
-                logger.info("Successfully imported plot_retrieval module")
-            except Exception as e:
-                logger.error("Failed to import plot_retrieval module: %s", str(e))
-                raise
-
-        # Step 2: Split the plot into subplots/scenes
-        logger.info("Step 2: Generating subplots from main plot")
-        run_module("subplot")
-
-        # Reload common to refresh scene directories created by subplot
-        try:
-            # Import and reload common module
-            import src.common as common
-            importlib.reload(common)
-            
-            # If we're using a project-specific configuration, re-initialize with it
-            if args.config:
-                logger.info("Re-initializing common with project config after subplot generation")
-                config_path = Path(args.config)
-                if config_path.exists():
-                    with open(config_path, 'r', encoding='utf-8') as f:
-                        project_configs = yaml.safe_load(f)
-                    common.initialize_with_config(project_configs)
-            
-            # Force an update of the scene directories
-            common.update_scenes_dir()
-            
-            logger.info(
-                "Updated scene directories after subplot generation. Found: %s scenes",
-                len(common.SCENES_DIR),
-            )
-            
-            # Log the actual scene directories for debugging
-            for scene_dir in common.SCENES_DIR:
-                logger.info("Found scene directory: %s", scene_dir)
-                
-        except Exception as e:
-            logger.error("Failed to reload scene directories: %s", e)
-            import traceback
-            logger.error("Traceback: %s", traceback.format_exc())
-
-        # Step 3: Generate voice-overs for the subplots
-        logger.info("Step 3: Generating voice-overs")
-        run_module("voice")
-
-        # Step 4: Generate frames from the subplots
-        logger.info("Step 4: Generating frames")
-        run_module("frame")
-
-        # Step 5: Retrieve images based on the frames
-        logger.info("Step 5: Retrieving images")
-        run_module("image_retrieval")
-
-        # Step 6: Create video clips for each frame
-        logger.info("Step 6: Creating video clips")
-        run_module("clip")
-
-        # Step 7: Add audio to the video clips
-        logger.info("Step 7: Adding audio to video clips")
-        run_module("audio_clip")
-
-        # Step 8: Join all clips to create the final trailer
-        logger.info("Step 8: Joining clips to create final trailer")
-        run_module("join_clip")
+    context = apply_cli_overrides(context, args)
+
+    if args.manifest:
+        return run_manifest(context, Path(args.manifest))
+
+    from src import instrumentation
 
+    instrumentation.configure(
+        context.project_dir / "profiles" if args.profile else None,
+        args.trace_memory,
+    )
+    return run_project(context, args.stages, args.workers, args.force)
+
+
+def run_manifest(context, manifest_path):
+    """
+    Generate the trailers of a whole catalogue, loading the models once.
+
+    Args:
+        context (ProjectContext): Context every catalogue item starts from
+        manifest_path (Path): YAML or CSV catalogue
+
+    Returns:
+        int: Exit code, 1 if any item failed
+    """
+    from src.catalogue import load_catalogue, run_catalogue, write_catalogue_report
+
+    if not manifest_path.exists():
+        logger.error(f"Catalogue not found: {manifest_path}")
+        return 1
+    items = load_catalogue(manifest_path)
+    logger.info(f"Generating the trailers of {len(items)} catalogue items")
+    results = run_catalogue(context, items)
+
+    project_root = Path(context.configs['project_dir'])
+    report_path = project_root / f"{manifest_path.stem}_report.json"
+    write_catalogue_report(report_path, results)
+    failed = [name for name, status in results.items() if status != 'completed']
+    if failed:
+        logger.error(f"{len(failed)} catalogue items failed: {failed}")
+        return 1
+    return 0
+
+
+def run_project(
+    context,
+    stage_names=None,
+    max_workers=None,
+    force=(),
+    listener=None,
+    report_name='run_report.json',
+):
+    """
+    Run the pipeline for a project and save its run report.
+
+    Args:
+        context (ProjectContext): Project context
+        stage_names (list[str], optional): Steps to run, defaults to the whole pipeline
+        max_workers (int, optional): Maximum number of steps running at the same
+            time, defaults to `pipeline.max_workers`
+        force (Iterable[str]): Steps to run even if their inputs did not change
+        listener (Callable[[dict], None], optional): Called with a progress
+            event whenever a step starts or ends
+        report_name (str): Run report file name in the project directory
+
+    Returns:
+        int: Exit code, 1 if the pipeline failed
+    """
+    from src import instrumentation
+    from src.pipeline import PIPELINE_STAGES, STAGES, run_pipeline
+
+    context.ensure_dirs()
+    stage_names = list(stage_names or PIPELINE_STAGES)
+    unknown_stages = [name for name in stage_names if name not in STAGES]
+    if unknown_stages:
+        logger.error(f"Unknown steps: {unknown_stages}, available: {list(STAGES)}")
+        return 1
+
+    logger.info(f"Checking for plot file at: {context.plot_path}")
+
+    # If the plot file exists from the API request, skip plot_retrieval entirely
+    if "plot_retrieval" in stage_names and context.plot_path.exists():
+        logger.info(
+            "Plot already provided via API request, skipping plot_retrieval step"
+        )
+        stage_names.remove("plot_retrieval")
+
+    max_workers = max_workers or context.configs["pipeline"]["max_workers"]
+
+    manifest = None
+    if context.configs["pipeline"]["incremental"]:
+        from src.manifest import ProjectManifest
+
+        manifest = ProjectManifest(context.project_dir / "manifest.json")
+
+    instrumentation.reset(listener)
+    report_path = context.project_dir / report_name
+
+    try:
+        logger.info(f"Running steps {stage_names} with {max_workers} workers")
+        run_pipeline(
+            stage_names,
+            context,
+            max_workers=max_workers,
+            manifest=manifest,
+            force=force,
+        )
+
+        instrumentation.write_run_report(report_path, "completed")
         logger.info("AI trailer generation completed successfully!")
         return 0
-    except (ImportError, ModuleNotFoundError) as e:
-        logger.error("Error during trailer generation: %s", str(e))
+    except Exception as e:
+        logger.exception("Error during trailer generation: %s", str(e))
+        instrumentation.write_run_report(report_path, "failed")
         return 1
 
 
-def run_module(module_name):
+def apply_cli_overrides(context, args):
     """
-    Run a Python module from the src directory.
+    Apply command line overrides to the project configs.
 
     Args:
-        module_name (str): Name of the module to run (without .py extension)
+        context (ProjectContext): Project context
+        args (argparse.Namespace): Parsed command line arguments
+
+    Returns:
+        ProjectContext: Project context with the overrides applied
     """
-    try:
-        # Execute the module as a script by reloading the module
-        # This is necessary for modules with code at the module level
-        logger.info("Running module: %s", module_name)
-        module_path = os.path.join(os.path.dirname(__file__), f"{module_name}.py")
-
-        if not os.path.exists(module_path):
-            raise FileNotFoundError(f"Module file not found: {module_path}")
-
-        # Use exec to run the module contents
-        with open(module_path, "r") as f:
-            module_code = f.read()
-
-        # Create a custom namespace for the module
-        module_globals = {"__file__": module_path, "__name__": f"src.{module_name}"}
-
-        # Execute the module code
-        exec(module_code, module_globals)
-        logger.info("Successfully completed module: %s", module_name)
-    except (
-        ImportError,
-        ModuleNotFoundError,
-        AttributeError,
-        SyntaxError,
-        FileNotFoundError,
-    ) as e:
-        logger.error("Error running module %s: %s", module_name, str(e))
-        raise
+    if args.preview:
+        logger.info("Preview mode enabled, using the preview encoding profile")
+        context = context.with_overrides({"encoding": {"preview": True}})
+    return context
 
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__file__)
+
+# Files larger than this are fingerprinted from their size, head and tail
+# instead of their full content, e.g. multi-GB source videos
+FULL_HASH_MAX_BYTES = 64 * 1024 * 1024
+PARTIAL_HASH_BYTES = 1024 * 1024
+
+
+def hash_file_content(path: Path) -> str:
+    """Hash a file, sampling only its head and tail if it is very large.
+
+    Args:
+        path (Path): File to hash
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        if size <= FULL_HASH_MAX_BYTES:
+            for chunk in iter(lambda: f.read(PARTIAL_HASH_BYTES), b""):
+                digest.update(chunk)
+        else:
+            digest.update(str(size).encode())
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+            f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest()
+
+
+def get_config_subtree(configs: dict, keys: Iterable[str]) -> dict:
+    """Pick the configs relevant to a step.
+
+    Args:
+        configs (dict): Project configs
+        keys (Iterable[str]): Top level keys or dotted paths, e.g. `clip.min_clip_len`
+
+    Returns:
+        dict: Value of each key, None if missing
+    """
+    subtree = {}
+    for key in keys:
+        value = configs
+        for part in key.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        subtree[key] = value
+    return subtree
+
+
+class ProjectManifest:
+    """Fingerprints of the steps completed in a project, saved as JSON.
+
+    File hashes are cached by size and modification time so unchanged inputs
+    are not read again on every run.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        data = json.loads(path.read_text()) if path.exists() else {}
+        self.stages: dict[str, dict] = data.get("stages", {})
+        self.files: dict[str, list] = data.get("files", {})
+
+    def hash_file(self, path: Path) -> str:
+        """Hash a file, reusing the cached hash if it did not change.
+
+        Args:
+            path (Path): File to hash
+
+        Returns:
+            str: Hex digest
+        """
+        stat = path.stat()
+        key = str(path)
+        with self._lock:
+            cached = self.files.get(key)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+
+        file_hash = hash_file_content(path)
+        with self._lock:
+            self.files[key] = [stat.st_size, stat.st_mtime_ns, file_hash]
+        return file_hash
+
+    def hash_paths(self, paths: Iterable[Path]) -> str:
+        """Hash files and directories, directories are hashed recursively.
+
+        Args:
+            paths (Iterable[Path]): Files and directories
+
+        Returns:
+            str: Hex digest of every file name and content, "missing" markers
+                are used for paths that do not exist
+        """
+        digest = hashlib.sha256()
+        for path in paths:
+            path = Path(path)
+            if path.is_dir():
+                # Hidden files only hold bookkeeping, e.g. work manifests
+                files = sorted(
+                    p
+                    for p in path.rglob("*")
+                    if p.is_file()
+                    and not any(
+                        part.startswith(".") for part in p.relative_to(path).parts
+                    )
+                )
+            else:
+                files = [path]
+            for file_path in files:
+                digest.update(str(file_path).encode())
+                if file_path.exists():
+                    digest.update(self.hash_file(file_path).encode())
+                else:
+                    digest.update(b"missing")
+        return digest.hexdigest()
+
+    def get_fingerprint(self, stage: str) -> Optional[str]:
+        """Fingerprint recorded the last time a step completed.
+
+        Args:
+            stage (str): Step name
+
+        Returns:
+            Optional[str]: Fingerprint, None if the step never completed
+        """
+        with self._lock:
+            return self.stages.get(stage, {}).get("fingerprint")
+
+    def record(self, stage: str, fingerprint: str) -> None:
+        """Record that a step completed with the given fingerprint.
+
+        Args:
+            stage (str): Step name
+            fingerprint (str): Fingerprint of the step inputs
+        """
+        with self._lock:
+            self.stages[stage] = {
+                "fingerprint": fingerprint,
+                "completed_at": time.time(),
+            }
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        with self._lock:
+            data = json.dumps({"stages": self.stages, "files": self.files}, indent=2)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(data)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,71 @@
+import functools
+import logging
+import threading
+from typing import Any, Callable, Hashable
+
+logger = logging.getLogger(__file__)
+
+_MODELS: dict[Hashable, "SharedModel"] = {}
+_KEY_LOCKS: dict[Hashable, threading.Lock] = {}
+_LOCK = threading.Lock()
+
+
+class SharedModel:
+    """Model shared by the threads of a process, e.g. the jobs of a worker.
+
+    Models such as Coqui TTS are not thread-safe, so the calls to the model
+    methods run one at a time. Other attributes are read as is.
+
+    Args:
+        model (Any): Loaded model
+    """
+
+    def __init__(self, model: Any):
+        self.model = model
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.model, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def locked(*args: Any, **kwargs: Any) -> Any:
+            with self.lock:
+                return attr(*args, **kwargs)
+
+        return locked
+
+
+def get_model(key: Hashable, loader: Callable[[], Any]) -> SharedModel:
+    """Get a model loaded once per process.
+
+    The model is shared by every thread asking for it, its method calls are
+    serialized by `SharedModel`. Stateful readers, e.g. a MoviePy video, are
+    opened by each step instead.
+
+    Different models can be loaded concurrently, concurrent requests for the
+    same model wait for a single load.
+
+    Args:
+        key (Hashable): Cache key, e.g. `("tts", model_id, device)`
+        loader (Callable[[], Any]): Function that loads the model on a cache miss
+
+    Returns:
+        SharedModel: The cached model
+    """
+    with _LOCK:
+        key_lock = _KEY_LOCKS.setdefault(key, threading.Lock())
+
+    with key_lock:
+        if key not in _MODELS:
+            logger.info("Loading %s", key)
+            _MODELS[key] = SharedModel(loader())
+        return _MODELS[key]
+
+
+def clear_models() -> None:
+    """Drop every cached model."""
+    with _LOCK:
+        _MODELS.clear()
+        _KEY_LOCKS.clear()
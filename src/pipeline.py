@@ -0,0 +1,444 @@
+import contextvars
+import hashlib
+import importlib
+import inspect
+import json
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+from src.common import ProjectContext
+from src.instrumentation import get_report, instrument_stage
+from src.manifest import ProjectManifest, get_config_subtree
+
+logger = logging.getLogger(__file__)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """A pipeline step and the artifacts it consumes and produces.
+
+    Attributes:
+        name (str): Step name
+        target (str): Step callable as `module:function`, imported on first use
+        inputs (tuple[str, ...]): Artifacts that must exist before the step runs
+        outputs (tuple[str, ...]): Artifacts returned by the step
+        config_keys (tuple[str, ...]): Configs the step depends on, top level keys
+            or dotted paths
+    """
+
+    name: str
+    target: str
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    config_keys: tuple[str, ...] = ()
+
+    def load(self) -> Callable[..., Optional[dict]]:
+        """Import the step callable.
+
+        Returns:
+            Callable[..., Optional[dict]]: Function returning the step outputs
+        """
+        module_name, func_name = self.target.split(":")
+        return getattr(importlib.import_module(module_name), func_name)
+
+
+STAGES = {
+    stage.name: stage
+    for stage in [
+        Stage(
+            "video_retrieval",
+            "src.video_retrieval:run",
+            (),
+            ("video",),
+            ("video_path", "video_retrieval"),
+        ),
+        Stage(
+            "video_download",
+            "src.video_store:run",
+            (),
+            ("video",),
+            ("video_path", "video_file_id"),
+        ),
+        Stage("plot_retrieval", "src.plot_retrieval:run", (), ("plot",), ()),
+        Stage("subplot", "src.subplot:run", ("plot",), ("scenes",), ("subplot",)),
+        Stage("voice", "src.voice:run", ("scenes",), ("voices",), ("voice",)),
+        Stage(
+            "frame",
+            "src.frame:run",
+            ("video",),
+            ("frames",),
+            ("frame_sampling", "proxy"),
+        ),
+        Stage(
+            "frame_embedding",
+            "src.image_retrieval:embed",
+            ("frames",),
+            ("image_embeddings",),
+            (
+                "frame_ranking.backend",
+                "frame_ranking.model_id",
+                "frame_ranking.device",
+                "frame_ranking.similarity_batch_size",
+            ),
+        ),
+        Stage(
+            "image_retrieval",
+            "src.image_retrieval:run",
+            ("scenes", "image_embeddings"),
+            ("scene_frames",),
+            ("frame_ranking",),
+        ),
+        Stage(
+            "clip",
+            "src.clip:run",
+            ("video", "scenes", "voices", "scene_frames"),
+            ("clips",),
+            ("clip", "proxy", "encoding"),
+        ),
+        Stage(
+            "audio_clip",
+            "src.audio_clip:run",
+            ("scenes", "voices", "clips"),
+            ("audio_clips",),
+            ("audio_clip", "encoding"),
+        ),
+        Stage(
+            "join_clip",
+            "src.join_clip:run",
+            ("video", "scenes", "voices", "scene_frames", "audio_clips"),
+            ("trailers",),
+            ("join_clip", "proxy", "encoding", "audio_clip", "clip.min_clip_len"),
+        ),
+    ]
+}
+
+# Steps run by default to create a trailer from a video and a plot
+PIPELINE_STAGES = [
+    "plot_retrieval",
+    "subplot",
+    "voice",
+    "frame",
+    "frame_embedding",
+    "image_retrieval",
+    "clip",
+    "audio_clip",
+    "join_clip",
+]
+
+# Per scene sub-directory holding each file based artifact
+SCENE_ARTIFACTS = {
+    "voices": "audios",
+    "scene_frames": "frames",
+    "clips": "clips",
+    "audio_clips": "audio_clips",
+}
+
+
+# Files a directory artifact must hold to be reused by a skipped step
+REQUIRED_FILES = {"trailers": "final_trailer.mp4"}
+
+
+def get_shard_scenes(context: ProjectContext) -> list[Path]:
+    """Scene directories of a project, only those of its shard if it has one.
+
+    A `pipeline.scene_shard` of `[index, count]` keeps every `count`-th scene
+    starting at `index`, so several machines can render the clips of a
+    project at the same time.
+
+    Args:
+        context (ProjectContext): Project context
+
+    Returns:
+        list[Path]: Scene directories
+    """
+    shard = context.configs["pipeline"].get("scene_shard")
+    if not shard:
+        return context.scenes_dir
+    index, count = shard
+    return context.scenes_dir[index::count]
+
+
+def load_artifact(name: str, context: ProjectContext) -> Any:
+    """Load an artifact left on disk by a previous run.
+
+    Args:
+        name (str): Artifact name
+        context (ProjectContext): Project the artifact belongs to
+
+    Returns:
+        Any: Artifact value, as the step producing it would have returned it
+    """
+    if name == "video":
+        return context.configs["video_path"]
+    if name == "plot":
+        return context.plot_path
+    if name == "frames":
+        return context.frames_dir
+    if name == "trailers":
+        return context.trailer_dir
+    if name == "image_embeddings":
+        from src.image_retrieval import load_image_embeddings
+
+        return load_image_embeddings(context.project_dir)
+    if name == "scenes":
+        return get_shard_scenes(context)
+    if name in SCENE_ARTIFACTS:
+        return [
+            scene_dir / SCENE_ARTIFACTS[name] for scene_dir in get_shard_scenes(context)
+        ]
+
+    raise ValueError(
+        f"Artifact '{name}' is not produced by any selected step "
+        "and cannot be loaded from disk"
+    )
+
+
+def get_artifact_paths(name: str, value: Any, context: ProjectContext) -> list[Path]:
+    """Files an artifact is made of, used to fingerprint it.
+
+    Args:
+        name (str): Artifact name
+        value (Any): Artifact value
+        context (ProjectContext): Project the artifact belongs to
+
+    Returns:
+        list[Path]: Files and directories holding the artifact
+    """
+    if name == "scenes":
+        # Scene directories also hold the outputs of later steps
+        return [scene_dir / "subplot.txt" for scene_dir in value]
+    if name == "image_embeddings":
+        from src.image_retrieval import get_embeddings_paths
+
+        return list(get_embeddings_paths(context.project_dir))
+    if isinstance(value, (list, tuple)):
+        return [Path(v) for v in value]
+    return [Path(value)]
+
+
+def get_fingerprint(
+    stage: Stage, context: ProjectContext, artifacts: dict, manifest: ProjectManifest
+) -> str:
+    """Fingerprint the inputs and configs of a step.
+
+    Args:
+        stage (Stage): Step to fingerprint
+        context (ProjectContext): Project the step runs for
+        artifacts (dict): Available artifacts
+        manifest (ProjectManifest): Project manifest caching file hashes
+
+    Returns:
+        str: Hex digest changing whenever an input file or relevant config changes
+    """
+    fingerprint = {
+        "stage": stage.name,
+        "configs": get_config_subtree(context.configs, stage.config_keys),
+        "inputs": {
+            name: manifest.hash_paths(
+                get_artifact_paths(name, artifacts[name], context)
+            )
+            for name in stage.inputs
+        },
+    }
+    return hashlib.sha256(
+        json.dumps(fingerprint, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def is_present(path: Path) -> bool:
+    """Check an output file, or a directory holding at least one file.
+
+    Args:
+        path (Path): Output file or directory
+
+    Returns:
+        bool: True if the output can be reused
+    """
+    if path.is_dir():
+        return any(p.is_file() for p in path.rglob("*"))
+    return path.is_file()
+
+
+def load_outputs(stage: Stage, context: ProjectContext) -> Optional[dict]:
+    """Load the outputs a step left on disk.
+
+    Project directories are created empty before the steps run, so directory
+    outputs only count if they hold files.
+
+    Args:
+        stage (Stage): Step whose outputs are loaded
+        context (ProjectContext): Project the step runs for
+
+    Returns:
+        Optional[dict]: Outputs of the step, None if any of them is missing
+    """
+    outputs = {}
+    for name in stage.outputs:
+        try:
+            outputs[name] = load_artifact(name, context)
+        except (FileNotFoundError, ValueError):
+            return None
+        paths = get_artifact_paths(name, outputs[name], context)
+        if name in REQUIRED_FILES:
+            paths = [Path(path) / REQUIRED_FILES[name] for path in paths]
+        if not all(is_present(path) for path in paths):
+            return None
+    return outputs
+
+
+def get_dependencies(stages: list[Stage]) -> dict[str, set[str]]:
+    """Find the steps each step has to wait for.
+
+    Args:
+        stages (list[Stage]): Selected steps
+
+    Returns:
+        dict[str, set[str]]: Names of the steps producing the inputs of each step
+    """
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    return {
+        stage.name: {producers[i] for i in stage.inputs if i in producers}
+        for stage in stages
+    }
+
+
+def run_stage(
+    stage: Stage,
+    context: ProjectContext,
+    artifacts: dict,
+    manifest: Optional[ProjectManifest] = None,
+    force: bool = False,
+) -> tuple[dict, Optional[str]]:
+    """Run a step with the artifacts its callable accepts.
+
+    With a manifest the step is skipped if its fingerprint matches the one
+    recorded by its last completed run and its outputs are still on disk. Time
+    and memory used by the step are added to the run report.
+
+    Steps receive the project context as `context` if their callable accepts it.
+
+    Args:
+        stage (Stage): Step to run
+        context (ProjectContext): Project the step runs for
+        artifacts (dict): Available artifacts
+        manifest (Optional[ProjectManifest]): Project manifest, None always runs
+        force (bool): Run the step even if its inputs did not change
+
+    Returns:
+        tuple[dict, Optional[str]]: Artifacts produced by the step and its fingerprint
+    """
+    with instrument_stage(stage.name) as record:
+        fingerprint = None
+        if manifest is not None:
+            fingerprint = get_fingerprint(stage, context, artifacts, manifest)
+            if not force and manifest.get_fingerprint(stage.name) == fingerprint:
+                outputs = load_outputs(stage, context)
+                if outputs is not None:
+                    logger.info(
+                        "Skipping step %s, its inputs did not change", stage.name
+                    )
+                    record["status"] = "skipped"
+                    return outputs, fingerprint
+
+        func = stage.load()
+        params = inspect.signature(func).parameters
+        kwargs = {name: artifacts[name] for name in stage.inputs if name in params}
+        if "context" in params:
+            kwargs["context"] = context
+        logger.info("Running step: %s", stage.name)
+        outputs = func(**kwargs) or {}
+        logger.info("Successfully completed step: %s", stage.name)
+        return outputs, fingerprint
+
+
+def run_pipeline(
+    stage_names: list[str],
+    context: ProjectContext,
+    artifacts: Optional[dict] = None,
+    max_workers: int = 2,
+    stages: Optional[dict[str, Stage]] = None,
+    manifest: Optional[ProjectManifest] = None,
+    force: Iterable[str] = (),
+) -> dict:
+    """Run pipeline steps in dependency order.
+
+    Steps that do not depend on each other, e.g. voice generation and frame
+    sampling, run concurrently in threads. Inputs not produced by any selected
+    step are taken from `artifacts` or loaded from disk.
+
+    With a manifest, steps whose input files and configs did not change since
+    their last completed run are skipped. Steps downstream of a step that ran
+    again only run if its outputs changed.
+
+    Args:
+        stage_names (list[str]): Steps to run
+        context (ProjectContext): Project the steps run for
+        artifacts (Optional[dict]): Artifacts already available
+        max_workers (int): Maximum number of steps running at the same time
+        stages (Optional[dict[str, Stage]]): Step registry, defaults to `STAGES`
+        manifest (Optional[ProjectManifest]): Project manifest used to skip
+            unchanged steps, None runs every step
+        force (Iterable[str]): Steps to run even if their inputs did not change
+
+    Returns:
+        dict: Every artifact available at the end of the run
+    """
+    registry = STAGES if stages is None else stages
+    selected = [registry[name] for name in stage_names]
+    artifacts = dict(artifacts or {})
+    dependencies = get_dependencies(selected)
+    force = set(force)
+
+    produced = {output for stage in selected for output in stage.outputs}
+    for stage in selected:
+        for name in stage.inputs:
+            if name not in produced and name not in artifacts:
+                artifacts[name] = load_artifact(name, context)
+
+    # Steps run in copies of the current context, start the run report first so
+    # they all add to the same one
+    get_report()
+    pending = list(selected)
+    done: set[str] = set()
+    running: dict[Future, Stage] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for stage in [s for s in pending if dependencies[s.name] <= done]:
+                pending.remove(stage)
+                future = executor.submit(
+                    contextvars.copy_context().run,
+                    run_stage,
+                    stage,
+                    context,
+                    artifacts,
+                    manifest,
+                    stage.name in force,
+                )
+                running[future] = stage
+
+            if not running:
+                raise ValueError(
+                    f"Steps {[s.name for s in pending]} have unmet dependencies"
+                )
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    outputs, fingerprint = future.result()
+                except Exception:
+                    logger.error("Step %s failed", stage.name)
+                    for other in running:
+                        other.cancel()
+                    raise
+                artifacts.update(outputs)
+                if manifest is not None and fingerprint is not None:
+                    manifest.record(stage.name, fingerprint)
+                    manifest.save()
+                done.add(stage.name)
+
+    return artifacts
@@ -1,15 +1,18 @@
 import logging
+from pathlib import Path
 
-from imdb import Cinemagoer
+from src.common import ProjectContext
 
-from src.common import PLOT_PATH, configs
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
 
 
-def get_video_plot(video_id) -> str:
+def get_video_plot(video_id, plot_path: Path) -> str:
     """Retrieve the video plot from IMDB.
 
     Args:
         video_id: Valid IMDB ID string in the format '0123456'
+        plot_path (Path): Path to save the plot
 
     Returns:
         str: Plot text from IMDB
@@ -20,6 +23,8 @@ def get_video_plot(video_id) -> str:
     if not video_id or not isinstance(video_id, str):
         raise ValueError(f"A valid IMDB ID string is required, received: {video_id}")
 
+    from imdb import Cinemagoer
+
     logger.info('Retrieving plot for IMDB ID: "%s"', video_id)
     ia = Cinemagoer()
     video = ia.get_movie(video_id)
@@ -28,32 +33,50 @@ def get_video_plot(video_id) -> str:
         raise ValueError(f"Could not retrieve plot for IMDB ID: {video_id}")
 
     plot = video["plot outline"]
-    PLOT_PATH.write_text(plot)
+    plot_path.write_text(plot)
     logger.info('Successfully retrieved plot for IMDB ID: "%s"', video_id)
 
     return plot
 
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__file__)
+def run(context: ProjectContext) -> dict:
+    """Optional plot retrieval step.
 
-logger.info("\n##### Starting optional step plot retrieval #####\n")
-
-# Ensure the parent directory exists
-PLOT_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-# Only try to retrieve a plot if we don't already have one
-if not PLOT_PATH.exists():
-    # Make sure we have a valid IMDB ID
-    video_id = configs["plot_retrieval"].get("video_id")
-    if not video_id:
-        raise ValueError("No video_id provided in configuration. Cannot retrieve plot.")
-
-    # Get the plot - this will raise an error if video_id is invalid
-    plot = get_video_plot(video_id)
-    logger.info('Retrieved plot from IMDB: "%s..."', plot[:100])
-else:
-    # If plot file already exists, read it and don't fetch from IMDB
-    logger.info("Plot file already exists at %s, using existing plot", PLOT_PATH)
-    plot = PLOT_PATH.read_text()
-    logger.info('Using existing plot: "%s..."', plot[:100])
+    Args:
+        context (ProjectContext): Project the step runs for
+
+    Returns:
+        dict: `plot` artifact with the plot file path
+    """
+    logger.info("\n##### Starting optional step plot retrieval #####\n")
+    plot_path = context.plot_path
+
+    # Ensure the parent directory exists
+    plot_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Only try to retrieve a plot if we don't already have one
+    if not plot_path.exists():
+        # Make sure we have a valid IMDB ID
+        video_id = context.configs["plot_retrieval"].get("video_id")
+        if not video_id:
+            raise ValueError(
+                "No video_id provided in configuration. Cannot retrieve plot."
+            )
+
+        # Get the plot - this will raise an error if video_id is invalid
+        plot = get_video_plot(video_id, plot_path)
+        logger.info('Retrieved plot from IMDB: "%s..."', plot[:100])
+    else:
+        # If plot file already exists, read it and don't fetch from IMDB
+        logger.info("Plot file already exists at %s, using existing plot", plot_path)
+        plot = plot_path.read_text()
+        logger.info('Using existing plot: "%s..."', plot[:100])
+
+    return {"plot": plot_path}
+
+
+if __name__ == "__main__":
+    from src.common import load_project_context
+    from src.pipeline import run_pipeline
+
+    run_pipeline(["plot_retrieval"], load_project_context())
@@ -0,0 +1,164 @@
+import logging
+import os
+from pathlib import Path
+
+from src.candidates import parse_audio_clip
+from src.ffmpeg_tools import SEGMENT_STREAM_ARGS, probe_media, run_ffmpeg
+
+logger = logging.getLogger(__file__)
+
+
+def get_proxy_path(video_path: str, project_dir: Path, height: int) -> Path:
+    """Build the path of the low resolution proxy of a video.
+
+    Args:
+        video_path (str): Path to the original video
+        project_dir (Path): Project directory hosting the proxy
+        height (int): Proxy height in pixels
+
+    Returns:
+        Path: Proxy video path
+    """
+    return project_dir / "proxy" / f"{Path(video_path).stem}_{height}p.mp4"
+
+
+def create_proxy(video_path: str, proxy_path: Path, height: int) -> None:
+    """Transcode a low resolution proxy keeping the original frame timing.
+
+    The frame rate is left untouched so frame numbers sampled from the proxy
+    point to the same moments in the original video. The proxy is encoded
+    aside and moved in place once complete, an interrupted transcode never
+    leaves a truncated proxy newer than the video.
+
+    Args:
+        video_path (str): Path to the original video
+        proxy_path (Path): Output proxy path
+        height (int): Proxy height in pixels
+    """
+    proxy_path.parent.mkdir(parents=True, exist_ok=True)
+    logger.info("Creating %sp proxy of %s at %s", height, video_path, proxy_path)
+    tmp_path = proxy_path.with_name(f"{proxy_path.stem}.tmp{proxy_path.suffix}")
+    run_ffmpeg(
+        [
+            "-i",
+            video_path,
+            "-vf",
+            f"scale=-2:{height}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "veryfast",
+            "-crf",
+            "28",
+            "-c:a",
+            "aac",
+            str(tmp_path),
+        ]
+    )
+    os.replace(tmp_path, proxy_path)
+
+
+def get_working_video_path(
+    video_path: str, proxy_configs: dict, project_dir: Path
+) -> str:
+    """Get the video the intermediate steps should read from.
+
+    With proxy mode enabled the proxy is transcoded the first time it is needed
+    and reused afterwards, as long as it is newer than the original video.
+
+    Args:
+        video_path (str): Path to the original video
+        proxy_configs (dict): Proxy configs
+        project_dir (Path): Project directory
+
+    Returns:
+        str: Proxy path if proxy mode is enabled, original video path otherwise
+    """
+    if not proxy_configs["enabled"]:
+        return video_path
+
+    height = proxy_configs["height"]
+    proxy_path = get_proxy_path(video_path, project_dir, height)
+    if (
+        not proxy_path.exists()
+        or proxy_path.stat().st_mtime < Path(video_path).stat().st_mtime
+    ):
+        create_proxy(video_path, proxy_path, height)
+    else:
+        logger.info("Reusing proxy video: %s", proxy_path)
+    return str(proxy_path)
+
+
+def conform_segment(
+    video_path: str,
+    clip_path: Path,
+    output_path: Path,
+    clip_volume: float,
+    voice_volume: float,
+    video_args: list[str],
+) -> None:
+    """Re-render a proxy audio clip from the full resolution original video.
+
+    The clip start comes from the frame number in the clip name, the same way
+    the clip step computes it, and its length from the proxy audio clip. A
+    video without an audio stream only gets the voice.
+
+    Args:
+        video_path (str): Path to the original video
+        clip_path (Path): Audio clip rendered from the proxy
+        output_path (Path): Output full resolution segment
+        clip_volume (float): Volume of the original clip used for the audio clip
+        voice_volume (float): Volume of the generated voice used for the audio clip
+        video_args (list[str]): Video encoding arguments shared by all segments
+    """
+    parsed = parse_audio_clip(clip_path)
+    if parsed is None:
+        raise ValueError(f"Cannot conform clip with unexpected name: {clip_path}")
+
+    frame, audio_name = parsed
+    audio_path = clip_path.parent.parent / "audios" / f"{audio_name}.wav"
+    video_infos = probe_media(Path(video_path))
+    clip_start = frame // video_infos["video_fps"]
+    clip_duration = probe_media(clip_path)["duration"]
+    logger.info(
+        "Conforming %s from %s at %s for %s seconds",
+        clip_path.name,
+        video_path,
+        clip_start,
+        clip_duration,
+    )
+
+    if video_infos["audio_found"]:
+        audio_filter = (
+            f"[0:a]volume={clip_volume}[clip];"
+            f"[1:a]volume={voice_volume}[voice];"
+            "[clip][voice]amix=inputs=2:duration=first:normalize=0[audio]"
+        )
+    else:
+        # Trimmed or padded with silence to the length of the video clip
+        audio_filter = (
+            f"[1:a]volume={voice_volume},atrim=0:{clip_duration},"
+            f"apad=whole_dur={clip_duration}[audio]"
+        )
+
+    run_ffmpeg(
+        [
+            "-ss",
+            str(clip_start),
+            "-t",
+            str(clip_duration),
+            "-i",
+            video_path,
+            "-i",
+            str(audio_path),
+            "-filter_complex",
+            audio_filter,
+            "-map",
+            "0:v:0",
+            "-map",
+            "[audio]",
+            *video_args,
+            *SEGMENT_STREAM_ARGS,
+            str(output_path),
+        ]
+    )
@@ -0,0 +1,188 @@
+import json
+import logging
+import math
+import wave
+from pathlib import Path
+from typing import Optional
+
+from src.candidates import parse_audio_clip
+
+logger = logging.getLogger(__file__)
+
+
+def get_audio_duration(audio_path: Path) -> float:
+    """Read the duration of a WAV file without decoding it.
+
+    Args:
+        audio_path (Path): Path to the WAV file
+
+    Returns:
+        float: Duration in seconds
+    """
+    with wave.open(str(audio_path), "rb") as audio:
+        return audio.getnframes() / audio.getframerate()
+
+
+def cosine_similarity(a: list[float], b: list[float]) -> float:
+    """Cosine similarity between two embeddings.
+
+    Args:
+        a (list[float]): First embedding
+        b (list[float]): Second embedding
+
+    Returns:
+        float: Similarity in `[-1, 1]`, 0 if any of them is a zero vector
+    """
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    if not norm:
+        return 0.0
+    return sum(x * y for x, y in zip(a, b)) / norm
+
+
+def load_scene_segments(scene_clips: list[Path], min_clip_len: int) -> list[dict]:
+    """Gather the data needed to score each audio clip of a scene.
+
+    Args:
+        scene_clips (list[Path]): Audio clips of the scene
+        min_clip_len (int): Minimum clip length used by the clip step
+
+    Returns:
+        list[dict]: Similarity, duration fit and embedding of each clip
+    """
+    segments = []
+    retrieval_cache: dict[Path, dict] = {}
+
+    for clip_path in scene_clips:
+        scene_dir = clip_path.parent.parent
+        if scene_dir not in retrieval_cache:
+            retrieval_path = scene_dir / "frames" / "retrieval.json"
+            retrieval_cache[scene_dir] = {}
+            if retrieval_path.exists():
+                retrieval_cache[scene_dir] = {
+                    hit["frame"]: hit for hit in json.loads(retrieval_path.read_text())
+                }
+            else:
+                logger.warning("No retrieval data found at %s", retrieval_path)
+
+        segment = {
+            "path": clip_path,
+            "similarity": 0.0,
+            "duration_fit": 0.0,
+            "embedding": None,
+        }
+
+        parsed = parse_audio_clip(clip_path)
+        if parsed is None:
+            logger.warning("Could not parse audio clip name: %s", clip_path.name)
+            segments.append(segment)
+            continue
+
+        frame, audio_name = parsed
+        hit = retrieval_cache[scene_dir].get(f"frame_{frame}.jpg")
+        if hit is not None:
+            segment["similarity"] = hit["score"]
+            segment["embedding"] = hit["embedding"]
+
+        audio_path = scene_dir / "audios" / f"{audio_name}.wav"
+        if audio_path.exists():
+            # Same clip length the clip step uses for this audio
+            audio_duration = get_audio_duration(audio_path)
+            clip_len = max(min_clip_len, math.ceil(audio_duration))
+            segment["duration_fit"] = audio_duration / clip_len
+
+        segments.append(segment)
+
+    return segments
+
+
+def rank_candidates(
+    scene_segments: list[list[dict]],
+    top_n: int,
+    beam_width: int,
+    similarity_weight: float,
+    duration_weight: float,
+    diversity_weight: float,
+) -> list[dict]:
+    """Beam search over the candidate space for the best scoring trailers.
+
+    A candidate scores the weighted text-frame similarity and voice/clip duration
+    fit of its clips, plus the visual diversity between adjacent scenes.
+
+    Args:
+        scene_segments (list[list[dict]]): Scored segments available for each scene
+        top_n (int): Number of candidates to return
+        beam_width (int): Number of partial candidates kept after each scene
+        similarity_weight (float): Weight of the text-frame similarity
+        duration_weight (float): Weight of the voice/clip duration fit
+        diversity_weight (float): Weight of the diversity between adjacent scenes
+
+    Returns:
+        list[dict]: Best candidates with their scores, highest first
+    """
+    beam_width = max(beam_width, top_n)
+    beams: list[dict] = [
+        {
+            "score": 0.0,
+            "similarity": 0.0,
+            "duration_fit": 0.0,
+            "diversity": 0.0,
+            "segments": [],
+        }
+    ]
+
+    for segments in scene_segments:
+        expanded = []
+        for beam in beams:
+            previous: Optional[dict] = (
+                beam["segments"][-1] if beam["segments"] else None
+            )
+            for segment in segments:
+                diversity = 0.0
+                if (
+                    previous is not None
+                    and previous["embedding"]
+                    and segment["embedding"]
+                ):
+                    diversity = 1 - cosine_similarity(
+                        previous["embedding"], segment["embedding"]
+                    )
+                expanded.append(
+                    {
+                        "score": beam["score"]
+                        + similarity_weight * segment["similarity"]
+                        + duration_weight * segment["duration_fit"]
+                        + diversity_weight * diversity,
+                        "similarity": beam["similarity"] + segment["similarity"],
+                        "duration_fit": beam["duration_fit"] + segment["duration_fit"],
+                        "diversity": beam["diversity"] + diversity,
+                        "segments": beam["segments"] + [segment],
+                    }
+                )
+        beams = sorted(expanded, key=lambda b: b["score"], reverse=True)[:beam_width]
+
+    return beams[:top_n]
+
+
+def write_report(
+    ranked: list[dict], trailer_paths: list[Path], report_path: Path
+) -> None:
+    """Save the scores of the rendered candidates as JSON.
+
+    Args:
+        ranked (list[dict]): Candidates returned by `rank_candidates`
+        trailer_paths (list[Path]): Trailer rendered for each candidate
+        report_path (Path): Output JSON path
+    """
+    report = [
+        {
+            "trailer": trailer_path.name,
+            "score": candidate["score"],
+            "similarity": candidate["similarity"],
+            "duration_fit": candidate["duration_fit"],
+            "diversity": candidate["diversity"],
+            "clips": [str(segment["path"]) for segment in candidate["segments"]],
+        }
+        for candidate, trailer_path in zip(ranked, trailer_paths)
+    ]
+    report_path.write_text(json.dumps(report, indent=2))
+    logger.info("Saved candidate scores to %s", report_path)
@@ -0,0 +1,177 @@
+import functools
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Iterator, Mapping, Optional
+
+from src.manifest import hash_file_content
+
+# Bytes read from the file for each chunk of a response body
+STREAM_CHUNK_BYTES = 1024 * 1024
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+@functools.lru_cache(maxsize=256)
+def get_content_hash(path: str, size: int, mtime_ns: int) -> str:
+    """Hash a file once per version, keyed like the project manifest file cache.
+
+    Args:
+        path (str): File to hash
+        size (int): File size, part of the cache key
+        mtime_ns (int): File modification time, part of the cache key
+
+    Returns:
+        str: Hex digest
+    """
+    return hash_file_content(Path(path))
+
+
+def get_validators(path: Path) -> dict:
+    """HTTP validators of a file.
+
+    Args:
+        path (Path): Served file
+
+    Returns:
+        dict: `ETag` and `Last-Modified` headers
+    """
+    stat = path.stat()
+    content_hash = get_content_hash(str(path), stat.st_size, stat.st_mtime_ns)
+    return {
+        "ETag": f'"{content_hash[:32]}"',
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+    }
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """Parse a single range `Range` header.
+
+    Args:
+        header (str): Header value, e.g. `bytes=0-1023`, `bytes=1024-` or
+            `bytes=-1024` for the last 1024 bytes
+        size (int): File size in bytes
+
+    Returns:
+        Optional[tuple[int, int]]: First and last byte, both included. None if
+            the header is malformed or asks for several ranges, the whole file
+            is then served
+
+    Raises:
+        ValueError: If the range starts past the end of the file
+    """
+    match = RANGE_PATTERN.fullmatch(header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range, the last bytes of the file
+        length = int(last)
+        if length == 0:
+            raise ValueError(f"Range {header} is empty")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range {header} is not satisfiable for {size} bytes")
+    return start, end
+
+
+def is_not_modified(request_headers: Mapping[str, str], validators: dict) -> bool:
+    """Check the conditional headers of a GET request.
+
+    Args:
+        request_headers (Mapping[str, str]): Request headers, lower case names
+        validators (dict): `ETag` and `Last-Modified` of the file
+
+    Returns:
+        bool: True if the client copy is current and a 304 can be returned
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as required for If-None-Match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or validators["ETag"] in tags
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(validators["Last-Modified"]) <= since
+    return False
+
+
+def is_range_current(request_headers: Mapping[str, str], validators: dict) -> bool:
+    """Check the `If-Range` header, a range of a changed file is not served.
+
+    Args:
+        request_headers (Mapping[str, str]): Request headers, lower case names
+        validators (dict): `ETag` and `Last-Modified` of the file
+
+    Returns:
+        bool: True if the `Range` header applies
+    """
+    if_range = request_headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == validators["ETag"]
+    return if_range == validators["Last-Modified"]
+
+
+def prepare_file_response(path: Path, request_headers: Mapping[str, str]) -> dict:
+    """Pick the status, headers and byte range of a file download.
+
+    Args:
+        path (Path): Served file
+        request_headers (Mapping[str, str]): Request headers, lower case names
+
+    Returns:
+        dict: Response `status`, `headers` and `start` and `end` bytes of the
+            body, both included, None for responses without a body
+    """
+    size = path.stat().st_size
+    validators = get_validators(path)
+    headers = {**validators, "Accept-Ranges": "bytes"}
+
+    if is_not_modified(request_headers, validators):
+        return {"status": 304, "headers": headers, "start": None, "end": None}
+
+    byte_range = None
+    range_header = request_headers.get("range")
+    if range_header and is_range_current(request_headers, validators):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return {"status": 416, "headers": headers, "start": None, "end": None}
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return {"status": 200, "headers": headers, "start": 0, "end": size - 1}
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return {"status": 206, "headers": headers, "start": start, "end": end}
+
+
+def iter_file_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """Read a byte range of a file in chunks.
+
+    Args:
+        path (Path): File to read
+        start (int): First byte
+        end (int): Last byte, included
+
+    Yields:
+        bytes: Chunks of at most `STREAM_CHUNK_BYTES`
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(STREAM_CHUNK_BYTES, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
@@ -1,22 +1,26 @@
 import logging
 import shutil
+from pathlib import Path
 
-from src.common import PLOT_PATH, PROJECT_DIR, configs
+from src.common import ProjectContext
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
 
-def get_sub_plots(plot: str, split_char: str) -> None:
-    """Split the plot into subplots (scenes).
+
+def split_plot(plot: str, split_char: str) -> list[str]:
+    """Split the plot text into subplots, one per scene.
 
     Args:
         plot (str): Plot text
         split_char (str): Character used to split the main plot
+
+    Returns:
+        list[str]: Subplots
     """
-    logger.info(f"Generating subplots using split character: '{split_char}'")
-    logger.info(f"Original plot: '{plot}'")
-    
     # First handle the plot by lines
     subplots = [line.strip() for line in plot.splitlines() if line.strip()]
-    
+
     # If we have a split character, further split each line by that character
     if split_char:
         split_subplots = []
@@ -27,17 +31,37 @@ def get_sub_plots(plot: str, split_char: str) -> None:
             parts = [f"{part}{split_char}" for part in parts]
             split_subplots.extend(parts)
         subplots = split_subplots
-    
+
     # Handle case where we end up with no subplots
     if not subplots:
-        logger.warning("No subplots were generated after splitting. Using full plot as one scene.")
+        logger.warning(
+            "No subplots were generated after splitting. Using full plot as one scene."
+        )
         subplots = [plot]
-    
+    return subplots
+
+
+def get_sub_plots(plot: str, split_char: str, project_dir: Path) -> list[Path]:
+    """Split the plot into subplots (scenes).
+
+    Args:
+        plot (str): Plot text
+        split_char (str): Character used to split the main plot
+        project_dir (Path): Directory where the scene directories are created
+
+    Returns:
+        list[Path]: Created scene directories
+    """
+    logger.info(f"Generating subplots using split character: '{split_char}'")
+    logger.info(f"Original plot: '{plot}'")
+
+    subplots = split_plot(plot, split_char)
     logger.info(f"Created {len(subplots)} subplots: {subplots}")
 
     # Create scene directories with subplot files
+    scenes_dir = []
     for idx, subplot in enumerate(subplots):
-        scene_dir = PROJECT_DIR / f"scene_{idx+1}"
+        scene_dir = project_dir / f"scene_{idx+1}"
         scene_plot_path = scene_dir / "subplot.txt"
 
         # Clean up any existing directory
@@ -46,36 +70,52 @@ def get_sub_plots(plot: str, split_char: str) -> None:
 
         scene_dir.mkdir(parents=True, exist_ok=True)
         logger.info(f"Created scene directory: {scene_dir}")
-        
+
         # Write the subplot text
         scene_plot_path.write_text(subplot)
         logger.info(f"Saved subplot to {scene_plot_path}: '{subplot}'")
+        scenes_dir.append(scene_dir)
 
+    return scenes_dir
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__file__)
 
-logger.info("\n##### Starting step 1 subplot generation #####\n")
-
-# Log information about the current project
-logger.info(f"Using project directory: {PROJECT_DIR}")
-logger.info(f"Reading plot from: {PLOT_PATH}")
-
-# Read the plot file
-try:
-    plot = PLOT_PATH.read_text()
-    logger.info(f"Successfully read plot with length: {len(plot)}")
-    
-    # Process the subplots
-    get_sub_plots(plot, configs["subplot"]["split_char"])
-    
-    # Update the scene directories in common module
-    from src.common import update_scenes_dir
-    update_scenes_dir()
-    logger.info("Updated scene directories in common module")
-    
-except Exception as e:
-    logger.error(f"Error in subplot generation: {e}")
-    import traceback
-    logger.error(traceback.format_exc())
-    raise
+def run(context: ProjectContext, plot: Path) -> dict:
+    """Subplot generation step.
+
+    Args:
+        context (ProjectContext): Project the step runs for
+        plot (Path): Path to the plot file
+
+    Returns:
+        dict: `scenes` artifact with the scene directories
+    """
+    logger.info("\n##### Starting step 1 subplot generation #####\n")
+
+    # Log information about the current project
+    logger.info(f"Using project directory: {context.project_dir}")
+    logger.info(f"Reading plot from: {plot}")
+
+    # Read the plot file
+    try:
+        plot_text = plot.read_text()
+        logger.info(f"Successfully read plot with length: {len(plot_text)}")
+
+        # Process the subplots
+        scenes_dir = get_sub_plots(
+            plot_text, context.configs["subplot"]["split_char"], context.project_dir
+        )
+    except Exception as e:
+        logger.error(f"Error in subplot generation: {e}")
+        import traceback
+
+        logger.error(traceback.format_exc())
+        raise
+
+    return {"scenes": scenes_dir}
+
+
+if __name__ == "__main__":
+    from src.common import load_project_context
+    from src.pipeline import run_pipeline
+
+    run_pipeline(["subplot"], load_project_context())
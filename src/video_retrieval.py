@@ -1,12 +1,15 @@
 import logging
 from pathlib import Path
 
-from pytube import YouTube
+from src.common import ProjectContext
 
-from src.common import PROJECT_DIR, configs
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
 
 
 def get_video(video_url: str, video_path: Path) -> None:
+    from pytube import YouTube
+
     logger.info(f'Downloading video from URL: "{video_url}"')
 
     youtubeObject = YouTube(video_url)
@@ -19,17 +22,31 @@ def get_video(video_url: str, video_path: Path) -> None:
     logger.info(f'Video saved to: "{video_path}"')
 
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__file__)
+def run(context: ProjectContext) -> dict:
+    """Optional video retrieval step.
+
+    Args:
+        context (ProjectContext): Project the step runs for
+
+    Returns:
+        dict: `video` artifact with the downloaded video path
+    """
+    logger.info("\n##### Starting optional step video retrieval #####\n")
+
+    video_path = Path(context.configs["video_path"])
+
+    if not video_path.exists():
+        video_path.parent.mkdir(parents=True, exist_ok=True)
 
-logger.info("\n##### Starting optional step video retrieval #####\n")
+    if not context.project_dir.exists():
+        context.project_dir.mkdir(parents=True, exist_ok=True)
 
-video_path = Path(configs["video_path"])
+    get_video(context.configs["video_retrieval"]["video_url"], video_path)
+    return {"video": str(video_path)}
 
-if not video_path.exists():
-    video_path.parent.mkdir(parents=True, exist_ok=True)
 
-if not PROJECT_DIR.exists():
-    PROJECT_DIR.mkdir(parents=True, exist_ok=True)
+if __name__ == "__main__":
+    from src.common import load_project_context
+    from src.pipeline import run_pipeline
 
-get_video(configs["video_retrieval"]["video_url"], video_path)
+    run_pipeline(["video_retrieval"], load_project_context())
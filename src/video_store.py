@@ -0,0 +1,523 @@
+import base64
+import fcntl
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Protocol
+
+from src.common import ProjectContext
+from src.download import DEFAULT_CHUNK_BYTES, download_ranges, hash_md5
+
+logger = logging.getLogger(__file__)
+
+INDEX_NAME = "index.json"
+# Lock file held by the process updating the index or downloading a video
+LOCK_SUFFIX = ".lock"
+TMP_DIR_NAME = ".tmp"
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+# Base64 encoded service account JSON used to read the Drive videos
+SERVICE_ACCOUNT_ENV = "GOOGLE_SERVICE_ACCOUNT_JSON"
+
+
+class VideoSource(Protocol):
+    """Remote storage the input videos are downloaded from, e.g. Google Drive."""
+
+    def get_metadata(self, file_id: str) -> dict:
+        """Describe a file without downloading it.
+
+        Args:
+            file_id (str): File ID
+
+        Returns:
+            dict: File `md5` (None if unknown) and `size` in bytes
+        """
+
+    def get_video_info(self, file_id: str) -> dict:
+        """Describe the video stream of a file without downloading it.
+
+        Args:
+            file_id (str): File ID
+
+        Returns:
+            dict: Video `duration` in seconds, `width` and `height`, None if unknown
+        """
+
+    def download(self, file_id: str, path: Path) -> None:
+        """Download a file.
+
+        Args:
+            file_id (str): File ID
+            path (Path): Output file
+        """
+
+
+class DriveSource:
+    """Google Drive files, downloaded with concurrent range requests.
+
+    Args:
+        service: Google Drive v3 client
+        credentials: Credentials of the client, used for the media requests
+        max_workers (int): Number of chunks downloaded at the same time
+        chunk_bytes (int): Chunk size in bytes
+    """
+
+    def __init__(
+        self,
+        service,
+        credentials,
+        max_workers: int = 4,
+        chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    ):
+        self.service = service
+        self.credentials = credentials
+        self.max_workers = max_workers
+        self.chunk_bytes = chunk_bytes
+        self.lock = threading.Lock()
+
+    def get_metadata(self, file_id: str) -> dict:
+        """Describe a Drive file without downloading it.
+
+        Args:
+            file_id (str): Google Drive file ID
+
+        Returns:
+            dict: File `md5` and `size` in bytes
+        """
+        metadata = (
+            self.service.files()
+            .get(fileId=file_id, fields="md5Checksum,size")
+            .execute()
+        )
+        return {"md5": metadata.get("md5Checksum"), "size": int(metadata["size"])}
+
+    def get_video_info(self, file_id: str) -> dict:
+        """Describe the video stream of a Drive file without downloading it.
+
+        Args:
+            file_id (str): Google Drive file ID
+
+        Returns:
+            dict: Video `duration` in seconds, `width` and `height`, None until
+                Drive has processed the video
+        """
+        metadata = (
+            self.service.files()
+            .get(fileId=file_id, fields="videoMediaMetadata")
+            .execute()
+            .get("videoMediaMetadata", {})
+        )
+        duration_ms = metadata.get("durationMillis")
+        return {
+            "duration": int(duration_ms) / 1000 if duration_ms else None,
+            "width": metadata.get("width"),
+            "height": metadata.get("height"),
+        }
+
+    def get_headers(self) -> dict:
+        """Authorization header, with the token refreshed once it expired.
+
+        Returns:
+            dict: Request headers
+        """
+        from google.auth.transport.requests import Request
+
+        # Chunk threads share the credentials, a single one refreshes them
+        with self.lock:
+            if not self.credentials.valid:
+                self.credentials.refresh(Request())
+            return {"Authorization": f"Bearer {self.credentials.token}"}
+
+    def download(self, file_id: str, path: Path) -> None:
+        """Download a Drive file, resuming a previous interrupted download.
+
+        Args:
+            file_id (str): Google Drive file ID
+            path (Path): Output file
+        """
+        metadata = self.get_metadata(file_id)
+        logger.info("Downloading Google Drive file %s", file_id)
+        download_ranges(
+            f"{DRIVE_FILES_URL}/{file_id}?alt=media",
+            path,
+            metadata["size"],
+            metadata["md5"],
+            get_headers=self.get_headers,
+            max_workers=self.max_workers,
+            chunk_bytes=self.chunk_bytes,
+        )
+
+
+class LocalSource:
+    """Files of a local directory named by their ID, a stand-in for Drive."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def get_metadata(self, file_id: str) -> dict:
+        """Describe a local file.
+
+        Args:
+            file_id (str): File name in the directory
+
+        Returns:
+            dict: File `md5` and `size` in bytes
+        """
+        path = self.root / file_id
+        return {"md5": hash_md5(path), "size": path.stat().st_size}
+
+    def get_video_info(self, file_id: str) -> dict:
+        """Describe the video stream of a local file.
+
+        Args:
+            file_id (str): File name in the directory
+
+        Returns:
+            dict: Video `duration` in seconds, `width` and `height`
+        """
+        from src.ffmpeg_tools import probe_media
+
+        infos = probe_media(self.root / file_id)
+        width, height = infos.get("video_size") or (None, None)
+        return {"duration": infos.get("duration"), "width": width, "height": height}
+
+    def download(self, file_id: str, path: Path) -> None:
+        """Copy a local file.
+
+        Args:
+            file_id (str): File name in the directory
+            path (Path): Output file
+        """
+        shutil.copyfile(self.root / file_id, path)
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock shared by the processes using a file.
+
+    Args:
+        path (Path): Lock file, created if missing
+    """
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class VideoStore:
+    """Input videos shared by every project, keyed by file ID and checksum.
+
+    A video is downloaded once, verified against the checksum and size
+    reported by its source, then hard-linked into each project using it. The
+    least recently used videos are evicted once the store is over its quota,
+    projects keep their own link so evicting never breaks a project.
+
+    The store can be shared by several processes, e.g. the API, the worker and
+    the lease queue nodes: the index is read again and updated under a file
+    lock, and a video is downloaded by a single process at a time.
+    """
+
+    def __init__(self, root: Path, quota_bytes: Optional[int] = None):
+        self.root = Path(root)
+        self.quota_bytes = quota_bytes
+        self.index_path = self.root / INDEX_NAME
+        self.tmp_dir = self.root / TMP_DIR_NAME
+        self.lock = threading.Lock()
+        self.key_locks: dict[str, threading.Lock] = {}
+
+        # Downloads interrupted by a crash are kept in the temporary directory
+        # and resumed by the next request for the same video
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.entries: dict[str, dict] = {}
+        with self.update_index():
+            pass
+
+    @staticmethod
+    def get_key(file_id: str, metadata: dict) -> str:
+        """Store key of a version of a file.
+
+        Args:
+            file_id (str): File ID
+            metadata (dict): File `md5` and `size`
+
+        Returns:
+            str: Key, a new version of the file gets a new key
+        """
+        digest = hashlib.sha256(
+            f"{file_id}:{metadata['md5']}:{metadata['size']}".encode()
+        )
+        return digest.hexdigest()[:32]
+
+    @contextmanager
+    def update_index(self) -> Iterator[dict[str, dict]]:
+        """Read the index, let the caller change it, then write it atomically.
+
+        Other processes may have changed the index since it was last read, it
+        is read again under the index file lock, held until it is written.
+
+        Yields:
+            Iterator[dict[str, dict]]: Index entries by key
+        """
+        with self.lock, file_lock(self.index_path.with_suffix(LOCK_SUFFIX)):
+            entries = {}
+            if self.index_path.exists():
+                entries = json.loads(self.index_path.read_text())
+            # Drop entries whose file was removed by hand or by another process
+            self.entries = {
+                key: entry
+                for key, entry in entries.items()
+                if (self.root / entry["filename"]).exists()
+            }
+            yield self.entries
+            tmp_path = self.index_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self.entries, indent=2))
+            os.replace(tmp_path, self.index_path)
+
+    def get(self, file_id: str, source: VideoSource) -> Path:
+        """Get a video, downloading it only if the store does not have it yet.
+
+        Args:
+            file_id (str): File ID
+            source (VideoSource): Source the video is downloaded from
+
+        Returns:
+            Path: Video file in the store, link it instead of changing it
+        """
+        metadata = source.get_metadata(file_id)
+        key = self.get_key(file_id, metadata)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        # Concurrent requests for the same video, from this process or
+        # another one, wait for a single download
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        with key_lock, file_lock(self.tmp_dir / f"{key}{LOCK_SUFFIX}"):
+            with self.update_index() as entries:
+                entry = entries.get(key)
+                if entry is not None and self.is_intact(entry):
+                    entry["last_used"] = time.time()
+                    logger.info("Video %s found in the store", file_id)
+                    return self.root / entry["filename"]
+
+            path = self.download(file_id, source, metadata, key)
+            with self.update_index() as entries:
+                entries[key] = {
+                    "file_id": file_id,
+                    "filename": path.name,
+                    "md5": metadata["md5"],
+                    "size": path.stat().st_size,
+                    "last_used": time.time(),
+                }
+                self.evict(keep=key)
+            return path
+
+    def is_intact(self, entry: dict) -> bool:
+        """Check a stored video was not removed or truncated since it was verified.
+
+        Args:
+            entry (dict): Index entry of the video
+
+        Returns:
+            bool: True if the video file has its verified size
+        """
+        path = self.root / entry["filename"]
+        return path.exists() and path.stat().st_size == entry["size"]
+
+    def download(
+        self, file_id: str, source: VideoSource, metadata: dict, key: str
+    ) -> Path:
+        """Download a video into the store and verify it.
+
+        Args:
+            file_id (str): File ID
+            source (VideoSource): Source the video is downloaded from
+            metadata (dict): Expected `md5` and `size`
+            key (str): Store key of the video
+
+        Returns:
+            Path: Video file in the store
+        """
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.tmp_dir / key
+        try:
+            # Partial downloads are kept so that the next attempt resumes them
+            source.download(file_id, tmp_path)
+            size = tmp_path.stat().st_size
+            if size != metadata["size"]:
+                raise ValueError(
+                    f"Downloaded {size} bytes of {file_id}, expected {metadata['size']}"
+                )
+            if metadata["md5"] is not None and hash_md5(tmp_path) != metadata["md5"]:
+                raise ValueError(f"Checksum mismatch for the download of {file_id}")
+        except ValueError:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        path = self.root / f"{key}.mp4"
+        os.replace(tmp_path, path)
+        logger.info("Saved video %s to the store as %s", file_id, path)
+        return path
+
+    def evict(self, keep: str) -> None:
+        """Remove the least recently used videos until the store fits its quota,
+        while the index is updated.
+
+        Args:
+            keep (str): Key of a video never evicted, e.g. the one just added
+        """
+        if self.quota_bytes is None:
+            return
+        total = sum(entry["size"] for entry in self.entries.values())
+        for key, entry in sorted(
+            self.entries.items(), key=lambda item: item[1]["last_used"]
+        ):
+            if total <= self.quota_bytes:
+                break
+            if key == keep:
+                continue
+            logger.info("Evicting video %s from the store", entry["file_id"])
+            (self.root / entry["filename"]).unlink(missing_ok=True)
+            del self.entries[key]
+            total -= entry["size"]
+
+    def link(self, file_id: str, source: VideoSource, dest: Path) -> Path:
+        """Make a video available at a project path.
+
+        The video is hard-linked from the store, or copied if the store is on
+        another file system.
+
+        Args:
+            file_id (str): File ID
+            source (VideoSource): Source the video is downloaded from
+            dest (Path): Project video file
+
+        Returns:
+            Path: Project video file
+        """
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.unlink(missing_ok=True)
+        path = self.get(file_id, source)
+        try:
+            os.link(path, dest)
+        except FileNotFoundError:
+            # Evicted by another request in between, fetched again
+            os.link(self.get(file_id, source), dest)
+        except OSError:
+            logger.info("Could not hard-link %s, copying it instead", path)
+            shutil.copyfile(path, dest)
+        return dest
+
+
+@functools.lru_cache(maxsize=None)
+def get_drive_credentials():
+    """Load the service account credentials from the environment.
+
+    Returns:
+        Credentials: Read-only Google Drive credentials
+    """
+    from google.oauth2 import service_account
+
+    if not os.environ.get(SERVICE_ACCOUNT_ENV):
+        raise RuntimeError("No service account env var provided.")
+    service_account_info = json.loads(
+        base64.b64decode(os.environ[SERVICE_ACCOUNT_ENV]).decode("utf-8")
+    )
+    return service_account.Credentials.from_service_account_info(
+        service_account_info, scopes=DRIVE_SCOPES
+    )
+
+
+def get_drive_service():
+    """Build a Google Drive client from the service account in the environment.
+
+    Returns:
+        Resource: Google Drive v3 client
+    """
+    from googleapiclient.discovery import build
+
+    return build("drive", "v3", credentials=get_drive_credentials())
+
+
+@functools.lru_cache(maxsize=None)
+def open_video_store(root: str, quota_bytes: Optional[int]) -> VideoStore:
+    """Open a store once per process, so its requests share the same locks.
+
+    Args:
+        root (str): Store directory
+        quota_bytes (Optional[int]): Store quota in bytes, None for no limit
+
+    Returns:
+        VideoStore: Video store
+    """
+    return VideoStore(Path(root), quota_bytes)
+
+
+def get_video_store(configs: dict) -> VideoStore:
+    """Video store described by the configs.
+
+    Args:
+        configs (dict): Configs with a `video_store` section
+
+    Returns:
+        VideoStore: Store sharing the input videos between projects
+    """
+    store_configs = configs["video_store"]
+    quota_gb = store_configs["quota_gb"]
+    return open_video_store(
+        store_configs["dir"], int(quota_gb * 1024**3) if quota_gb else None
+    )
+
+
+def get_video_source(configs: dict) -> VideoSource:
+    """Source the input videos are downloaded from.
+
+    Args:
+        configs (dict): Configs with a `video_store` section
+
+    Returns:
+        VideoSource: Google Drive, or a local directory stand-in for testing
+    """
+    store_configs = configs["video_store"]
+    if store_configs["source"] == "local":
+        return LocalSource(Path(store_configs["local_dir"]))
+    return DriveSource(
+        get_drive_service(),
+        get_drive_credentials(),
+        store_configs["download_workers"],
+        store_configs["download_chunk_mb"] * 1024**2,
+    )
+
+
+def run(context: ProjectContext) -> dict:
+    """Download the project video, or link it if the store already has it.
+
+    Args:
+        context (ProjectContext): Project context, with the `video_file_id` to
+            download to `video_path`
+
+    Returns:
+        dict: Project video
+    """
+    video_path = Path(context.configs["video_path"])
+    if not video_path.exists():
+        configs = context.configs
+        get_video_store(configs).link(
+            configs["video_file_id"], get_video_source(configs), video_path
+        )
+    return {"video": str(video_path)}
+
+
+if __name__ == "__main__":
+    from src.common import load_project_context
+    from src.pipeline import run_pipeline
+
+    run_pipeline(["video_download"], load_project_context())
@@ -1,28 +1,26 @@
 import logging
 import shutil
-
-import torch.serialization
-from TTS.api import TTS
-from TTS.config.shared_configs import BaseDatasetConfig
-from TTS.tts.configs.xtts_config import XttsConfig
-from TTS.tts.models.xtts import XttsArgs, XttsAudioConfig
-
-from src.common import SCENES_DIR, configs
 from pathlib import Path
 
-# Register safe globals for PyTorch serialization
-torch.serialization.add_safe_globals(
-    [XttsConfig, XttsAudioConfig, BaseDatasetConfig, XttsArgs]
-)
+from src.backends import SpeechSynthesizer, load_backend
+from src.common import ProjectContext
+from src.instrumentation import report_progress, track
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
 
 
 def generate_voice(
-    model: TTS, text: str, audio_path: str, reference_voice_path: str, language: str
+    model: SpeechSynthesizer,
+    text: str,
+    audio_path: str,
+    reference_voice_path: str,
+    language: str,
 ) -> None:
     """_summary_
 
     Args:
-        model (TTS): TTS model used to generate the audios
+        model (SpeechSynthesizer): TTS model used to generate the audios
         text (str): Text that will be voiced
         audio_path (str): Output path to save the generated audio
         reference_voice_path (str): Reference audio file used for voice cloning
@@ -59,44 +57,79 @@ def generate_voice(
 
 
 def generate_voices(
-    model: TTS, n_audios: int, reference_voice_path: str, language: str
+    model: SpeechSynthesizer,
+    scenes_dir: list[Path],
+    n_audios: int,
+    reference_voice_path: str,
+    language: str,
 ) -> None:
     """Generate voice for each subplot.
 
     Args:
-        model (TTS): TTS model used to generate the audios
+        model (SpeechSynthesizer): TTS model used to generate the audios
+        scenes_dir (list[Path]): Scene directories
         n_audios (int): Number of audio samples created for each text
         reference_voice_path (str): Reference audio file used for voice cloning
         language (str): Language used for the TTS model
     """
-    for idx, scene_dir in enumerate(SCENES_DIR):
+    for scene_idx, scene_dir in enumerate(scenes_dir):
         scene_plot = (scene_dir / "subplot.txt").read_text()
         audio_dir = scene_dir / "audios"
-        logger.info('Generating audio for scene %s with plot "%s"', idx + 1, scene_plot)
+        logger.info(
+            'Generating audio for scene %s with plot "%s"', scene_idx + 1, scene_plot
+        )
 
         if audio_dir.exists():
             shutil.rmtree(audio_dir)
 
         audio_dir.mkdir(parents=True, exist_ok=True)
 
-        for idx in range(n_audios):
-            logger.info("Generating audio %s", idx + 1)
-            voice_path = audio_dir / f"audio_{idx+1}.wav"
-            generate_voice(
-                model, scene_plot, str(voice_path), reference_voice_path, language
+        for audio_idx in range(n_audios):
+            logger.info("Generating audio %s", audio_idx + 1)
+            voice_path = audio_dir / f"audio_{audio_idx+1}.wav"
+            with track("voice", "tts"):
+                generate_voice(
+                    model, scene_plot, str(voice_path), reference_voice_path, language
+                )
+            report_progress(
+                "voice",
+                scene_idx * n_audios + audio_idx + 1,
+                len(scenes_dir) * n_audios,
             )
 
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__file__)
+def run(context: ProjectContext, scenes: list[Path]) -> dict:
+    """Voice generation step.
+
+    Args:
+        context (ProjectContext): Project the step runs for
+        scenes (list[Path]): Scene directories
+
+    Returns:
+        dict: `voices` artifact with the audio directory of each scene
+    """
+    logger.info("\n##### Starting step 2 voice generation #####\n")
+    configs = context.configs
+
+    tts = load_backend(
+        "speech",
+        configs["voice"]["backend"],
+        configs["voice"]["model_id"],
+        configs["voice"]["device"],
+    )
+
+    generate_voices(
+        tts,
+        scenes,
+        configs["voice"]["n_audios"],
+        configs["voice"]["reference_voice_path"],
+        configs["voice"]["tts_language"],
+    )
+    return {"voices": [scene_dir / "audios" for scene_dir in scenes]}
 
-logger.info("\n##### Starting step 2 voice generation #####\n")
 
-tts = TTS(model_name=configs["voice"]["model_id"]).to(configs["voice"]["device"])
+if __name__ == "__main__":
+    from src.common import load_project_context
+    from src.pipeline import run_pipeline
 
-generate_voices(
-    tts,
-    configs["voice"]["n_audios"],
-    configs["voice"]["reference_voice_path"],
-    configs["voice"]["tts_language"],
-)
+    run_pipeline(["voice"], load_project_context())
@@ -0,0 +1,252 @@
+"""Long-lived worker rendering trailers with the models kept in memory.
+
+The TTS and similarity models are loaded once per worker instead of once per
+trailer. Jobs are sent over a local socket by `submit_job`, e.g. from the API,
+and run in threads of the worker process.
+
+Usage:
+    python -m src.worker
+    python -m src.worker --config configs.yaml
+"""
+
+import argparse
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Callable, Optional
+
+from src.backends import load_backend
+from src.common import CONFIGS_PATH, ProjectContext, parse_configs
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__file__)
+
+# Environment variable with the key shared by the worker and its clients
+AUTHKEY_ENV = "AI_TRAILER_WORKER_KEY"
+# Key generated under the project directory when the variable is not set
+AUTHKEY_FILENAME = ".worker_key"
+
+
+def get_address(configs: dict) -> tuple[str, int]:
+    """Address the worker listens on.
+
+    Args:
+        configs (dict): Configs with a `worker` section
+
+    Returns:
+        tuple[str, int]: Host and port
+    """
+    return configs["worker"]["host"], configs["worker"]["port"]
+
+
+def get_authkey(configs: dict) -> bytes:
+    """Key used to authenticate the connections to the worker.
+
+    The `AI_TRAILER_WORKER_KEY` environment variable is used if set, otherwise a
+    random key is generated once into a file only readable by its owner under
+    the project directory, which the worker and the API both read.
+
+    Args:
+        configs (dict): Configs with the `project_dir`
+
+    Returns:
+        bytes: Authentication key
+    """
+    if os.environ.get(AUTHKEY_ENV):
+        return os.environ[AUTHKEY_ENV].encode()
+
+    key_path = Path(configs["project_dir"]) / AUTHKEY_FILENAME
+    key_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        logger.info("Generated the worker key %s", key_path)
+
+    # The key may still be written by the other side, it is never empty once done
+    for _ in range(50):
+        authkey = key_path.read_text().strip()
+        if authkey:
+            return authkey.encode()
+        time.sleep(0.1)
+    raise RuntimeError(f"Worker key {key_path} is empty")
+
+
+def preload_models(configs: dict) -> None:
+    """Load the TTS and similarity models so the first job does not wait for them.
+
+    Args:
+        configs (dict): Configs with the `voice` and `frame_ranking` models
+    """
+    for kind, section in [("speech", "voice"), ("embedding", "frame_ranking")]:
+        model_configs = configs[section]
+        load_backend(
+            kind,
+            model_configs["backend"],
+            model_configs["model_id"],
+            model_configs["device"],
+        )
+
+
+def run_job(job: dict, listener: Optional[Callable[[dict], None]] = None) -> dict:
+    """Render a trailer in the worker process.
+
+    Args:
+        job (dict): Job with the project `config_path`, optional `stages` to run
+            and `preview` flag
+        listener (Optional[Callable[[dict], None]]): Called with the progress
+            events of the pipeline
+
+    Returns:
+        dict: Job `status`, `error` message if it failed and run `report` path
+    """
+    from src.main import run_project
+
+    try:
+        context = ProjectContext.from_configs(parse_configs(job["config_path"]))
+        if job.get("preview"):
+            context = context.with_overrides({"encoding": {"preview": True}})
+        logger.info("Running job for project %s", context.configs["project_name"])
+        exit_code = run_project(context, job.get("stages"), listener=listener)
+    except Exception as e:
+        logger.exception("Job %s failed", job)
+        return {"status": "failed", "error": str(e), "report": None}
+
+    return {
+        "status": "completed" if exit_code == 0 else "failed",
+        "error": None if exit_code == 0 else "Trailer generation failed",
+        "report": str(context.project_dir / "run_report.json"),
+    }
+
+
+class Worker:
+    """Socket server running trailer jobs with shared, already loaded models."""
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        authkey: bytes,
+        max_jobs: int = 1,
+    ):
+        self.listener = Listener(address, authkey=authkey)
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs)
+        self.closed = threading.Event()
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """Address the worker listens on, with the port picked if 0 was given."""
+        return self.listener.address
+
+    def handle(self, conn: Connection) -> None:
+        """Run the job received on a connection, streaming back its progress
+        events and then its result.
+
+        Args:
+            conn (Connection): Client connection
+        """
+        send_lock = threading.Lock()
+
+        def send_event(event: dict) -> None:
+            # Events come from every thread running a step of the job
+            with send_lock:
+                conn.send({"event": event})
+
+        with conn:
+            try:
+                job = conn.recv()
+                result = self.executor.submit(run_job, job, send_event).result()
+                with send_lock:
+                    conn.send({"result": result})
+            except (EOFError, OSError) as e:
+                logger.warning("Lost connection to a client: %s", e)
+
+    def serve_forever(self) -> None:
+        """Accept jobs until the worker is closed."""
+        logger.info("Worker listening on %s", self.address)
+        while not self.closed.is_set():
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                if self.closed.is_set():
+                    break
+                logger.exception("Could not accept a connection")
+                continue
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def close(self) -> None:
+        """Stop accepting jobs, running jobs are finished first."""
+        self.closed.set()
+        self.listener.close()
+        self.executor.shutdown(wait=True)
+
+
+def submit_job(
+    job: dict,
+    address: tuple[str, int],
+    authkey: bytes,
+    listener: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """Send a job to a running worker and wait for its result.
+
+    Args:
+        job (dict): Job with the project `config_path`, optional `stages` to run
+            and `preview` flag
+        address (tuple[str, int]): Worker address
+        authkey (bytes): Authentication key shared with the worker, see
+            `get_authkey`
+        listener (Optional[Callable[[dict], None]]): Called with the progress
+            events of the job while it runs
+
+    Returns:
+        dict: Job `status`, `error` message if it failed and run `report` path
+    """
+    with Client(address, authkey=authkey) as conn:
+        conn.send(job)
+        while True:
+            message = conn.recv()
+            if "result" in message:
+                return message["result"]
+            if listener is not None:
+                listener(message["event"])
+
+
+def main() -> int:
+    """Start a worker with the models of the default configs loaded.
+
+    Returns:
+        int: Exit code
+    """
+    parser = argparse.ArgumentParser(description="AI Trailer model worker")
+    parser.add_argument("--config", type=str, help="Worker configs")
+    args = parser.parse_args()
+    configs_path = Path(args.config).resolve() if args.config else CONFIGS_PATH
+
+    # Project paths in the configs are relative to the repository root
+    os.chdir(Path(__file__).parent.parent)
+    configs = parse_configs(configs_path)
+    if configs["worker"]["preload"]:
+        preload_models(configs)
+
+    worker = Worker(
+        get_address(configs), get_authkey(configs), configs["worker"]["max_jobs"]
+    )
+    try:
+        worker.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping worker")
+    finally:
+        worker.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import pytest
+import yaml
+
+from src.common import CONFIGS_PATH, ProjectContext, merge_configs, parse_configs
+from src.ffmpeg_tools import run_ffmpeg
+
+# The API and frame sampling dependencies are not part of the light test setup
+pytest.importorskip("fastapi")
+pytest.importorskip("cv2")
+
+import api  # noqa: E402
+
+
+def test_runs_trailer_jobs_from_the_local_source(tmp_path):
+    drive = tmp_path / "drive"
+    drive.mkdir()
+    run_ffmpeg(
+        [
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=duration=6:size=64x64:rate=10",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=duration=6",
+            "-shortest",
+            "-f",
+            "mp4",
+            str(drive / "movie"),
+        ]
+    )
+    context = ProjectContext.from_configs(
+        merge_configs(
+            parse_configs(CONFIGS_PATH),
+            {
+                "project_dir": str(tmp_path / "projects"),
+                "project_name": "job",
+                "video_file_id": "movie",
+                "video_store": {
+                    "dir": str(tmp_path / "store"),
+                    "quota_gb": None,
+                    "source": "local",
+                    "local_dir": str(drive),
+                },
+                "worker": {"enabled": False},
+                "voice": {"backend": "tone"},
+                "frame_sampling": {"n_frames": 10},
+                "frame_ranking": {"backend": "hash"},
+            },
+        )
+    )
+    context = context.with_overrides(
+        {"video_path": str(context.movies_dir / "input_movie.mp4")}
+    )
+    context.ensure_dirs()
+    context.plot_path.write_text("A storm. A rescue.")
+    config_path = context.project_dir / "project_config.yaml"
+    config_path.write_text(yaml.safe_dump(context.configs))
+
+    result = api.run_trailer_job(
+        "job", {"file_id": "movie", "config_path": str(config_path)}, lambda e: None
+    )
+
+    assert result["input_video"] == context.configs["video_path"]
+    assert (context.trailer_dir / "final_trailer.mp4").exists()
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.batch import VARIANT_STAGES, get_variant_context, run_batch
+from src.common import CONFIGS_PATH, ProjectContext, merge_configs, parse_configs
+from src.image_retrieval import load_image_embeddings, save_image_embeddings
+from src.main import run_project
+
+# Steps the test environment can run, frame sampling needs OpenCV
+RUNNABLE_STAGES = {"subplot", "voice", "image_retrieval"}
+
+
+def make_base(tmp_path):
+    configs = merge_configs(
+        parse_configs(CONFIGS_PATH),
+        {
+            "project_dir": str(tmp_path),
+            "project_name": "batch",
+            "voice": {"backend": "tone"},
+            "frame_ranking": {"backend": "hash", "n_retrieved_images": 2},
+        },
+    )
+    return ProjectContext.from_configs(configs)
+
+
+def sample_frames(context):
+    context.frames_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for idx in range(4):
+        path = context.frames_dir / f"frame_{idx}.jpg"
+        Image.new("RGB", (8, 8), (idx * 60, 0, 0)).save(path)
+        paths.append(path)
+    save_image_embeddings(paths, np.eye(4, 512, dtype=np.float32), context.project_dir)
+
+
+def test_shares_video_steps_between_variants(tmp_path):
+    base = make_base(tmp_path)
+    calls = []
+
+    def runner(context, stages):
+        calls.append((context.configs["project_name"], stages))
+        if context == base:
+            sample_frames(context)
+            return 0
+        stages = [name for name in stages if name in RUNNABLE_STAGES]
+        return run_project(context, stages)
+
+    variants = [
+        {"name": "en", "plot": "A storm. A rescue."},
+        {
+            "name": "fr",
+            "plot": "Une tempête. Un sauvetage. La fin.",
+            "overrides": {"voice": {"tts_language": "fr"}},
+        },
+    ]
+    results = run_batch(base, variants, runner, max_workers=2)
+
+    assert results == {"en": 0, "fr": 0}
+    assert calls[0] == ("batch", ["frame", "frame_embedding"])
+    assert sorted(calls[1:]) == [
+        ("batch_en", VARIANT_STAGES),
+        ("batch_fr", VARIANT_STAGES),
+    ]
+    for name, n_scenes in [("en", 2), ("fr", 3)]:
+        project_dir = tmp_path / f"batch_{name}"
+        frame = project_dir / "frames" / "frame_0.jpg"
+        assert os.stat(frame).st_ino == os.stat(base.frames_dir / "frame_0.jpg").st_ino
+        paths, _ = load_image_embeddings(project_dir)
+        assert paths[0] == frame
+        assert len(list(project_dir.glob("scene_*/audios/audio_1.wav"))) == n_scenes
+        assert len(list(project_dir.glob("scene_1/frames/*.jpg"))) == 2
+        assert (project_dir / "run_report.json").exists()
+
+
+def test_rejects_variants_changing_video_steps(tmp_path):
+    base = make_base(tmp_path)
+    variant = {"name": "dense", "overrides": {"frame_sampling": {"n_frames": 10}}}
+
+    with pytest.raises(ValueError, match="frame_sampling"):
+        get_variant_context(base, variant)
@@ -0,0 +1,139 @@
+import json
+import wave
+from pathlib import Path
+
+import pytest
+
+from src.candidates import count_candidates, decode_candidate, iter_candidates
+from src.scoring import load_scene_segments, rank_candidates, write_report
+
+ALL_SCENE_CLIPS = [
+    [Path(f"scene_{scene}/audio_clips/clip_{clip}.mp4") for clip in range(3)]
+    for scene in range(1, 5)
+]
+
+
+def test_count_candidates():
+    assert count_candidates(ALL_SCENE_CLIPS) == 3**4
+    assert count_candidates(ALL_SCENE_CLIPS + [[]]) == 0
+
+
+def test_decode_candidate():
+    assert decode_candidate(0, [3, 3]) == (0, 0)
+    assert decode_candidate(5, [3, 3]) == (1, 2)
+    assert decode_candidate(8, [3, 3]) == (2, 2)
+
+
+def test_enumerates_everything_under_the_cap():
+    candidates = list(iter_candidates(ALL_SCENE_CLIPS, max_candidates=100))
+    assert len(candidates) == 81
+    assert len(set(candidates)) == 81
+
+
+def test_samples_distinct_candidates_over_the_cap():
+    candidates = list(iter_candidates(ALL_SCENE_CLIPS, max_candidates=10, seed=1))
+    assert len(candidates) == 10
+    assert len(set(candidates)) == 10
+    assert candidates[0] == tuple(scene_clips[0] for scene_clips in ALL_SCENE_CLIPS)
+
+
+@pytest.mark.parametrize("max_candidates", [0, -1])
+def test_rejects_empty_caps(max_candidates):
+    with pytest.raises(ValueError, match="max_candidates"):
+        next(iter_candidates(ALL_SCENE_CLIPS, max_candidates=max_candidates))
+
+
+def test_sampling_is_seeded():
+    first = list(iter_candidates(ALL_SCENE_CLIPS, max_candidates=10, seed=7))
+    second = list(iter_candidates(ALL_SCENE_CLIPS, max_candidates=10, seed=7))
+    assert first == second
+
+
+def test_rank_candidates_prefers_similar_and_diverse_clips():
+    scene_segments = [
+        [
+            {"path": "a1", "similarity": 0.3, "duration_fit": 1.0, "embedding": [1, 0]},
+            {"path": "a2", "similarity": 0.1, "duration_fit": 1.0, "embedding": [0, 1]},
+        ],
+        [
+            {"path": "b1", "similarity": 0.2, "duration_fit": 1.0, "embedding": [1, 0]},
+            {"path": "b2", "similarity": 0.2, "duration_fit": 1.0, "embedding": [0, 1]},
+        ],
+    ]
+    ranked = rank_candidates(scene_segments, 2, 1, 1.0, 0.5, 0.5)
+    assert len(ranked) == 2
+    assert [s["path"] for s in ranked[0]["segments"]] == ["a1", "b2"]
+    assert ranked[0]["diversity"] == 1.0
+    assert ranked[0]["score"] >= ranked[1]["score"]
+
+
+def make_segments(n_scenes, n_clips):
+    # Deterministic scores and embeddings spread around the unit circle
+    return [
+        [
+            {
+                "path": f"scene_{scene}/audio_clips/clip_{clip}.mp4",
+                "similarity": ((scene * 7 + clip * 3) % 5) / 5,
+                "duration_fit": ((scene + clip * 2) % 4) / 4,
+                "embedding": [(scene + clip) % 3 - 1, (scene * clip) % 2 + 0.5],
+            }
+            for clip in range(n_clips)
+        ]
+        for scene in range(n_scenes)
+    ]
+
+
+def test_beam_keeps_the_best_combinations():
+    scene_segments = make_segments(4, 3)
+    weights = (1.0, 0.5, 0.5)
+    exhaustive = rank_candidates(scene_segments, 3**4, 3**4, *weights)
+    assert len(exhaustive) == 81
+    best_scores = [candidate["score"] for candidate in exhaustive[:5]]
+
+    # A narrower beam finds the same best candidates on these scores
+    ranked = rank_candidates(scene_segments, 5, 9, *weights)
+    assert [c["score"] for c in ranked] == pytest.approx(best_scores)
+    assert len({tuple(s["path"] for s in c["segments"]) for c in ranked}) == 5
+    assert all(len(c["segments"]) == 4 for c in ranked)
+
+    # The beam is never narrower than the number of candidates asked for
+    assert len(rank_candidates(scene_segments, 4, 1, *weights)) == 4
+    greedy = rank_candidates(scene_segments, 1, 1, *weights)
+    assert greedy[0]["score"] <= best_scores[0]
+    # Fewer combinations than asked for returns all of them
+    assert len(rank_candidates(make_segments(2, 2), 10, 10, *weights)) == 4
+
+
+def test_scores_scene_segments_and_writes_the_report(tmp_path):
+    scene_dir = tmp_path / "scene_1"
+    (scene_dir / "frames").mkdir(parents=True)
+    (scene_dir / "audios").mkdir()
+    (scene_dir / "frames" / "retrieval.json").write_text(
+        json.dumps([{"frame": "frame_2.jpg", "score": 0.8, "embedding": [1, 0]}])
+    )
+    with wave.open(str(scene_dir / "audios" / "audio_1.wav"), "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(8000)
+        audio.writeframes(b"\0\0" * 12000)
+    clips = [
+        scene_dir / "audio_clips" / "audio_clip_clip_2_audio_1.mp4",
+        scene_dir / "audio_clips" / "unknown.mp4",
+    ]
+
+    segments = load_scene_segments(clips, min_clip_len=2)
+
+    assert segments[0]["similarity"] == 0.8
+    assert segments[0]["embedding"] == [1, 0]
+    # 1.5 seconds of voice over a 2 seconds clip
+    assert segments[0]["duration_fit"] == 0.75
+    assert segments[1]["similarity"] == segments[1]["duration_fit"] == 0.0
+
+    ranked = rank_candidates([segments], 2, 2, 1.0, 1.0, 0.0)
+    report_path = tmp_path / "scores.json"
+    write_report(ranked, [Path("trailer_0.mp4"), Path("trailer_1.mp4")], report_path)
+
+    report = json.loads(report_path.read_text())
+    assert [entry["trailer"] for entry in report] == ["trailer_0.mp4", "trailer_1.mp4"]
+    assert report[0]["score"] == pytest.approx(1.55)
+    assert report[0]["clips"] == [str(clips[0])]
@@ -0,0 +1,74 @@
+import json
+import threading
+
+from src.catalogue import PREPARE_STAGES, load_catalogue, run_catalogue
+from src.common import CONFIGS_PATH, ProjectContext, merge_configs, parse_configs
+from src.cost_model import FEATURES_FILENAME
+from src.main import run_project
+
+# Steps the test environment can run, frame sampling needs OpenCV
+RUNNABLE_STAGES = {"subplot", "voice"}
+
+
+def test_loads_csv_catalogues(tmp_path):
+    (tmp_path / "plot.txt").write_text("From a file.")
+    catalogue = tmp_path / "catalogue.csv"
+    catalogue.write_text(
+        "name,video,plot,plot_path,imdb_id,overrides\n"
+        'first,movies/first.mp4,A plot.,,,"{""voice"": {""n_audios"": 2}}"\n'
+        "second,movies/second.mp4,,plot.txt,,\n"
+        "third,movies/third.mp4,,,0123456,\n"
+    )
+
+    first, second, third = load_catalogue(catalogue)
+
+    assert first["plot"] == "A plot."
+    assert first["overrides"] == {"voice": {"n_audios": 2}}
+    assert second["plot"] == "From a file."
+    assert second["overrides"] == {}
+    assert third["imdb_id"] == "0123456"
+    assert "plot" not in third
+
+
+def test_renders_items_while_preparing_the_next(tmp_path):
+    base = ProjectContext.from_configs(
+        merge_configs(
+            parse_configs(CONFIGS_PATH),
+            {"project_dir": str(tmp_path), "voice": {"backend": "tone"}},
+        )
+    )
+    items = [
+        {"name": "first", "plot": "One. Two."},
+        {"name": "broken"},
+        {"name": "third", "plot": "One. Two. Three."},
+    ]
+    third_prepared = threading.Event()
+    phases = []
+
+    def runner(context, stages, phase):
+        name = context.configs["project_name"]
+        phases.append((name, phase))
+        if phase == "prepare":
+            assert stages == PREPARE_STAGES
+            exit_code = run_project(
+                context,
+                [s for s in stages if s in RUNNABLE_STAGES],
+                report_name=f"run_report_{phase}.json",
+            )
+            if name == "third":
+                third_prepared.set()
+            return exit_code
+        if name == "first":
+            assert third_prepared.wait(timeout=30), "the next item waited"
+        return 0
+
+    results = run_catalogue(base, items, runner)
+
+    assert results == {"first": "completed", "broken": "prepare", "third": "completed"}
+    for name, n_scenes in [("first", 2), ("third", 3)]:
+        project_dir = tmp_path / name
+        assert len(list(project_dir.glob("scene_*/audios/audio_1.wav"))) == n_scenes
+        assert (project_dir / "run_report_prepare.json").exists()
+        features = json.loads((project_dir / FEATURES_FILENAME).read_text())
+        assert features["n_subplots"] == n_scenes
+    assert not (tmp_path / "broken" / FEATURES_FILENAME).exists()
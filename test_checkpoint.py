@@ -0,0 +1,48 @@
+import pytest
+
+from src.checkpoint import WorkManifest
+
+
+def render(work, output_path, params, text):
+    if work.is_complete(output_path, params):
+        return False
+    with work.atomic_output(output_path) as tmp_path:
+        if text is None:
+            raise RuntimeError("render crashed")
+        tmp_path.write_text(text)
+    work.record(output_path, params)
+    return True
+
+
+def test_resumes_missing_and_corrupt_items(tmp_path):
+    output_dir = tmp_path / "clips"
+    work = WorkManifest(output_dir)
+    assert render(work, output_dir / "a.mp4", {"frame": 1}, "a")
+    assert render(work, output_dir / "b.mp4", {"frame": 2}, "b")
+    with pytest.raises(RuntimeError):
+        render(work, output_dir / "c.mp4", {"frame": 3}, None)
+    assert not (output_dir / "c.mp4").exists()
+
+    # Crash while appending a record and corrupt an output
+    with open(work.path, "a") as f:
+        f.write('{"output": "c.mp')
+    (output_dir / "b.mp4").write_text("truncated")
+    (output_dir / "old.mp4").write_text("stale")
+
+    work = WorkManifest(output_dir)
+    assert not render(work, output_dir / "a.mp4", {"frame": 1}, "a")
+    assert render(work, output_dir / "b.mp4", {"frame": 2}, "b")
+    assert render(work, output_dir / "c.mp4", {"frame": 3}, "c")
+    work.finalize()
+
+    assert sorted(p.name for p in output_dir.iterdir()) == [
+        ".work_manifest.jsonl",
+        "a.mp4",
+        "b.mp4",
+        "c.mp4",
+    ]
+    assert (output_dir / "b.mp4").read_text() == "b"
+
+    work = WorkManifest(output_dir)
+    assert not render(work, output_dir / "c.mp4", {"frame": 3}, "c")
+    assert render(work, output_dir / "c.mp4", {"frame": 4}, "c")
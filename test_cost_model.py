@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+from src.common import CONFIGS_PATH, merge_configs, parse_configs
+from src.cost_model import (
+    FEATURES_FILENAME,
+    CostModel,
+    get_cost_model,
+    get_job_features,
+    get_terms,
+    invalidate_cost_models,
+    load_samples,
+    plan_job,
+)
+
+CONFIGS = parse_configs(CONFIGS_PATH)
+VIDEO_INFO = {"duration": 600, "width": 1280, "height": 720}
+
+
+def make_features(**overrides):
+    configs = merge_configs(CONFIGS, overrides)
+    return get_job_features(configs, "One. Two. Three. Four.", VIDEO_INFO)
+
+
+def write_project(root, name, features, seconds, skipped=False, phases=None):
+    project_dir = root / name
+    project_dir.mkdir()
+    (project_dir / FEATURES_FILENAME).write_text(json.dumps(features))
+    if phases is None:
+        phases = {None: ["voice", "join_clip"]}
+    for phase, stages in phases.items():
+        report = {
+            "status": "completed",
+            "wall_seconds": seconds / len(phases),
+            "cpu_seconds": seconds / len(phases),
+            "peak_rss_mb": 2000.0,
+            "children_peak_rss_mb": 100.0,
+            "stages": {
+                stage: {"status": "skipped" if skipped else "completed"}
+                for stage in stages
+            },
+        }
+        report_name = "run_report.json" if phase is None else f"run_report_{phase}.json"
+        (project_dir / report_name).write_text(json.dumps(report))
+
+
+def test_describes_jobs():
+    features = make_features(frame_sampling={"n_frames": 500})
+
+    assert features["n_subplots"] == 4
+    assert features["n_frames"] == 500
+    unknown = get_job_features(CONFIGS, "One.", {"duration": None})
+    assert unknown["duration"] == 2 * 3600
+    assert unknown["width"] == 1920
+
+
+def test_calibrates_on_past_runs(tmp_path):
+    # Seconds grow by 0.5 per frame over a 100 seconds base
+    for n_frames in [100, 200, 400, 800, 1600]:
+        features = make_features(frame_sampling={"n_frames": n_frames})
+        seconds = 100 + 0.5 * n_frames
+        write_project(tmp_path, f"frames_{n_frames}", features, seconds)
+    write_project(tmp_path, "partial", make_features(), 1.0, skipped=True)
+    # Catalogue items and lease queue tasks keep a report per run, only the
+    # rendered projects count
+    features = make_features(frame_sampling={"n_frames": 300})
+    phases = {"prepare": ["voice"], "render": ["clip", "join_clip"]}
+    write_project(tmp_path, "catalogue", features, 250, phases=phases)
+    phases = {"prepare": ["voice"], "clip_0": ["clip"], "clip_1": ["clip"]}
+    write_project(tmp_path, "sharded", make_features(), 1.0, phases=phases)
+
+    samples = load_samples(tmp_path)
+    assert len(samples) == 6
+    catalogue_report = samples[0][1]
+    assert catalogue_report["wall_seconds"] == 250
+    assert catalogue_report["peak_rss_mb"] == 2000.0
+    assert sorted(catalogue_report["stages"]) == [
+        "prepare.voice",
+        "render.clip",
+        "render.join_clip",
+    ]
+    model = CostModel.from_projects(tmp_path)
+
+    features = make_features(frame_sampling={"n_frames": 1200})
+    assert model.predict(features)["seconds"] == pytest.approx(700, rel=0.05)
+    assert (model.seconds >= 0).all()
+    assert get_terms(features).shape == model.seconds.shape
+
+
+def test_down_tunes_and_rejects_jobs():
+    model = CostModel(seconds=(0, 0, 1, 0, 0), memory_mb=(0, 0, 0, 0, 0))
+    configs = merge_configs(
+        CONFIGS,
+        {
+            "jobs": {"max_concurrency": 1},
+            "admission": {
+                "target_jobs_per_hour": 12,
+                "min_n_frames": 100,
+                "max_backlog_seconds": 1000,
+            },
+        },
+    )
+
+    # 300 seconds per job, 1000 frames are halved until they fit
+    plan = plan_job(model, make_features(), configs)
+    assert plan["status"] == "tuned"
+    assert plan["overrides"]["frame_sampling"]["n_frames"] == 250
+    assert plan["estimate"]["seconds"] == 250
+
+    small = make_features(frame_sampling={"n_frames": 100})
+    assert plan_job(model, small, configs)["status"] == "accepted"
+
+    strict = merge_configs(configs, {"admission": {"target_jobs_per_hour": 60}})
+    plan = plan_job(model, make_features(), strict)
+    assert plan["status"] == "rejected"
+    assert plan["features"]["n_retrieved_images"] == 1
+
+    plan = plan_job(model, small, configs, backlog_seconds=5000)
+    assert plan["status"] == "rejected"
+    assert plan["wait_seconds"] == 5000
+
+
+def test_reuses_the_calibrated_model(tmp_path):
+    invalidate_cost_models()
+    write_project(tmp_path, "first", make_features(), 100.0)
+
+    model = get_cost_model(tmp_path, max_age_seconds=600)
+    assert model.n_samples == 1
+
+    # New runs are only seen once the model expires or is invalidated
+    write_project(tmp_path, "second", make_features(), 200.0)
+    assert get_cost_model(tmp_path, max_age_seconds=600) is model
+    invalidate_cost_models()
+    assert get_cost_model(tmp_path, max_age_seconds=600).n_samples == 2
+    write_project(tmp_path, "third", make_features(), 300.0)
+    assert get_cost_model(tmp_path, max_age_seconds=0).n_samples == 3
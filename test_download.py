@@ -0,0 +1,97 @@
+import hashlib
+import json
+import re
+import threading
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+
+import pytest
+
+from src.download import download_ranges, get_progress_path
+
+CONTENT = bytes(range(256)) * 40
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serve `CONTENT` by byte ranges, failing the ranges starting at `broken`."""
+
+    def __init__(self, *args, server_state, **kwargs):
+        self.server_state = server_state
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        start, end = map(
+            int, re.match(r"bytes=(\d+)-(\d+)", self.headers["Range"]).groups()
+        )
+        self.server_state["ranges"].append(start)
+        if start in self.server_state["broken"]:
+            self.send_error(500)
+            return
+        data = CONTENT[start : end + 1]
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(CONTENT)}")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    state = {"ranges": [], "broken": set()}
+    httpd = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(RangeHandler, server_state=state)
+    )
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{httpd.server_address[1]}/movie.mp4"
+    yield state
+    httpd.shutdown()
+
+
+def test_downloads_ranges_in_parallel(server, tmp_path):
+    path = download_ranges(
+        server["url"],
+        tmp_path / "movie.mp4",
+        len(CONTENT),
+        hashlib.md5(CONTENT).hexdigest(),
+        max_workers=4,
+        chunk_bytes=1000,
+    )
+
+    assert path.read_bytes() == CONTENT
+    assert sorted(server["ranges"]) == list(range(0, len(CONTENT), 1000))
+    assert not get_progress_path(path).exists()
+
+
+def test_resumes_interrupted_downloads(server, tmp_path):
+    path = tmp_path / "movie.mp4"
+    server["broken"] = {3000}
+    with pytest.raises(HTTPError):
+        download_ranges(server["url"], path, len(CONTENT), chunk_bytes=1000, retries=1)
+    done = json.loads(get_progress_path(path).read_text())["done"]
+    assert done and 3 not in done
+
+    server["broken"] = set()
+    server["ranges"].clear()
+    download_ranges(
+        server["url"],
+        path,
+        len(CONTENT),
+        hashlib.md5(CONTENT).hexdigest(),
+        chunk_bytes=1000,
+    )
+
+    # Only the chunks missing from the progress file are downloaded again
+    assert sorted(server["ranges"]) == [i * 1000 for i in range(11) if i not in done]
+    assert path.read_bytes() == CONTENT
+
+
+def test_rejects_corrupted_downloads(server, tmp_path):
+    path = tmp_path / "movie.mp4"
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        download_ranges(server["url"], path, len(CONTENT), "0" * 32, chunk_bytes=1000)
+    assert not path.exists()
+    assert not get_progress_path(path).exists()
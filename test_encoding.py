@@ -0,0 +1,54 @@
+import threading
+
+from src import instrumentation
+from src.common import CONFIGS_PATH, ProjectContext, merge_configs, parse_configs
+from src.encoding import encode_timer, get_ffmpeg_args, get_profile
+from src.instrumentation import get_section
+
+
+def make_context(tmp_path):
+    return ProjectContext.from_configs(
+        merge_configs(parse_configs(CONFIGS_PATH), {"project_dir": str(tmp_path)})
+    )
+
+
+def test_selects_the_profile_of_each_step(tmp_path):
+    context = make_context(tmp_path)
+
+    assert get_profile(context.configs, "clip")["name"] == "intermediate"
+    final = get_profile(context.configs, "join_clip")
+    assert final["name"] == "final"
+    assert get_ffmpeg_args(final) == [
+        *("-c:v", "libx264", "-preset", "medium", "-crf", "18"),
+        *("-pix_fmt", "yuv420p", "-threads", "0"),
+    ]
+
+    # `--preview` renders every step with the preview profile
+    preview = context.with_overrides({"encoding": {"preview": True}})
+    for stage in ["clip", "audio_clip", "join_clip"]:
+        assert get_profile(preview.configs, stage)["name"] == "preview"
+    assert get_ffmpeg_args(get_profile(preview.configs, "clip"))[-2:] == ["-r", "12"]
+    assert get_profile(context.configs, "join_clip")["name"] == "final"
+
+
+def test_keeps_encode_timings_per_run(tmp_path):
+    profile = {"name": "preview"}
+
+    def run(encodes, totals):
+        instrumentation.reset()
+        for _ in range(encodes):
+            with encode_timer("clip", profile, tmp_path / "clip.mp4"):
+                pass
+        totals.append(get_section("clip", "encode"))
+
+    totals = []
+    # Runs in other threads, e.g. jobs of a worker, have their own timings
+    threads = [threading.Thread(target=run, args=(n, totals)) for n in (1, 3)]
+    for thread in threads:
+        thread.start()
+        thread.join()
+    run(2, totals)
+
+    assert [t["calls"] for t in totals] == [1, 3, 2]
+    instrumentation.reset()
+    assert get_section("clip", "encode") is None
@@ -0,0 +1,107 @@
+import os
+import time
+
+import yaml
+
+from src.common import CONFIGS_PATH, merge_configs, parse_configs
+from src.garbage_collect import collect
+
+HOUR = 3600
+
+
+def make_project(root, name, age_hours, gc_configs=None):
+    project_dir = root / name
+    files = {
+        "plot.txt": 10,
+        "manifest.json": 10,
+        "frames/frame_1.jpg": 1000,
+        "embeddings/frames.npy": 500,
+        "scene_1/subplot.txt": 10,
+        "scene_1/audios/audio_1.wav": 400,
+        "scene_1/clips/clip_1.mp4": 600,
+        "scene_1/audio_clips/clip_1.mp4": 500,
+        "trailers/final_trailer.mp4": 1000,
+        "trailers/segments/segment_1.mp4": 300,
+    }
+    for path, size in files.items():
+        (project_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        (project_dir / path).write_bytes(b"x" * size)
+    if gc_configs is not None:
+        (project_dir / "project_config.yaml").write_text(
+            yaml.safe_dump({"gc": gc_configs})
+        )
+    mtime = time.time() - age_hours * HOUR
+    for path in [project_dir, *project_dir.rglob("*")]:
+        os.utime(path, (mtime, mtime))
+    return project_dir
+
+
+def get_configs(tmp_path, **gc_configs):
+    return merge_configs(
+        parse_configs(CONFIGS_PATH),
+        {"project_dir": str(tmp_path), "gc": {"quota_gb": None, **gc_configs}},
+    )
+
+
+def test_dry_run_reports_then_removes_intermediates(tmp_path):
+    configs = get_configs(tmp_path, retention_hours=48, min_idle_hours=6)
+    old = make_project(tmp_path, "old", age_hours=72)
+    make_project(tmp_path, "recent", age_hours=1)
+    make_project(tmp_path, "pinned", age_hours=72, gc_configs={"retention_hours": 96})
+    # The input video is hard-linked from the video store, removing the
+    # project link frees no space
+    (tmp_path / "video_store").mkdir()
+    (tmp_path / "video_store" / "video.mp4").write_bytes(b"v" * 5000)
+    (old / "movies").mkdir()
+    os.link(tmp_path / "video_store" / "video.mp4", old / "movies" / "input.mp4")
+    for path in [old, old / "movies", old / "movies" / "input.mp4"]:
+        os.utime(path, (time.time() - 72 * HOUR,) * 2)
+
+    report = collect(tmp_path, configs, dry_run=True)
+
+    assert report["intermediates"] == {"old": "retention"}
+    assert report["projects"] == {}
+    assert report["artifacts"]["frames"] == {"files": 1, "bytes": 1000}
+    assert report["artifacts"]["voices"] == {"files": 1, "bytes": 400}
+    assert report["artifacts"]["input_video"] == {"files": 1, "bytes": 0}
+    assert report["artifacts"]["trailer"] == {"files": 0, "bytes": 0}
+    assert report["artifacts"]["trailer_segments"] == {"files": 1, "bytes": 300}
+    assert report["reclaimed_bytes"] == 1000 + 500 + 400 + 600 + 500 + 300
+    assert (old / "frames" / "frame_1.jpg").exists()
+
+    collect(tmp_path, configs)
+
+    assert sorted(p.name for p in old.iterdir()) == ["plot.txt", "scene_1", "trailers"]
+    assert [p.name for p in (old / "scene_1").iterdir()] == ["subplot.txt"]
+    assert [p.name for p in (old / "trailers").iterdir()] == ["final_trailer.mp4"]
+    assert (tmp_path / "video_store" / "video.mp4").exists()
+    assert (tmp_path / "recent" / "frames" / "frame_1.jpg").exists()
+    assert (tmp_path / "pinned" / "frames" / "frame_1.jpg").exists()
+    assert collect(tmp_path, configs, dry_run=True)["reclaimed_bytes"] == 0
+
+
+def test_evicts_least_recently_used_projects_above_quota(tmp_path):
+    for name, age_hours in [("newest", 8), ("oldest", 12), ("running", 0)]:
+        make_project(tmp_path, name, age_hours)
+    project_bytes = 4330
+    intermediate_bytes = 3300
+
+    # Dropping the intermediates of the oldest project is enough
+    quota = 3 * project_bytes - intermediate_bytes
+    configs = get_configs(
+        tmp_path, retention_hours=48, min_idle_hours=6, quota_gb=quota / 1024**3
+    )
+    report = collect(tmp_path, configs, dry_run=True)
+    assert report["used_bytes"] == 3 * project_bytes
+    assert report["intermediates"] == {"oldest": "quota"}
+    assert report["projects"] == {}
+
+    # Then whole idle projects go, least recently used first, never the ones
+    # in use
+    configs["gc"]["quota_gb"] = 0
+    report = collect(tmp_path, configs)
+    assert report["intermediates"] == {}
+    assert report["projects"] == {"oldest": "quota", "newest": "quota"}
+    assert report["reclaimed_bytes"] == 2 * project_bytes
+    assert report["artifacts"]["trailer"] == {"files": 2, "bytes": 2000}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["running"]
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+import time
+
+from src import instrumentation
+
+
+def run_step(stage, func):
+    instrumentation.reset()
+    with instrumentation.instrument_stage(stage):
+        func()
+    return instrumentation.get_run_report("completed")
+
+
+def allocate():
+    # Held for a few memory samples
+    data = b"x" * 300 * 1024**2
+    time.sleep(1)
+    del data
+
+
+def spawn_child():
+    code = "import time; data = b'x' * 200 * 1024**2; time.sleep(1)"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_reports_the_peak_memory_of_each_run():
+    heavy = run_step("heavy", allocate)
+    child = run_step("child", spawn_child)
+    light = run_step("light", lambda: None)
+
+    assert heavy["peak_rss_mb"] == heavy["stages"]["heavy"]["peak_rss_mb"]
+    # Later runs of the same process do not inherit the peak of earlier ones
+    assert heavy["peak_rss_mb"] > light["peak_rss_mb"] + 250
+    assert child["children_peak_rss_mb"] > 200
+    assert light["children_peak_rss_mb"] < 50
@@ -0,0 +1,110 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.jobs import COMPLETED, FAILED, QUEUED, RUNNING, JobQueue, JobStore
+
+
+def render(job_id, params, listener):
+    listener({"stage": "voice", "status": "running"})
+    listener({"stage": "voice", "status": "running", "items": 1, "total_items": 2})
+    listener({"stage": "voice", "status": "completed"})
+    if params.get("fail"):
+        raise RuntimeError("render failed")
+    return {"trailer": f"{params['project_name']}.mp4"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(tmp_path / "jobs.db")
+
+
+def test_runs_queued_jobs(store):
+    queue = JobQueue(store, render, max_concurrency=2)
+    params = {"project_name": "first"}
+    assert store.create("first", params)["status"] == QUEUED
+    store.create("broken", {**params, "fail": True})
+
+    events = []
+    queue.broker.subscribe("first", events.append)
+    queue.submit("first").result()
+    assert [e.get("job_status") or e["status"] for e in events] == [
+        RUNNING,
+        "running",
+        "running",
+        "completed",
+        COMPLETED,
+    ]
+    assert events[2]["items"] == 1
+    assert events[-1]["result"] == {"trailer": "first.mp4"}
+
+    queue.submit("broken").result()
+    queue.shutdown()
+
+    job = store.get("first")
+    assert job["status"] == COMPLETED
+    assert job["result"] == {"trailer": "first.mp4"}
+    assert job["stage"] == "voice"
+    assert job["stages"] == {"voice": "completed"}
+
+    job = store.get("broken")
+    assert job["status"] == FAILED
+    assert job["error"] == "render failed"
+    assert store.get("missing") is None
+
+
+def test_resumes_unfinished_jobs(store):
+    params = {"project_name": "first"}
+    store.create("done", params)
+    store.update("done", status=COMPLETED)
+    store.create("interrupted", params)
+    store.update("interrupted", status=RUNNING)
+    store.create("waiting", params)
+
+    # A new process opens the same database
+    queue = JobQueue(JobStore(store.path), render)
+    futures = queue.recover()
+    assert list(futures) == ["interrupted", "waiting"]
+    for future in futures.values():
+        future.result()
+    queue.shutdown()
+
+    assert store.get("interrupted")["status"] == COMPLETED
+    assert store.get("waiting")["status"] == COMPLETED
+
+
+def test_shutdown_leaves_running_jobs_to_recovery(store):
+    # The API process exits while a long render runs and another one waits
+    code = (
+        "import sys, time\n"
+        "from src.jobs import JobQueue, JobStore\n"
+        "def hang(job_id, params, listener):\n"
+        "    time.sleep(60)\n"
+        "store = JobStore(sys.argv[1])\n"
+        "queue = JobQueue(store, hang)\n"
+        "running, waiting = queue.submit('running'), queue.submit('waiting')\n"
+        "while store.get('running')['status'] != 'running':\n"
+        "    time.sleep(0.01)\n"
+        "queue.shutdown()\n"
+        "assert waiting.cancelled()\n"
+    )
+    for job_id in ["running", "waiting"]:
+        store.create(job_id, {"project_name": job_id})
+
+    # Times out if the exit waits for the render
+    subprocess.run(
+        [sys.executable, "-c", code, str(store.path)],
+        check=True,
+        timeout=30,
+        cwd=Path(__file__).parent,
+    )
+
+    assert store.get("running")["status"] == RUNNING
+    assert store.get("waiting")["status"] == QUEUED
+    queue = JobQueue(store, render)
+    for future in queue.recover().values():
+        future.result()
+    queue.shutdown()
+    assert store.get("running")["status"] == COMPLETED
@@ -0,0 +1,202 @@
+import json
+import multiprocessing
+import os
+import time
+
+import yaml
+
+from src.common import CONFIGS_PATH, ProjectContext, merge_configs, parse_configs
+from src.cost_model import FEATURES_FILENAME
+from src.lease_queue import (
+    SHARD_STAGES,
+    LeaseQueue,
+    run_task,
+    run_worker,
+    write_replace,
+)
+from src.pipeline import load_artifact
+
+# Worker processes stand in for the nodes sharing the queue directory
+FORK = multiprocessing.get_context("fork")
+
+
+def write_project_configs(tmp_path, name):
+    config_path = tmp_path / f"{name}.yaml"
+    config_path.write_text(yaml.safe_dump({"project_name": name}))
+    return str(config_path)
+
+
+def record_task(task):
+    # O_APPEND writes of a line are atomic between the processes
+    log_path = os.environ["LEASE_QUEUE_LOG"]
+    start = time.time()
+    time.sleep(0.2)
+    with open(log_path, "a") as f:
+        f.write(f"{task['id']} {os.getpid()} {start} {time.time()}\n")
+    return 1 if task["id"] == "broken.prepare" else 0
+
+
+def hang_task(task):
+    with open(os.environ["LEASE_QUEUE_LOG"], "a") as f:
+        f.write(f"{os.getpid()}\n")
+    time.sleep(10)
+    return 0
+
+
+def start_worker(root, runner, lease_seconds=5.0):
+    process = FORK.Process(
+        target=run_worker,
+        args=(LeaseQueue(root, lease_seconds), runner, 0.1, 0.05, True),
+    )
+    process.start()
+    return process
+
+
+def test_nodes_share_project_and_shard_tasks(tmp_path, monkeypatch):
+    monkeypatch.setenv("LEASE_QUEUE_LOG", str(tmp_path / "log.txt"))
+    root = tmp_path / "queue"
+    queue = LeaseQueue(root)
+    first = queue.submit_project(write_project_configs(tmp_path, "first"), shards=3)
+    queue.submit_project(write_project_configs(tmp_path, "broken"), shards=2)
+    # Submitting a project again, e.g. from another node, is a no-op
+    queue.submit_project(write_project_configs(tmp_path, "first"), shards=3)
+
+    workers = [start_worker(root, record_task) for _ in range(3)]
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+
+    runs = {}
+    for line in (tmp_path / "log.txt").read_text().splitlines():
+        task_id, pid, start, end = line.split()
+        assert task_id not in runs, f"{task_id} ran twice"
+        runs[task_id] = (int(pid), float(start), float(end))
+
+    assert sorted(runs) == sorted(first + ["broken.prepare"])
+    # Shards run after the preparation and before the join, on several nodes
+    shards = first[1:-1]
+    assert all(runs[first[0]][2] <= runs[shard][1] for shard in shards)
+    assert all(runs[shard][2] <= runs[first[-1]][1] for shard in shards)
+    assert len({runs[shard][0] for shard in shards}) > 1
+
+    tasks = {task["id"]: task for task in queue.read_tasks()}
+    assert tasks["first.clip_1"]["stages"] == SHARD_STAGES
+    assert tasks["first.clip_1"]["overrides"]["pipeline"]["scene_shard"] == [1, 3]
+    status = queue.get_status()
+    assert status["first.join"] == "completed"
+    assert status["broken.prepare"] == "failed"
+    assert status["broken.clip_0"] == status["broken.join"] == "failed"
+
+
+def test_takes_over_the_tasks_of_a_lost_node(tmp_path, monkeypatch):
+    monkeypatch.setenv("LEASE_QUEUE_LOG", str(tmp_path / "log.txt"))
+    root = tmp_path / "queue"
+    queue = LeaseQueue(root, lease_seconds=0.5)
+    queue.submit("project", ["clip"])
+
+    lost = start_worker(root, hang_task, lease_seconds=0.5)
+    while queue.get_status()["project"] != "running":
+        time.sleep(0.01)
+    # The node stops renewing its lease, e.g. it crashed or was disconnected
+    lost.kill()
+    lost.join()
+    assert queue.claim() is None
+
+    time.sleep(0.6)
+    task = queue.claim()
+    assert task["id"] == "project"
+    assert not LeaseQueue(root, owner="late").complete("project", "completed")
+    assert queue.heartbeat("project")
+    assert queue.complete("project", "completed")
+    assert queue.get_status() == {"project": "completed"}
+    assert not list((root / "leases").iterdir())
+
+
+def test_stops_the_task_when_the_lease_is_lost(tmp_path, monkeypatch):
+    log_path = tmp_path / "log.txt"
+    monkeypatch.setenv("LEASE_QUEUE_LOG", str(log_path))
+    root = tmp_path / "queue"
+    queue = LeaseQueue(root, owner="other")
+    queue.submit("project", ["clip"])
+
+    worker = start_worker(root, hang_task, lease_seconds=0.5)
+    while not log_path.exists() or not log_path.read_text().endswith("\n"):
+        time.sleep(0.01)
+    # Another node took the lease over, e.g. after a network partition
+    write_replace(
+        root / "leases" / "project.lease",
+        {"owner": "other", "expires_at": time.time() + 60},
+    )
+
+    task_pid = int(log_path.read_text())
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            os.kill(task_pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        raise AssertionError("The task kept running after its lease was lost")
+    assert queue.get_status() == {"project": "running"}
+    # Only the new owner records the result, its lease is not renewed by the
+    # former owner
+    assert queue.complete("project", "completed")
+    worker.join(timeout=5)
+    assert worker.exitcode == 0
+    assert queue.get_result("project")["owner"] == "other"
+
+
+def test_does_not_renew_expired_leases(tmp_path):
+    queue = LeaseQueue(tmp_path, lease_seconds=0.1)
+    queue.submit("project", ["clip"])
+    assert queue.claim()["id"] == "project"
+    assert queue.heartbeat("project")
+
+    time.sleep(0.2)
+
+    assert not queue.heartbeat("project")
+
+
+def test_tasks_keep_reports_and_cost_features(tmp_path):
+    configs = merge_configs(
+        parse_configs(CONFIGS_PATH),
+        {
+            "project_dir": str(tmp_path),
+            "project_name": "project",
+            "voice": {"backend": "tone"},
+        },
+    )
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    (project_dir / "plot.txt").write_text("One. Two. Three.")
+    config_path = project_dir / "project_config.yaml"
+    config_path.write_text(yaml.safe_dump(configs))
+    task = {
+        "id": "project.prepare",
+        "config_path": str(config_path),
+        "stages": ["subplot", "voice"],
+        "overrides": {},
+    }
+
+    assert run_task(task) == 0
+
+    assert (project_dir / "run_report_project.prepare.json").exists()
+    features = json.loads((project_dir / FEATURES_FILENAME).read_text())
+    assert features["n_subplots"] == 3
+
+
+def test_shards_load_some_scenes(tmp_path):
+    context = ProjectContext.from_configs(
+        merge_configs(
+            parse_configs(CONFIGS_PATH),
+            {"project_dir": str(tmp_path), "pipeline": {"scene_shard": [1, 3]}},
+        )
+    )
+    for idx in range(7):
+        (context.project_dir / f"scene_{idx}").mkdir(parents=True)
+
+    scenes = load_artifact("scenes", context)
+
+    assert [scene.name for scene in scenes] == ["scene_1", "scene_4"]
+    assert load_artifact("audio_clips", context)[1].parent.name == "scene_4"
@@ -0,0 +1,201 @@
+import json
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.common import CONFIGS_PATH, ProjectContext, merge_configs, parse_configs
+from src.ffmpeg_tools import run_ffmpeg
+from src.main import run_project
+from src.manifest import ProjectManifest
+from src.pipeline import Stage, run_pipeline
+
+BARRIER = threading.Barrier(2, timeout=5)
+
+
+def make_context(project_dir, **configs):
+    return ProjectContext.from_configs(
+        {
+            "project_dir": str(project_dir),
+            "project_name": "test",
+            "plot_filename": "plot.txt",
+            "movies_dir": "movies",
+            **configs,
+        }
+    )
+
+
+def make_scenes(plot):
+    return {"scenes": [f"{plot}_scene"]}
+
+
+def make_voices(scenes):
+    BARRIER.wait()
+    return {"voices": [f"{scene}_voice" for scene in scenes]}
+
+
+def make_frames():
+    BARRIER.wait()
+    return {"frames": "frames"}
+
+
+def make_trailer(voices, frames):
+    return {"trailer": (voices, frames)}
+
+
+CALLS = []
+
+
+def write_summary(notes):
+    CALLS.append(notes)
+    summary_path = notes.parent / "summary.txt"
+    summary_path.write_text(notes.read_text().upper())
+    return {"summary": summary_path}
+
+
+def fail():
+    raise RuntimeError("step failed")
+
+
+def write_title(context):
+    BARRIER.wait()
+    title_path = context.project_dir / "title.txt"
+    title_path.parent.mkdir(parents=True, exist_ok=True)
+    title_path.write_text(context.configs["title"])
+    return {"title": title_path}
+
+
+STAGES = {
+    stage.name: stage
+    for stage in [
+        Stage("subplot", "test_pipeline:make_scenes", ("plot",), ("scenes",)),
+        Stage("voice", "test_pipeline:make_voices", ("scenes",), ("voices",)),
+        Stage("frame", "test_pipeline:make_frames", (), ("frames",)),
+        Stage("join", "test_pipeline:make_trailer", ("voices", "frames"), ("trailer",)),
+        Stage("broken", "test_pipeline:fail", ("trailer",), ()),
+        Stage("summary", "test_pipeline:write_summary", ("notes",), ("summary",)),
+        Stage("title", "test_pipeline:write_title", (), ("title",)),
+    ]
+}
+
+
+def test_runs_independent_steps_concurrently(tmp_path):
+    artifacts = run_pipeline(
+        ["join", "frame", "voice", "subplot"],
+        make_context(tmp_path),
+        artifacts={"plot": "plot"},
+        stages=STAGES,
+    )
+    assert artifacts["trailer"] == (["plot_scene_voice"], "frames")
+
+
+def test_raises_step_errors(tmp_path):
+    BARRIER.reset()
+    with pytest.raises(RuntimeError):
+        run_pipeline(
+            ["subplot", "voice", "frame", "join", "broken"],
+            make_context(tmp_path),
+            artifacts={"plot": "plot"},
+            stages=STAGES,
+        )
+
+
+def test_runs_projects_concurrently(tmp_path):
+    BARRIER.reset()
+    contexts = [
+        make_context(tmp_path, project_name=name, title=name.upper())
+        for name in ["first", "second"]
+    ]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(
+            executor.map(
+                lambda context: run_pipeline(["title"], context, stages=STAGES),
+                contexts,
+            )
+        )
+
+    for context, artifacts in zip(contexts, results):
+        assert artifacts["title"] == context.project_dir / "title.txt"
+        assert artifacts["title"].read_text() == context.configs["title"]
+
+
+def test_overrides_leave_context_unchanged(tmp_path):
+    context = make_context(tmp_path, encoding={"preview": False, "crf": 23})
+    preview = context.with_overrides({"encoding": {"preview": True}})
+
+    assert preview.configs["encoding"] == {"preview": True, "crf": 23}
+    assert context.configs["encoding"] == {"preview": False, "crf": 23}
+
+
+def test_skips_unchanged_steps(tmp_path, monkeypatch):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("scene")
+    monkeypatch.setattr(
+        "src.pipeline.load_artifact", lambda name, context: tmp_path / "summary.txt"
+    )
+    CALLS.clear()
+
+    def run(force=()):
+        manifest = ProjectManifest(tmp_path / "manifest.json")
+        return run_pipeline(
+            ["summary"],
+            make_context(tmp_path),
+            artifacts={"notes": notes},
+            stages=STAGES,
+            manifest=manifest,
+            force=force,
+        )
+
+    run()
+    assert run()["summary"] == tmp_path / "summary.txt"
+    assert len(CALLS) == 1
+
+    run(force=["summary"])
+    assert len(CALLS) == 2
+
+    notes.write_text("new scene")
+    run()
+    assert len(CALLS) == 3
+    assert (tmp_path / "summary.txt").read_text() == "NEW SCENE"
+
+
+def test_reruns_failed_and_deleted_outputs(tmp_path, monkeypatch):
+    context = ProjectContext.from_configs(
+        merge_configs(
+            parse_configs(CONFIGS_PATH),
+            {
+                "project_dir": str(tmp_path),
+                "join_clip": {"scoring": {"enabled": False}},
+            },
+        )
+    )
+    clip_path = context.project_dir / "scene_1" / "audio_clips" / "clip_1.mp4"
+    clip_path.parent.mkdir(parents=True)
+    run_ffmpeg(
+        ["-f", "lavfi", "-i", "testsrc=duration=1:size=64x64:rate=10", str(clip_path)]
+    )
+    # Project directories exist before any step ran
+    context.ensure_dirs()
+
+    def run():
+        return run_project(context, ["join_clip"])
+
+    def fail_concat(*args):
+        raise subprocess.CalledProcessError(1, "ffmpeg")
+
+    with monkeypatch.context() as patch:
+        patch.setattr("src.join_clip.concat_copy", fail_concat)
+        assert run() == 1
+    trailer_path = context.trailer_dir / "final_trailer.mp4"
+    assert not trailer_path.exists()
+
+    assert run() == 0
+    assert trailer_path.exists()
+    assert run() == 0
+    report = json.loads((context.project_dir / "run_report.json").read_text())
+    assert report["stages"]["join_clip"]["status"] == "skipped"
+
+    trailer_path.unlink()
+    assert run() == 0
+    assert trailer_path.exists()
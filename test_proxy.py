@@ -0,0 +1,90 @@
+import subprocess
+
+import pytest
+
+from src import proxy as proxy_module
+from src.ffmpeg_tools import probe_media, run_ffmpeg
+from src.proxy import conform_segment, get_proxy_path, get_working_video_path
+
+
+def make_video(path, duration, size, audio=True):
+    audio_args = ["-f", "lavfi", "-i", f"sine=duration={duration}", "-shortest"]
+    run_ffmpeg(
+        [
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc=duration={duration}:size={size}:rate=10",
+            *(audio_args if audio else []),
+            str(path),
+        ]
+    )
+
+
+@pytest.mark.parametrize("audio", [True, False])
+def test_conforms_proxy_clips_from_the_original(tmp_path, audio):
+    original = tmp_path / "movie.mp4"
+    make_video(original, 6, "128x96", audio)
+    proxy = get_working_video_path(
+        str(original), {"enabled": True, "height": 48}, tmp_path
+    )
+    assert probe_media(proxy)["video_size"] == [64, 48]
+
+    scene_dir = tmp_path / "scene_1"
+    (scene_dir / "audio_clips").mkdir(parents=True)
+    (scene_dir / "audios").mkdir()
+    run_ffmpeg(
+        [
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=duration=1",
+            str(scene_dir / "audios" / "audio_1.wav"),
+        ]
+    )
+    # Clip of frame 20, 2 seconds in, rendered from the proxy
+    clip_path = scene_dir / "audio_clips" / "audio_clip_clip_20_audio_1.mp4"
+    run_ffmpeg(["-ss", "2", "-t", "2", "-i", proxy, str(clip_path)])
+
+    output_path = tmp_path / "segment.mp4"
+    conform_segment(
+        str(original),
+        clip_path,
+        output_path,
+        0.5,
+        1.0,
+        ["-c:v", "libx264", "-pix_fmt", "yuv420p"],
+    )
+
+    infos = probe_media(output_path)
+    assert infos["video_size"] == [128, 96]
+    assert infos["duration"] == pytest.approx(2, abs=0.2)
+    assert infos["audio_found"]
+
+
+def test_interrupted_proxies_are_not_reused(tmp_path, monkeypatch):
+    original = tmp_path / "movie.mp4"
+    make_video(original, 1, "64x64")
+    proxy_configs = {"enabled": True, "height": 32}
+
+    def interrupted_ffmpeg(args):
+        # The transcode is killed after writing part of the proxy
+        with open(args[-1], "wb") as f:
+            f.write(b"partial")
+        raise subprocess.CalledProcessError(1, "ffmpeg")
+
+    monkeypatch.setattr(proxy_module, "run_ffmpeg", interrupted_ffmpeg)
+    with pytest.raises(subprocess.CalledProcessError):
+        get_working_video_path(str(original), proxy_configs, tmp_path)
+    assert not get_proxy_path(str(original), tmp_path, 32).exists()
+
+    monkeypatch.setattr(proxy_module, "run_ffmpeg", run_ffmpeg)
+    proxy = get_working_video_path(str(original), proxy_configs, tmp_path)
+    assert probe_media(proxy)["video_size"] == [32, 32]
+
+
+def test_rejects_clips_with_unexpected_names(tmp_path):
+    with pytest.raises(ValueError):
+        conform_segment(
+            "movie.mp4", tmp_path / "clip.mp4", tmp_path / "out.mp4", 1, 1, []
+        )
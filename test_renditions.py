@@ -0,0 +1,80 @@
+from src.common import CONFIGS_PATH, parse_configs
+from src.encoding import get_profile
+from src.ffmpeg_tools import concat_copy, get_rendition_args, probe_media, run_ffmpeg
+from src.join_clip import join_clips
+
+RENDITIONS = [
+    {"name": "small", "height": 32, "video_bitrate": "200k", "preset": "fast"},
+    {"name": "tiny", "height": 16, "video_bitrate": "100k", "preset": "ultrafast"},
+]
+
+
+def test_builds_one_filter_graph_for_every_rendition(tmp_path):
+    trailer = tmp_path / "trailer.mp4"
+
+    args = get_rendition_args(trailer, RENDITIONS)
+
+    assert args[:2] == [
+        "-filter_complex",
+        "[0:v]split=2[v0][v1];[v0]scale=-2:32[out0];[v1]scale=-2:16[out1]",
+    ]
+    assert args.count("-map") == 4
+    # Each output has its own encoding settings
+    tiny_args = args[args.index("[out1]") :]
+    assert tiny_args[tiny_args.index("-preset") + 1] == "ultrafast"
+    assert tiny_args[tiny_args.index("-b:v") + 1] == "100k"
+    assert tiny_args[-1] == str(tmp_path / "trailer_tiny.mp4")
+
+
+def make_clip(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    run_ffmpeg(
+        [
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=duration=1:size=64x64:rate=10",
+            "-c:v",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+            str(path),
+        ]
+    )
+
+
+def test_encodes_renditions_while_concatenating(tmp_path):
+    segment = tmp_path / "segment.mp4"
+    make_clip(segment)
+    trailer = tmp_path / "trailer.mp4"
+
+    concat_copy([segment, segment], trailer, RENDITIONS)
+
+    assert probe_media(trailer)["video_size"] == [64, 64]
+    for name, size in [("small", [32, 32]), ("tiny", [16, 16])]:
+        infos = probe_media(tmp_path / f"trailer_{name}.mp4")
+        assert infos["video_size"] == size
+        assert infos["duration"] == probe_media(trailer)["duration"]
+
+
+def test_only_the_final_trailer_gets_renditions(tmp_path):
+    clips = [tmp_path / "scene_1" / "audio_clips" / f"clip_{i}.mp4" for i in range(2)]
+    for clip in clips:
+        make_clip(clip)
+    configs = parse_configs(CONFIGS_PATH)
+    trailer_dir = tmp_path / "trailers"
+
+    join_clips(
+        [clips],
+        trailer_dir,
+        max_candidates=2,
+        seed=0,
+        profile=get_profile(configs, "join_clip"),
+        renditions=RENDITIONS[:1],
+    )
+
+    assert sorted(path.name for path in trailer_dir.glob("*.mp4")) == [
+        "final_trailer.mp4",
+        "final_trailer_small.mp4",
+        "trailer_2.mp4",
+    ]
@@ -0,0 +1,92 @@
+from email.utils import formatdate
+
+import pytest
+
+from src.ffmpeg_tools import concat_copy, encode_segment, run_ffmpeg
+from src.serving import iter_file_range, parse_range, prepare_file_response
+
+CONTENT = bytes(range(256)) * 10
+
+
+@pytest.fixture
+def trailer(tmp_path):
+    path = tmp_path / "final_trailer.mp4"
+    path.write_bytes(CONTENT)
+    return path
+
+
+def read_body(path, response):
+    return b"".join(iter_file_range(path, response["start"], response["end"]))
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=2500-", (2500, 2559)),
+        ("bytes=-60", (2500, 2559)),
+        ("bytes=2500-9999", (2500, 2559)),
+        ("bytes=0-1,5-9", None),
+        ("items=0-1", None),
+    ],
+)
+def test_parses_ranges(header, expected):
+    assert parse_range(header, len(CONTENT)) == expected
+
+
+def test_serves_ranges(trailer):
+    response = prepare_file_response(trailer, {"range": "bytes=100-199"})
+
+    assert response["status"] == 206
+    assert response["headers"]["Content-Range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert response["headers"]["Content-Length"] == "100"
+    assert read_body(trailer, response) == CONTENT[100:200]
+
+    response = prepare_file_response(trailer, {"range": "bytes=5000-"})
+    assert response["status"] == 416
+    assert response["headers"]["Content-Range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_answers_conditional_requests(trailer):
+    response = prepare_file_response(trailer, {})
+    assert response["status"] == 200
+    assert read_body(trailer, response) == CONTENT
+    etag = response["headers"]["ETag"]
+    last_modified = response["headers"]["Last-Modified"]
+
+    assert prepare_file_response(trailer, {"if-none-match": etag})["status"] == 304
+    assert (
+        prepare_file_response(trailer, {"if-modified-since": last_modified})["status"]
+        == 304
+    )
+    # A range of another version of the file is not served
+    stale = prepare_file_response(
+        trailer, {"range": "bytes=0-9", "if-range": '"stale"'}
+    )
+    assert stale["status"] == 200
+
+    trailer.write_bytes(CONTENT[::-1])
+    response = prepare_file_response(trailer, {"if-none-match": etag})
+    assert response["status"] == 200
+    assert response["headers"]["ETag"] != etag
+    assert (
+        prepare_file_response(
+            trailer, {"if-modified-since": formatdate(0, usegmt=True)}
+        )["status"]
+        == 200
+    )
+
+
+def test_writes_faststart_trailers(tmp_path):
+    source = tmp_path / "source.mp4"
+    run_ffmpeg(
+        ["-f", "lavfi", "-i", "testsrc=duration=1:size=64x64:rate=10", str(source)]
+    )
+    segment = tmp_path / "segment.mp4"
+    encode_segment(source, segment, ["-c:v", "libx264", "-pix_fmt", "yuv420p"])
+
+    trailer = tmp_path / "trailer.mp4"
+    concat_copy([segment, segment], trailer)
+
+    data = trailer.read_bytes()
+    assert data.index(b"moov") < data.index(b"mdat")
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.startup import ENTRY_POINTS, HEAVY_MODULES
+
+REPO_DIR = Path(__file__).parent
+
+
+def test_imports_have_no_side_effects(tmp_path):
+    # Run from an empty directory, importing must not read configs.yaml or
+    # create project directories
+    modules = (
+        ENTRY_POINTS["main"]
+        + ENTRY_POINTS["pipeline"]
+        + ENTRY_POINTS["worker"]
+        + ENTRY_POINTS["steps"]
+    )
+    code = (
+        "import importlib, json, sys\n"
+        f"for name in {modules!r}:\n"
+        "    importlib.import_module(name)\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": str(REPO_DIR)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from src import video_store
+from src.common import CONFIGS_PATH, ProjectContext, merge_configs, parse_configs
+from src.main import run_project
+from src.video_store import LocalSource, VideoStore
+
+
+class CountingSource(LocalSource):
+    def __init__(self, root):
+        super().__init__(root)
+        self.downloads = []
+
+    def download(self, file_id, path):
+        self.downloads.append(file_id)
+        super().download(file_id, path)
+
+
+class BlockingSource(LocalSource):
+    def __init__(self, root, released):
+        super().__init__(root)
+        self.released = released
+
+    def download(self, file_id, path):
+        assert self.released.wait(timeout=30), "voices waited for the download"
+        super().download(file_id, path)
+
+
+class LoggingSource(LocalSource):
+    """Logs its downloads to a file shared by the processes."""
+
+    def download(self, file_id, path):
+        time.sleep(0.1)
+        with open(self.root.parent / "downloads.txt", "a") as f:
+            f.write(f"{file_id}\n")
+        super().download(file_id, path)
+
+
+class CorruptSource(LocalSource):
+    def download(self, file_id, path):
+        path.write_bytes(b"x" * (self.root / file_id).stat().st_size)
+
+
+def make_source(tmp_path, source_class=CountingSource, **videos):
+    root = tmp_path / "drive"
+    root.mkdir()
+    for file_id, content in videos.items():
+        (root / file_id).write_bytes(content)
+    return source_class(root)
+
+
+def test_links_each_video_downloaded_once(tmp_path):
+    source = make_source(tmp_path, movie=b"movie" * 100)
+    store = VideoStore(tmp_path / "store")
+
+    first = store.link("movie", source, tmp_path / "first" / "movie.mp4")
+    second = store.link("movie", source, tmp_path / "second" / "movie.mp4")
+
+    assert source.downloads == ["movie"]
+    assert first.read_bytes() == b"movie" * 100
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+
+    # A new version of the file is downloaded again
+    (source.root / "movie").write_bytes(b"edited" * 100)
+    third = store.link("movie", source, tmp_path / "third" / "movie.mp4")
+    assert source.downloads == ["movie", "movie"]
+    assert third.read_bytes() == b"edited" * 100
+    assert first.read_bytes() == b"movie" * 100
+
+
+def test_rejects_corrupted_downloads(tmp_path):
+    source = make_source(tmp_path, CorruptSource, movie=b"movie" * 100)
+    store = VideoStore(tmp_path / "store")
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        store.link("movie", source, tmp_path / "project" / "movie.mp4")
+    assert not (tmp_path / "project" / "movie.mp4").exists()
+    assert store.entries == {}
+
+
+def test_evicts_least_recently_used_videos(tmp_path):
+    source = make_source(tmp_path, a=b"a" * 100, b=b"b" * 100, c=b"c" * 100)
+    store = VideoStore(tmp_path / "store", quota_bytes=250)
+
+    project_a = store.link("a", source, tmp_path / "project" / "a.mp4")
+    store.get("b", source)
+    store.get("a", source)
+    store.get("c", source)
+
+    assert {entry["file_id"] for entry in store.entries.values()} == {"a", "c"}
+    assert project_a.read_bytes() == b"a" * 100
+    # The index survives restarts
+    reopened = VideoStore(tmp_path / "store", quota_bytes=250)
+    assert reopened.entries == store.entries
+    store.get("a", source)
+    assert source.downloads == ["a", "b", "c"]
+
+
+def fetch_videos(store_root, source_root, file_ids):
+    # Each process opens its own store, like the API, worker and queue nodes
+    store = VideoStore(store_root)
+    source = LoggingSource(source_root)
+    for file_id in file_ids:
+        store.get(file_id, source)
+
+
+def test_processes_share_the_store(tmp_path):
+    videos = {name: name.encode() * 100 for name in ["movie", "a", "b", "c"]}
+    source = make_source(tmp_path, **videos)
+    store_root = tmp_path / "store"
+    fork = multiprocessing.get_context("fork")
+    processes = [
+        fork.Process(
+            target=fetch_videos, args=(store_root, source.root, ["movie", name])
+        )
+        for name in ["a", "b", "c"]
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    downloads = (tmp_path / "downloads.txt").read_text().split()
+    assert sorted(downloads) == ["a", "b", "c", "movie"]
+    # Every process kept the entries written by the others
+    store = VideoStore(store_root)
+    assert sorted(entry["file_id"] for entry in store.entries.values()) == sorted(
+        videos
+    )
+
+
+def test_renders_voices_while_downloading(tmp_path, monkeypatch):
+    video_path = tmp_path / "test" / "movies" / "movie.mp4"
+    configs = merge_configs(
+        parse_configs(CONFIGS_PATH),
+        {
+            "project_dir": str(tmp_path),
+            "project_name": "test",
+            "video_path": str(video_path),
+            "video_file_id": "movie",
+            "voice": {"backend": "tone"},
+            "video_store": {"dir": str(tmp_path / "store")},
+        },
+    )
+    context = ProjectContext.from_configs(configs)
+    context.ensure_dirs()
+    context.plot_path.write_text("The first scene. The second scene.")
+
+    voices_done = threading.Event()
+    source = make_source(tmp_path, movie=b"movie" * 100)
+    source = BlockingSource(source.root, voices_done)
+    monkeypatch.setattr(video_store, "get_video_source", lambda configs: source)
+
+    def listener(event):
+        if event["stage"] == "voice" and event["status"] == "completed":
+            voices_done.set()
+
+    stages = ["video_download", "subplot", "voice"]
+    assert run_project(context, stages, max_workers=2, listener=listener) == 0
+    assert video_path.read_bytes() == b"movie" * 100
+    assert len(list(context.project_dir.glob("scene_*/audios/audio_1.wav"))) == 2
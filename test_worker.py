@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from src.backends import load_backend, register_backend
+from src.common import CONFIGS_PATH, merge_configs, parse_configs
+from src.worker import AUTHKEY_ENV, Worker, get_authkey, preload_models, submit_job
+
+AUTHKEY = b"test"
+
+
+def write_project(tmp_path, name):
+    configs = merge_configs(
+        parse_configs(CONFIGS_PATH),
+        {
+            "project_dir": str(tmp_path),
+            "project_name": name,
+            "voice": {"backend": "tone"},
+            "frame_ranking": {"backend": "hash"},
+        },
+    )
+    project_dir = tmp_path / name
+    project_dir.mkdir()
+    (project_dir / "plot.txt").write_text(f"The {name} scene. Another {name} scene.")
+    config_path = project_dir / "project_config.yaml"
+    config_path.write_text(yaml.safe_dump(configs))
+    return configs, config_path
+
+
+def test_runs_jobs_with_loaded_models(tmp_path):
+    configs, _ = write_project(tmp_path, "first")
+    preload_models(configs)
+    worker = Worker(("127.0.0.1", 0), max_jobs=2, authkey=AUTHKEY)
+    threading.Thread(target=worker.serve_forever, daemon=True).start()
+
+    config_paths = [write_project(tmp_path, name)[1] for name in ["second", "third"]]
+    events = {path: [] for path in config_paths}
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(
+            executor.map(
+                lambda path: submit_job(
+                    {"config_path": str(path), "stages": ["subplot", "voice"]},
+                    worker.address,
+                    AUTHKEY,
+                    events[path].append,
+                ),
+                config_paths,
+            )
+        )
+    worker.close()
+
+    for config_path, result in zip(config_paths, results):
+        assert result["status"] == "completed"
+        steps = [e for e in events[config_path] if "items" not in e]
+        assert [(e["stage"], e["status"]) for e in steps] == [
+            ("subplot", "running"),
+            ("subplot", "completed"),
+            ("voice", "running"),
+            ("voice", "completed"),
+        ]
+        progress = [e for e in events[config_path] if "items" in e]
+        assert progress[-1]["items"] == progress[-1]["total_items"] == 2
+        assert progress[-1]["eta_seconds"] == 0
+        project_dir = config_path.parent
+        assert len(list(project_dir.glob("scene_*/audios/audio_1.wav"))) == 2
+        assert (project_dir / "run_report.json").exists()
+
+
+def test_reports_failed_jobs(tmp_path):
+    worker = Worker(("127.0.0.1", 0), authkey=AUTHKEY)
+    threading.Thread(target=worker.serve_forever, daemon=True).start()
+
+    result = submit_job(
+        {"config_path": str(tmp_path / "missing.yaml")}, worker.address, AUTHKEY
+    )
+    worker.close()
+
+    assert result["status"] == "failed"
+    assert result["report"] is None
+
+
+def test_generates_a_private_key_without_the_environment_variable(
+    tmp_path, monkeypatch
+):
+    monkeypatch.delenv(AUTHKEY_ENV, raising=False)
+    configs = {"project_dir": str(tmp_path / "projects")}
+
+    authkey = get_authkey(configs)
+
+    key_path = tmp_path / "projects" / ".worker_key"
+    assert len(authkey) == 64
+    assert os.stat(key_path).st_mode & 0o777 == 0o600
+    # Both sides read the same key
+    assert get_authkey(configs) == authkey
+    monkeypatch.setenv(AUTHKEY_ENV, "shared")
+    assert get_authkey(configs) == b"shared"
+
+
+class UnsafeSynthesizer:
+    """Speech model failing when two threads use it at the same time."""
+
+    def __init__(self):
+        self.running = False
+        self.calls = 0
+
+    def tts_to_file(self, text, file_path, **kwargs):
+        assert not self.running, "the model ran in two threads at once"
+        self.running = True
+        time.sleep(0.01)
+        self.calls += 1
+        self.running = False
+        return file_path
+
+
+def load_unsafe_synthesizer(model_id, device):
+    return UnsafeSynthesizer()
+
+
+def test_jobs_take_turns_on_shared_models():
+    register_backend("speech", "unsafe", "test_worker:load_unsafe_synthesizer")
+    model = load_backend("speech", "unsafe", "model", "cpu")
+    assert load_backend("speech", "unsafe", "model", "cpu") is model
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(
+            executor.map(lambda idx: model.tts_to_file("Text.", f"{idx}.wav"), range(8))
+        )
+
+    assert model.calls == 8